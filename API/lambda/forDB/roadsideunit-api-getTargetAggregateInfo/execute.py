@@ -0,0 +1,141 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import logging
+import os
+import time
+
+import boto3
+import time_util
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+TARGET_AGGREGATE_TABLE_NAME = os.environ['TARGET_AGGREGATE_TABLE_NAME']
+DEFAULT_RANGE_MINUTES = int(os.environ.get('DEFAULT_RANGE_MINUTES', '60'))
+
+# DynamoDBオブジェクト
+dynamoDB = boto3.resource('dynamodb')
+Key = boto3.dynamodb.conditions.Key
+Attr = boto3.dynamodb.conditions.Attr
+
+# DynamoDBテーブルオブジェクト
+t_target_aggregate_info = dynamoDB.Table(TARGET_AGGREGATE_TABLE_NAME)
+
+
+def get_data(roadside_unit_id, service_location_id, query_params):
+    """
+    物標集計情報取得
+    Parameters
+    ----------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    query_params : list
+        クエリパラメータ
+
+    Returns
+    -------
+    data_list : dict
+        データ返却用配列
+    response_status : int
+        処理完了ステータス
+    """
+
+    data_list = {}
+    response_status = 200
+
+    try:
+        # 物標集計情報取得
+        data_list, response_status = get_data_execute(roadside_unit_id, service_location_id, query_params, response_status)
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+    return data_list, response_status
+
+
+def get_data_execute(roadside_unit_id, service_location_id, query_params, response_status):
+    """
+    物標集計情報取得
+    サービス地点の全機器の分単位の集計値を1回のクエリで取得する
+    Parameters
+    ----------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    query_params : list
+        クエリパラメータ
+    response_status : int
+        処理完了ステータス
+
+    Returns
+    -------
+    result : dict
+        取得されたデータ
+    response_status : int
+        処理完了ステータス
+    """
+
+    result = {}
+
+    # 期間の指定がない場合は直近の集計値を取得
+    if 'endAt' in query_params:
+        end_epoch_ms = time_util.parse_epoch_ms(query_params['endAt'].replace(" ", "+"))
+    else:
+        end_epoch_ms = int(time.time() * 1000)
+    if 'startAt' in query_params:
+        start_epoch_ms = time_util.parse_epoch_ms(query_params['startAt'].replace(" ", "+"))
+    else:
+        start_epoch_ms = end_epoch_ms - DEFAULT_RANGE_MINUTES * 60000
+
+    # 集計対象の分(UTC、YYYY-MM-DDTHH:MM)の範囲
+    start_minutes = time_util.format_utc(start_epoch_ms)[:16]
+    end_minutes = time_util.format_utc(end_epoch_ms)[:16]
+
+    query = {
+        'KeyConditionExpression': Key('locationKey').eq(f'r{int(roadside_unit_id)}s{int(service_location_id)}') &
+        Key('minuteDeviceKey').between(start_minutes + '#', end_minutes + '#~')
+    }
+    if 'deviceID' in query_params:
+        query['FilterExpression'] = Attr('deviceID').eq(int(query_params['deviceID']))
+
+    # 全ページ取得
+    aggregate_items = []
+    while True:
+        response = t_target_aggregate_info.query(**query)
+        aggregate_items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if not aggregate_items:
+        response_status = 204
+        return result, response_status
+
+    aggregate_info = []
+    for aggregate_item in aggregate_items:
+        aggregate = {
+            'deviceID': int(aggregate_item['deviceID']),
+            'time': aggregate_item['time_minutes'] + ':00.000Z',
+            'targetCount': int(aggregate_item['targetCount']),
+            'distinctTargetCount': int(aggregate_item['distinctTargetCount']),
+            'sizeClassificationCount': {key: int(value) for key, value in aggregate_item['sizeClassificationCount'].items()},
+        }
+        if 'speedMean' in aggregate_item:
+            aggregate['speedMean'] = aggregate_item['speedMean']
+            aggregate['speedMax'] = int(aggregate_item['speedMax'])
+        aggregate_info.append(aggregate)
+
+    result['attribute'] = {}
+    result['attribute']['roadsideUnitID'] = int(roadside_unit_id)
+    result['attribute']['serviceLocationID'] = int(service_location_id)
+    result['attribute']['aggregateNum'] = len(aggregate_info)
+    result['attribute']['aggregateInfo'] = aggregate_info
+
+    return result, response_status
+
@@ -0,0 +1,79 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import json
+import logging
+import traceback
+from decimal import Decimal
+
+import execute
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+
+def lambda_handler(event, context):
+    """
+    物標集計情報の取得
+    Returns
+    -------
+    response : json
+        取得データ
+    """
+
+    response = {
+        'statusCode': 200,
+        'headers': {'Access-Control-Allow-Origin': '*'},
+        'body': ''
+    }
+
+    try:
+        headers = dict()
+        for k, v in event['headers'].items():
+            headers[k.lower()] = v
+        if 'x-tracking' in headers:
+            logger.info(headers['x-tracking'])
+
+        # パラメータ取得
+        roadside_unit_id = event['queryStringParameters']['roadsideUnitID']
+        service_location_id = event['queryStringParameters']['serviceLocationID']
+
+        query_params = event.get('queryStringParameters', {})
+
+        # データ取得
+        data, res = execute.get_data(roadside_unit_id, service_location_id, query_params)
+
+        # データが存在している場合
+        if res == 200:
+            response['body'] = json.dumps(data, default=decimal_to_number)
+        # データが存在しない場合
+        elif res == 204:
+            response['statusCode'] = res
+            logger.info('Null data')
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-getTargetAggregateInfo')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def decimal_to_number(obj):
+    """
+    decimalをintまたはfloatに変換
+    Parameters
+    ----------
+    obj : decimal
+        decimal値
+
+    Returns
+    -------
+    response : int or float
+        変換データ
+    """
+    if isinstance(obj, Decimal):
+        if obj == obj.to_integral_value():
+            return int(obj)
+        return float(obj)
@@ -0,0 +1,118 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import logging
+import zlib
+
+from log import logger
+
+# zstdはLambdaレイヤーに含まれる場合のみ使用する
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# ElastiCacheの物標情報の圧縮形式
+# none : 圧縮しない(JSON文字列)
+# zlib : zlib圧縮
+# zstd : zstd圧縮(zstandardがない場合はzlib圧縮)
+COMPRESSION_NONE = 'none'
+COMPRESSION_ZLIB = 'zlib'
+COMPRESSION_ZSTD = 'zstd'
+
+# 圧縮した値の先頭に付与するヘッダー(JSONの先頭にはならない0x00と圧縮形式の番号)
+MAGIC_BYTE = 0x00
+COMPRESSION_IDS = {
+    COMPRESSION_ZLIB: 1,
+    COMPRESSION_ZSTD: 2,
+}
+
+# 圧縮レベル
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# zstdの圧縮・展開オブジェクト(ウォームスタート時は再利用する)
+zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def get_compression(compression):
+    """
+    使用する圧縮形式を取得
+    Parameters
+    ----------
+    compression : str
+        指定された圧縮形式
+
+    Returns
+    -------
+    compression : str
+        使用する圧縮形式
+    """
+
+    if compression == COMPRESSION_ZSTD and zstandard is None:
+        logger.warning('zstandard not found, zlib is used')
+        return COMPRESSION_ZLIB
+    if compression not in COMPRESSION_IDS:
+        return COMPRESSION_NONE
+
+    return compression
+
+
+def compress(value, compression, min_bytes=0):
+    """
+    ElastiCacheに登録する値を圧縮
+    Parameters
+    ----------
+    value : str
+        JSON文字列
+    compression : str
+        圧縮形式(get_compressionの戻り値)
+    min_bytes : int
+        圧縮する最小バイト数(未満の場合は圧縮しない)
+
+    Returns
+    -------
+    value : str or bytes
+        登録する値
+    """
+
+    if compression == COMPRESSION_NONE or len(value) < min_bytes:
+        return value
+
+    data = value.encode('utf-8')
+    if compression == COMPRESSION_ZSTD:
+        data = zstd_compressor.compress(data)
+    else:
+        data = zlib.compress(data, ZLIB_LEVEL)
+
+    return bytes([MAGIC_BYTE, COMPRESSION_IDS[compression]]) + data
+
+
+def decompress(value):
+    """
+    ElastiCacheから取得した値を展開(圧縮されていない値はそのまま返す)
+    Parameters
+    ----------
+    value : bytes
+        取得した値
+
+    Returns
+    -------
+    value : bytes
+        JSON
+    """
+
+    if not value or value[0] != MAGIC_BYTE:
+        return value
+
+    if value[1] == COMPRESSION_IDS[COMPRESSION_ZLIB]:
+        return zlib.decompress(value[2:])
+    if value[1] == COMPRESSION_IDS[COMPRESSION_ZSTD]:
+        if zstd_decompressor is None:
+            raise ValueError('zstandard not found')
+        return zstd_decompressor.decompress(value[2:])
+
+    raise ValueError(f'unsupported compression: {value[1]}')
@@ -3,11 +3,13 @@
 import ast
 import logging
 import os
+import time as time_module
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from datetime import datetime, timedelta, timezone
 
 import boto3
-import pandas as pd
+import target_codec
+import time_util
 from botocore.exceptions import ClientError
 from log import logger
 
@@ -20,13 +22,38 @@ SENSOR_INFO_TABLE_NAME = os.environ['SENSOR_INFO_TABLE_NAME']
 MAX_DEVICE_NUM = int(os.environ['MAX_DEVICE_NUM'])
 MAX_TARGET_NUM = int(os.environ['MAX_TARGET_NUM'])
 RANGE_SECONDS = int(os.environ['RANGE_SECONDS'])
+TARGET_SHARD_NUM = int(os.environ.get('TARGET_SHARD_NUM', '8'))
+TARGET_FAN_OUT_MAX_MINUTES = int(os.environ.get('TARGET_FAN_OUT_MAX_MINUTES', '0'))
+# 間引き階層の間隔(秒、カンマ区切り、putTargetInfoと同じ値)、未指定の場合は間引き階層を使用しない
+TARGET_TIER_SECONDS = sorted({int(seconds) for seconds in os.environ.get('TARGET_TIER_SECONDS', '').split(',') if seconds.strip() and int(seconds) > 0})
+TARGET_TIER_RAW_MAX_SECONDS = int(os.environ.get('TARGET_TIER_RAW_MAX_SECONDS', '60'))
+TARGET_TIER_MAX_BUCKETS = int(os.environ.get('TARGET_TIER_MAX_BUCKETS', '600'))
+# 間引き値を反映するtier_functionの反映待ち時間・実行間隔(秒、putTargetInfoと同じ値)
+TARGET_TIER_FLUSH_DELAY_SECONDS = int(os.environ.get('TARGET_TIER_FLUSH_DELAY_SECONDS', '30'))
+TARGET_TIER_FLUSH_INTERVAL_SECONDS = int(os.environ.get('TARGET_TIER_FLUSH_INTERVAL_SECONDS', '60'))
 
 # DynamoDBオブジェクト
 dynamoDB = boto3.resource('dynamodb')
 Key = boto3.dynamodb.conditions.Key
+Attr = boto3.dynamodb.conditions.Attr
 
+# パーティション並列検索用スレッドプール
+executor = ThreadPoolExecutor(max_workers=16)
 
-def get_data(roadside_unit_id, service_location_id, query_params):
+# 返却する物標個別情報の項目(データフォーマット仕様書の順)
+INFO_KEYS = target_codec.FIELD_DICTIONARIES[target_codec.FIELD_DICTIONARY_VERSION]
+
+# 間引き階層のパーティションキーのプレフィックス(「tier{間隔}#UTCの時#機器種別ID」)
+TIER_PARTITION_KEY_PREFIX = 'tier'
+
+# 間引きなし(物標情報をそのまま返す)の解像度
+RESOLUTION_RAW = 'raw'
+
+# 1時間(ミリ秒)
+HOUR_MS = 3600 * 1000
+
+
+def get_data(roadside_unit_id, service_location_id, query_params, history_items=None):
     """
     物標情報取得
     Parameters
@@ -37,6 +64,8 @@ def get_data(roadside_unit_id, service_location_id, query_params):
         サービス地点情報ID
     query_params : list
         クエリパラメータ
+    history_items : dict
+        ElastiCacheの履歴から取得した機器種別IDごとの物標情報(Noneの場合は物標情報テーブルを検索)
 
     Returns
     -------
@@ -51,7 +80,7 @@ def get_data(roadside_unit_id, service_location_id, query_params):
 
     try:
         # 物標情報取得
-        data_list, response_status = get_data_execute(roadside_unit_id, service_location_id, query_params, response_status)
+        data_list, response_status = get_data_execute(roadside_unit_id, service_location_id, query_params, response_status, history_items)
 
     except Exception:
         logger.error('other error')
@@ -60,7 +89,7 @@ def get_data(roadside_unit_id, service_location_id, query_params):
     return data_list, response_status
 
 
-def get_data_execute(roadside_unit_id, service_location_id, query_params, response_status):
+def get_data_execute(roadside_unit_id, service_location_id, query_params, response_status, history_items=None):
     """
     物標情報取得
     Parameters
@@ -73,6 +102,8 @@ def get_data_execute(roadside_unit_id, service_location_id, query_params, respon
         クエリパラメータ
     response_status : int
         処理完了ステータス
+    history_items : dict
+        ElastiCacheの履歴から取得した機器種別IDごとの物標情報
 
     Returns
     -------
@@ -88,12 +119,12 @@ def get_data_execute(roadside_unit_id, service_location_id, query_params, respon
     t_target_info = dynamoDB.Table(t_target_name)
 
     # 物標情報を整形し、取得
-    result, response_status = get_target_value(roadside_unit_id, service_location_id, t_target_info, response_status, query_params)
+    result, response_status = get_target_value(roadside_unit_id, service_location_id, t_target_info, response_status, query_params, history_items)
 
     return result, response_status
 
 
-def get_target_value(roadside_unit_id, service_location_id, t_target_info, response_status, query_params):
+def get_target_value(roadside_unit_id, service_location_id, t_target_info, response_status, query_params, history_items=None):
     """
     物標情報を整形し、取得
     Parameters
@@ -108,6 +139,8 @@ def get_target_value(roadside_unit_id, service_location_id, t_target_info, respo
         路側機ID
     query_params : list
         クエリパラメータ
+    history_items : dict
+        ElastiCacheの履歴から取得した機器種別IDごとの物標情報
 
     Returns
     -------
@@ -130,18 +163,44 @@ def get_target_value(roadside_unit_id, service_location_id, t_target_info, respo
     device_ids = get_device_ids(roadside_unit_id, service_location_id, device_ids, query_params)
 
     if len(device_ids) != 0:
-        for device_id in device_ids:
-            # クエリの取得
-            target_query = get_query_items(query_params, device_id)
-            # クエリの実行
+        # 期間と解像度から間引き階層を選択
+        tier_seconds = get_tier_seconds(query_params)
+
+        # 履歴から取得済みの場合は物標情報テーブルを検索しない(機器種別ごとに古い順に上限件数まで)
+        minute_items = None
+        if history_items is not None and tier_seconds == 0:
+            minute_items = {device_id: items[:MAX_TARGET_NUM] for device_id, items in history_items.items()}
+        # 間引き階層を使用する場合、または期間が短い場合はパーティションを並列に検索
+        elif tier_seconds > 0 or is_fan_out_query(query_params):
             try:
-                response = t_target_info.query(**target_query)
+                if tier_seconds > 0:
+                    minute_items = get_tier_items(t_target_info, query_params, device_ids, tier_seconds)
+                else:
+                    minute_items = get_minute_items(t_target_info, query_params)
             except ClientError as e:
                 if e.response['Error']['Code'] == 'ResourceNotFoundException':
                     response_status = 204
                     return result, response_status
+                raise
 
-            target_items = response['Items']
+        for device_id in device_ids:
+            if minute_items is not None:
+                target_items = minute_items.get(int(device_id), [])
+            else:
+                # クエリの取得
+                target_query = get_query_items(query_params, device_id)
+                # クエリの実行
+                try:
+                    response = t_target_info.query(**target_query)
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                        response_status = 204
+                        return result, response_status
+
+                target_items = response['Items']
+
+            # 差分フレームを基準フレームと合成
+            target_items = target_codec.resolve_items(t_target_info, target_items)
 
             if len(target_items) != 0:
                 filter_target_items = get_filter_target_items(target_items, query_params)
@@ -207,14 +266,18 @@ def get_query_items(query_params, device_id):
         'Limit': MAX_TARGET_NUM
     }
 
+    # time_utcはアイテム内の最小の時刻のため、終了時刻はそのまま範囲の上限とし、
+    # 開始時刻より前に始まるアイテムはtime_utc_max(最大の時刻)で絞り込む
     # 両方指定された場合、古い順から取得
     if 'startAt' in query_params and 'endAt' in query_params:
         query['KeyConditionExpression'] &= Key('time_utc').between(getTimeUtc(query_params['startAt'], 'start_at'), getTimeUtc(query_params['endAt'], 'end_at'))
+        query['FilterExpression'] = get_overlap_filter(getTimeUtc(query_params['startAt'], 'time_utc_max'))
         query['ScanIndexForward'] = True
 
     # start_atのみ指定された場合、古い順から取得
     elif 'startAt' in query_params:
         query['KeyConditionExpression'] &= Key('time_utc').gte(getTimeUtc(query_params['startAt'], 'start_at'))
+        query['FilterExpression'] = get_overlap_filter(getTimeUtc(query_params['startAt'], 'time_utc_max'))
         query['ScanIndexForward'] = True
 
     # end_atのみ指定された場合、新しい順から取得
@@ -225,6 +288,301 @@ def get_query_items(query_params, device_id):
     return query
 
 
+def get_overlap_filter(start_at):
+    """
+    検索開始時刻以降の物標を含むアイテムのみ返すフィルタを取得
+    time_utc_maxを持たない従来のアイテムはキー条件の範囲のまま返す
+    Parameters
+    ----------
+    start_at : string
+        検索開始時刻(UTC)
+
+    Returns
+    -------
+    filter_expression :
+        フィルタ条件
+    """
+
+    return Attr('time_utc_max').gte(start_at) | Attr('time_utc_max').not_exists()
+
+
+def is_fan_out_query(query_params):
+    """
+    分単位パーティションの並列検索を行うか判定
+    Parameters
+    ----------
+    query_params : list
+        クエリパラメータ
+
+    Returns
+    -------
+    is_fan_out : bool
+        並列検索を行う場合True
+    """
+
+    if TARGET_SHARD_NUM <= 0 or TARGET_FAN_OUT_MAX_MINUTES <= 0:
+        return False
+    if 'startAt' not in query_params or 'endAt' not in query_params:
+        return False
+
+    return len(get_minutes_range(query_params)) <= TARGET_FAN_OUT_MAX_MINUTES
+
+
+def get_minutes_range(query_params):
+    """
+    検索範囲に含まれるUTCの「分」を取得
+    Parameters
+    ----------
+    query_params : list
+        クエリパラメータ
+
+    Returns
+    -------
+    minutes_range : list
+        UTCの「分」(YYYY-MM-DD HH:MM)の配列
+    """
+
+    # UNIXエポックからの分に変換
+    start_minute = time_util.parse_epoch_ms(getTimeUtc(query_params['startAt'], 'start_at')) // 60000
+    end_minute = time_util.parse_epoch_ms(getTimeUtc(query_params['endAt'], 'end_at')) // 60000
+
+    minutes_range = []
+    for current_minute in range(start_minute, end_minute + 1):
+        minutes_range.append(time_util.format_utc(current_minute * 60000)[:16].replace('T', ' '))
+
+    return minutes_range
+
+
+def get_minute_items(t_target_info, query_params, max_item_num=MAX_TARGET_NUM):
+    """
+    検索範囲の分単位パーティションを全シャード並列に検索し、機器種別IDごとにまとめる
+    Parameters
+    ----------
+    t_target_info
+        物標情報テーブル
+    query_params : list
+        クエリパラメータ
+    max_item_num : int
+        機器種別ごとの上限件数(Noneの場合は全件)
+
+    Returns
+    -------
+    minute_items : dict
+        機器種別IDごとの物標情報アイテム(time_utc昇順)
+    """
+
+    filter_expression = Attr('time_utc').between(getTimeUtc(query_params['startAt'], 'start_at'), getTimeUtc(query_params['endAt'], 'end_at')) & \
+        get_overlap_filter(getTimeUtc(query_params['startAt'], 'time_utc_max'))
+
+    # パーティションキーは「UTCの分#シャード番号」
+    partition_keys = [f'{minutes}#{shard}' for minutes in get_minutes_range(query_params) for shard in range(TARGET_SHARD_NUM)]
+
+    minute_items = {}
+    for partition_items in executor.map(lambda partition_key: query_partition(t_target_info.name, partition_key, filter_expression), partition_keys):
+        for item in partition_items:
+            minute_items.setdefault(int(item['deviceID']), []).append(item)
+
+    # 機器種別ごとに古い順に並べ、上限件数までとする
+    for device_id, items in minute_items.items():
+        minute_items[device_id] = sorted(items, key=lambda x: x['time_utc'])[:max_item_num]
+
+    return minute_items
+
+
+def query_partition(table_name, partition_key, filter_expression=None, sort_key_condition=None):
+    """
+    1パーティションを検索(ページングして全件取得)
+    Parameters
+    ----------
+    table_name : string
+        物標情報テーブル名
+    partition_key : string
+        パーティションキー
+    filter_expression :
+        検索範囲のフィルタ条件
+    sort_key_condition :
+        ソートキー(unique_time)の条件
+
+    Returns
+    -------
+    items : list
+        物標情報アイテム
+    """
+
+    query = {
+        'TableName': table_name,
+        'KeyConditionExpression': Key('time_minutes').eq(partition_key),
+    }
+    if sort_key_condition is not None:
+        query['KeyConditionExpression'] &= sort_key_condition
+    if filter_expression is not None:
+        query['FilterExpression'] = filter_expression
+
+    items = []
+    while True:
+        # スレッド間で共有できるクライアントを使用
+        response = dynamoDB.meta.client.query(**query)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return items
+
+
+def get_tier_seconds(query_params):
+    """
+    使用する間引き階層の間隔を取得
+    解像度(resolution、秒)が指定された場合はその値以下で最も粗い階層、
+    指定されない場合は期間が短ければ間引きなし、それ以外は区間数が上限に収まる最も細かい階層とする
+    Parameters
+    ----------
+    query_params : list
+        クエリパラメータ
+
+    Returns
+    -------
+    tier_seconds : int
+        間引きの間隔(秒)、0の場合は間引きなし
+    """
+
+    # 間引き階層は開始・終了時刻の両方が指定された場合のみ使用
+    if not TARGET_TIER_SECONDS or 'startAt' not in query_params or 'endAt' not in query_params:
+        return 0
+
+    resolution = query_params.get('resolution')
+    if resolution is not None:
+        if resolution == RESOLUTION_RAW:
+            return 0
+        try:
+            return max((seconds for seconds in TARGET_TIER_SECONDS if seconds <= float(resolution)), default=0)
+        except ValueError:
+            logger.warning(f'invalid resolution: {resolution}')
+
+    span_seconds = (time_util.parse_epoch_ms(query_params['endAt'].replace(" ", "+")) - time_util.parse_epoch_ms(query_params['startAt'].replace(" ", "+"))) / 1000
+    if span_seconds <= TARGET_TIER_RAW_MAX_SECONDS:
+        return 0
+
+    for seconds in TARGET_TIER_SECONDS:
+        if span_seconds / seconds <= TARGET_TIER_MAX_BUCKETS:
+            return seconds
+
+    return TARGET_TIER_SECONDS[-1]
+
+
+def get_tier_items(t_target_info, query_params, device_ids, tier_seconds):
+    """
+    間引き階層の時単位パーティションを機器種別・時ごとに並列に検索し、機器種別IDごとにまとめる
+    Parameters
+    ----------
+    t_target_info
+        物標情報テーブル
+    query_params : list
+        クエリパラメータ
+    device_ids : array
+        機器種別ID格納配列
+    tier_seconds : int
+        間引きの間隔(秒)
+
+    Returns
+    -------
+    tier_items : dict
+        機器種別IDごとの間引き階層のアイテム(区間の開始時刻昇順)
+    """
+
+    # 開始時刻を含む区間から終了時刻までの区間(unique_timeは区間の開始時刻)
+    tier_ms = tier_seconds * 1000
+    start_ms = time_util.parse_epoch_ms(query_params['startAt'].replace(" ", "+")) // tier_ms * tier_ms
+    end_ms = time_util.parse_epoch_ms(query_params['endAt'].replace(" ", "+"))
+    sort_key_condition = Key('unique_time').between(time_util.format_utc(start_ms), time_util.format_utc(end_ms))
+
+    # パーティションキーは「tier{間隔}#UTCの時#機器種別ID」
+    partition_keys = [
+        f"{TIER_PARTITION_KEY_PREFIX}{tier_seconds}#{time_util.format_utc(hour_ms)[:13].replace('T', ' ')}#{device_id}"
+        for device_id in device_ids for hour_ms in range(start_ms // HOUR_MS * HOUR_MS, end_ms + 1, HOUR_MS)
+    ]
+
+    tier_items = {}
+    for partition_items in executor.map(lambda partition_key: query_partition(t_target_info.name, partition_key, sort_key_condition=sort_key_condition), partition_keys):
+        for item in partition_items:
+            tier_items.setdefault(int(item['deviceID']), []).append(item)
+
+    # 未反映の区間(最後に反映された区間より後)は物標情報テーブルの物標情報を間引いて補う
+    flushed_end_ms = max((time_util.parse_epoch_ms(item['unique_time']) + tier_ms for items in tier_items.values() for item in items), default=start_ms)
+    for device_id, items in get_unflushed_tier_items(t_target_info, query_params, tier_seconds, flushed_end_ms).items():
+        tier_items.setdefault(device_id, []).extend(items)
+
+    # 機器種別ごとに古い順に並べ、上限件数までとする
+    for device_id, items in tier_items.items():
+        tier_items[device_id] = sorted(items, key=lambda x: x['unique_time'])[:MAX_TARGET_NUM]
+
+    logger.info(f'tier:{tier_seconds}s partitions:{len(partition_keys)} items:{sum(len(items) for items in tier_items.values())}')
+
+    return tier_items
+
+
+def get_unflushed_tier_items(t_target_info, query_params, tier_seconds, flushed_end_ms):
+    """
+    tier_functionが未反映の区間の物標情報を物標情報テーブルから取得し、間引き階層のアイテムと同じ形式に間引く
+    (区間ごとに物標IDごとの最新の物標情報とする)
+    Parameters
+    ----------
+    t_target_info
+        物標情報テーブル
+    query_params : list
+        クエリパラメータ
+    tier_seconds : int
+        間引きの間隔(秒)
+    flushed_end_ms : int
+        反映済みの最後の区間の終了時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    tier_items : dict
+        機器種別IDごとの区間ごとのアイテム(targetIndividualInfoは復元済みの物標情報配列)
+    """
+
+    # 反映待ち時間と実行間隔の経過前に終了した区間は反映済みのため、それ以降の区間のみ補う
+    tier_ms = tier_seconds * 1000
+    unflushed_start_ms = (int(time_module.time() * 1000) - (TARGET_TIER_FLUSH_DELAY_SECONDS + TARGET_TIER_FLUSH_INTERVAL_SECONDS) * 1000) // tier_ms * tier_ms
+    start_ms = max(flushed_end_ms, unflushed_start_ms)
+    end_ms = time_util.parse_epoch_ms(query_params['endAt'].replace(" ", "+"))
+    if TARGET_SHARD_NUM <= 0 or start_ms > end_ms:
+        return {}
+
+    # 間引く前に上限件数で切り捨てないよう全件取得する
+    minute_items = get_minute_items(t_target_info, {**query_params, 'startAt': time_util.format_utc(start_ms)}, None)
+
+    tier_items = {}
+    for device_id, items in minute_items.items():
+        buckets = {}
+        for item in target_codec.resolve_items(t_target_info, items):
+            for target in target_codec.decode(item['targetIndividualInfo']):
+                epoch_ms = time_util.parse_epoch_ms(target['time'])
+                if epoch_ms < start_ms or epoch_ms > end_ms:
+                    continue
+                bucket = buckets.setdefault(epoch_ms // tier_ms * tier_ms, {'item': item, 'targets': {}})
+                current = bucket['targets'].get(target['targetID'])
+                if current is None or current[0] <= epoch_ms:
+                    bucket['targets'][target['targetID']] = (epoch_ms, target)
+                if item['time_utc'] >= bucket['item']['time_utc']:
+                    bucket['item'] = item
+
+        tier_items[device_id] = [
+            {
+                **{key: bucket['item'][key] for key in ('roadsideUnitID', 'serviceLocationID', 'updateTimeInfo', 'formatVersion', 'deviceID', 'dataModelType') if key in bucket['item']},
+                'unique_time': time_util.format_utc(bucket_ms),
+                'tier_seconds': tier_seconds,
+                'targetIndividualInfo': [target for _, target in sorted(bucket['targets'].values(), key=lambda x: (x[0], x[1]['targetID']))],
+            }
+            for bucket_ms, bucket in sorted(buckets.items())
+        ]
+
+    logger.info(f'tier:{tier_seconds}s unflushed from:{time_util.format_utc(start_ms)} items:{sum(len(items) for items in tier_items.values())}')
+
+    return tier_items
+
+
 def get_filter_target_items(target_items, query_params):
     """
     配列からデータを取り出して正確な時刻にて再検索
@@ -241,73 +599,78 @@ def get_filter_target_items(target_items, query_params):
         再検索されたデータ
     """
 
-    dfs = []
-    for target_item in target_items:
-        target_info_list = ast.literal_eval(target_item["targetIndividualInfo"])
-        # 物標情報をDataFrameに変換
-        if target_info_list:
-            target_info_df = pd.DataFrame(target_info_list)
-
-            device_id_data = {
-                'deviceID': target_item['deviceID'] for key in target_item
-            }
-            # 機器種別IDのみdictをDataFrameに変換
-            device_id_data_df = pd.DataFrame([device_id_data] * len(target_info_df))
-
-            # 物標情報と機器種別IDのDataFrameを結合
-            combined_df = pd.concat([device_id_data_df, target_info_df], axis=1)
-            # 結果をリストに追加
-            dfs.append(combined_df)
-
-    # 全レコードを統合
-    df = pd.concat(dfs, ignore_index=True)
-
-    df["time"] = pd.to_datetime(df["time"], format='%Y-%m-%dT%H:%M:%S.%f%z')
-
     if 'startAt' in query_params:
         start_at = query_params['startAt'].replace(" ", "+")
-        format_start_at = datetime.fromisoformat(start_at)
+        format_start_at = time_util.parse(start_at)
     if 'endAt' in query_params:
         end_at = query_params['endAt'].replace(" ", "+")
-        format_end_at = datetime.fromisoformat(end_at)
-
-    # 両方指定された場合、古い順から取得
-    if 'startAt' in query_params and 'endAt' in query_params:
-        filtered_df = df[(df["time"] >= format_start_at) & (df["time"] <= format_end_at)]
-        filtered_df = filtered_df.sort_values(by="time")
+        format_end_at = time_util.parse(end_at)
 
-    # start_atのみ指定された場合、古い順から取得
-    elif 'startAt' in query_params:
-        filtered_df = df[(df["time"] >= format_start_at)]
-        filtered_df = filtered_df.sort_values(by="time")
+    # 全アイテムが検索範囲に収まる場合は物標ごとの時刻の比較を省略
+    is_in_range = 'startAt' in query_params and 'endAt' in query_params and is_items_in_range(target_items, query_params)
 
-    # end_atのみ指定された場合、新しい順から取得
-    elif 'endAt' in query_params:
-        filtered_df = df[(df["time"] <= format_end_at)]
-        filtered_df = filtered_df.sort_values(by="time", ascending=False)
-
-    # 機器種別ごとの上限の物標情報のみ抽出
-    filtered_df = filtered_df.head(MAX_TARGET_NUM)
-
-    # 各キーを定義
-    info_keys = ['commonServiceStandardID', 'targetMessageID', 'targetIndividualVersionInfo', 'targetID', 'targetIndividualIncrementCounter', 'dataLength', 'individualOptionFlag', 'leapSecondCorrectionInfo', 'time', 'latitude', 'longitude', 'elevation', 'positionConf', 'elevationConf', 'speed', 'heading', 'acceleration', 'speedConf', 'headingConf', 'forwardRearAccelerationConf', 'transmissionState', 'steeringWheelAngle', 'sizeClassification', 'roleClassification', 'vehicleWidth', 'vehicleLength', 'positionDelay', 'revisionCounter', 'roadFacilities', 'roadClassification', 'semiMajorAxisOfPositionalErrorEllipse', 'semiMinorAxisOfPositionalErrorEllipse', 'semiMajorAxisOrientationOfPositionalErrorEllipse', 'GPSPositioningMode', 'GPSPDOP', 'numberOfGPSSatellitesInUse', 'GPSMultiPathDetection', 'deadReckoningAvailability', 'mapMatchingAvailability', 'yawRate', 'brakeAppliedStatus', 'auxiliaryBrakeAppliedStatus', 'throttlePosition', 'exteriorLights', 'adaptiveCruiseControlStatus', 'cooperativeAdaptiveCruiseControlStatus', 'preCrashSafetyStatus', 'antilockBrakeStatus', 'tractionControlStatus', 'electronicStabilityControlStatus', 'laneKeepingAssistStatus', 'laneDepartureWarningStatus', 'intersectionDistanceInformationAvailability', 'intersectionDistance', 'intersectionPositionInformationAvailability', 'intersectionLatitude', 'intersectionLongitude', 'extendedInformation', 'targetIndividualExtendedData', 'restingState', 'existingTime']
-    # 各レコードを辞書としてリスト化
+    rows = []
+    for target_item in target_items:
+        # 格納形式に応じて物標情報を列指向で復元
+        target_info_columns = target_codec.decode_columns(target_item["targetIndividualInfo"])
+        if not target_info_columns.get('time'):
+            continue
+
+        # 項目辞書の順に、物標が持つ項目の列のみ取り出す
+        columns = [(key, target_info_columns[key]) for key in INFO_KEYS if key in target_info_columns]
+
+        for row_index, time in enumerate(target_info_columns['time']):
+            target_time = time_util.parse(time)
+            if not is_in_range:
+                # 両方指定された場合、またはstart_atのみ指定された場合は開始時刻以降
+                if 'startAt' in query_params and target_time < format_start_at:
+                    continue
+                # 両方指定された場合、またはend_atのみ指定された場合は終了時刻以前
+                if 'endAt' in query_params and target_time > format_end_at:
+                    continue
+            rows.append((target_time, target_item['deviceID'], columns, row_index))
+
+    # start_atが指定された場合は古い順、end_atのみ指定された場合は新しい順
+    rows.sort(key=lambda x: x[0], reverse='startAt' not in query_params)
+
+    # 機器種別ごとの上限の物標情報のみ抽出し、値を持つ項目のみ辞書化
     result = []
-    for _, row in filtered_df.iterrows():
+    for target_time, device_id, columns, row_index in rows[:MAX_TARGET_NUM]:
         target_individual_info = {}
-        for key in info_keys:
-            # キーが存在し、値がある場合のみ処理を実行
-            if key in row and not pd.isna(row[key]):
-                # "time" の場合は isoformat() を使用、それ以外はそのままの値を取得
-                target_individual_info[key] = row[key].isoformat() if key == "time" else row.get(key)
+        for key, column in columns:
+            if column[row_index] is not None:
+                target_individual_info[key] = column[row_index]
+        target_individual_info['time'] = target_time.isoformat()
 
         result.append({
-            "deviceID": row["deviceID"],
+            "deviceID": device_id,
             "targetIndividualInfo": target_individual_info
         })
     return result
 
 
+def is_items_in_range(target_items, query_params):
+    """
+    全アイテムの物標の時刻(time_utc～time_utc_max)が検索範囲に収まるか判定
+    Parameters
+    ----------
+    target_items
+        物標情報データ
+    query_params: list
+        クエリパラメータ
+
+    Returns
+    -------
+    is_in_range : bool
+        全アイテムが検索範囲に収まる場合True
+    """
+
+    start_at = getTimeUtc(query_params['startAt'], 'time_utc_min')
+    end_at = getTimeUtc(query_params['endAt'], 'time_utc_max')
+
+    return all('time_utc_max' in item and item['time_utc'] >= start_at and item['time_utc_max'] <= end_at for item in target_items)
+
+
 def getTimeUtc(time, search_parameter):
     """
     タイムゾーンをutcに変換
@@ -324,21 +687,16 @@ def getTimeUtc(time, search_parameter):
     # パラメータの値を変更
     format_time = time.replace(" ", "+")
 
-    # iso形式の文字列をdatetimeオブジェクトに変換
-    iso_time = datetime.fromisoformat(format_time)
-
-    # タイムゾーンをutcに変換
-    utc_time = iso_time.astimezone(timezone.utc)
+    # UNIXエポックからのミリ秒に変換
+    epoch_ms = time_util.parse_epoch_ms(format_time)
 
-    # start_atが指定された場合時刻から1秒引く
+    # start_atが指定された場合時刻から1秒引く(アイテム内の物標の時刻の幅)
+    # アイテムのtime_utcは最小の時刻のため、end_atは時刻をそのまま使用する
     if 'start_at' in search_parameter:
-        utc_time = utc_time - timedelta(seconds=RANGE_SECONDS)
-    # end_atが指定された場合は時刻に1秒足す
-    elif 'end_at' in search_parameter:
-        utc_time = utc_time + timedelta(seconds=RANGE_SECONDS)
+        epoch_ms -= RANGE_SECONDS * 1000
 
-    # フォーマットを整える
-    utc_time = utc_time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    # UTCに変換し、フォーマットを整える
+    utc_time = time_util.format_utc(epoch_ms)
 
     return utc_time
 
@@ -2,14 +2,29 @@
 
 import json
 import logging
-from datetime import datetime
+import os
+import time
 
+import cache_codec
 import redis
+import time_util
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 環境変数取得
+TARGET_HISTORY_SECONDS = int(os.environ.get('TARGET_HISTORY_SECONDS', '0'))
+
+# 機器ごとの直近の物標情報(履歴)のキーのプレフィックス(h:r{路側機ID}s{サービス地点情報ID}d{機器種別ID})
+HISTORY_KEY_PREFIX = 'h:'
+
+# 路側機・サービス地点ごとに履歴の格納を開始したフレームの時刻のキーのプレフィックス(h:since:r{路側機ID}s{サービス地点情報ID})
+HISTORY_SINCE_KEY_PREFIX = 'h:since:'
+
+# 路側機・サービス地点ごとの物標IDから最新の物標情報へのハッシュのキーのプレフィックス(t:r{路側機ID}s{サービス地点情報ID})
+TARGET_INDEX_KEY_PREFIX = 't:'
+
 
 def get_data(roadside_unit_id, service_location_id, query_params, redis_host):
     """
@@ -72,11 +87,11 @@ def get_data_execute(roadside_unit_id, service_location_id, query_params, redis_
     result = []
     target_key_name = ''
 
-    # ElastiCacheに接続
+    # ElastiCacheに接続(圧縮された値を取得するためバイト列のまま受け取る)
     redis_client = redis.StrictRedis(
         host=redis_host,
         port='6379',
-        decode_responses=True,
+        decode_responses=False,
         db=0
     )
 
@@ -131,9 +146,182 @@ def get_elasticache_items(redis_client, target_key_name):
 
     all_items = redis_client.mget(all_keys)
 
+    # 圧縮されている値を展開
+    if any(item and item[0] == cache_codec.MAGIC_BYTE for item in all_items):
+        start_time = time.perf_counter()
+        stored_bytes = sum(len(item) for item in all_items if item)
+        all_items = [cache_codec.decompress(item) for item in all_items]
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f'cache keys:{len(all_items)} storedBytes:{stored_bytes} rawBytes:{sum(len(item) for item in all_items if item)} decompress latency:{elapsed_ms:.1f}ms')
+
     return all_items
 
 
+def get_history_items(roadside_unit_id, service_location_id, query_params, redis_host, range_seconds):
+    """
+    検索範囲が履歴の保持期間内の場合、機器種別IDごとの履歴を取得
+    Parameters
+    ----------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    query_params : list
+        クエリパラメータ
+    redis_host
+        redis接続用のホスト
+    range_seconds : int
+        1フレームの物標の時刻の幅(秒)
+
+    Returns
+    -------
+    history_items : dict
+        機器種別IDごとの物標情報(time_utc昇順)、履歴から取得できない場合はNone
+    """
+
+    # 開始時刻が指定されていない場合は範囲が保持期間を超えるため対象外
+    if TARGET_HISTORY_SECONDS <= 0 or 'startAt' not in query_params:
+        return None
+
+    start_at = time_util.parse_epoch_ms(query_params['startAt'].replace(" ", "+"))
+    end_at = time_util.parse_epoch_ms(query_params['endAt'].replace(" ", "+")) if 'endAt' in query_params else '+inf'
+
+    # 開始時刻より前に始まるフレームを含めて保持期間内の場合のみ対象
+    min_score = start_at - range_seconds * 1000
+    if min_score < time.time() * 1000 - TARGET_HISTORY_SECONDS * 1000:
+        return None
+
+    try:
+        redis_client = redis.StrictRedis(
+            host=redis_host,
+            port='6379',
+            decode_responses=False,
+            db=0
+        )
+
+        # 格納開始より前の範囲は履歴に含まれないため対象外
+        location_key = f'r{roadside_unit_id}s{service_location_id}'
+        since_time = redis_client.get(f'{HISTORY_SINCE_KEY_PREFIX}{location_key}')
+        if since_time is None or int(since_time) > min_score:
+            return None
+
+        if 'deviceID' in query_params:
+            history_keys = [f"{HISTORY_KEY_PREFIX}{location_key}d{query_params['deviceID']}"]
+        else:
+            history_keys = [key.decode('utf-8') for key in redis_client.scan_iter(match=f'{HISTORY_KEY_PREFIX}{location_key}d*', count=1000)]
+
+        pipeline = redis_client.pipeline(transaction=False)
+        for history_key in history_keys:
+            pipeline.zrangebyscore(history_key, min_score, end_at)
+        history_members = pipeline.execute()
+
+    except redis.RedisError:
+        logger.warning('history skipped')
+        return None
+
+    # 開始時刻より前に終わるフレームを除外
+    start_at_utc = time_util.format_utc(start_at)
+    history_items = {}
+    frame_count = 0
+    for history_key, members in zip(history_keys, history_members):
+        items = [json.loads(cache_codec.decompress(member)) for member in members]
+        items = [item for item in items if item['time_utc_max'] >= start_at_utc]
+        if items:
+            history_items[int(history_key.rsplit('d', 1)[1])] = items
+            frame_count += len(items)
+
+    logger.info(f'history keys:{len(history_keys)} frames:{frame_count}')
+
+    return history_items
+
+
+def get_target_index_data(roadside_unit_id, service_location_id, query_params, redis_host):
+    """
+    物標ID(カンマ区切りで複数指定可)ごとの最新の物標情報を取得
+    Parameters
+    ----------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    query_params : list
+        クエリパラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    result : dict
+        取得されたデータ
+    response_status : int
+        処理完了ステータス
+    """
+
+    result = {}
+    response_status = 200
+
+    try:
+        # ElastiCacheに接続
+        redis_client = redis.StrictRedis(
+            host=redis_host,
+            port='6379',
+            decode_responses=True,
+            db=0
+        )
+
+        # 物標IDごとの最新の物標情報を1回の通信で取得
+        target_ids = [target_id.strip() for target_id in query_params['targetID'].split(',') if target_id.strip()]
+        target_values = redis_client.hmget(f'{TARGET_INDEX_KEY_PREFIX}r{roadside_unit_id}s{service_location_id}', target_ids) if target_ids else []
+
+        # 機器種別IDごとにまとめる(機器種別IDが指定された場合はその機器のみ)
+        device_individual_infos = {}
+        latest_update_time = None
+        for target_value in target_values:
+            if target_value is None:
+                continue
+            target_value = json.loads(target_value)
+            if 'deviceID' in query_params and str(target_value['deviceID']) != str(query_params['deviceID']):
+                continue
+
+            # 最初の物標のみdeviceIndividualInfo以外の項目を代入
+            if not result:
+                if 'dataModelType' in target_value:
+                    result['dataModelType'] = str(target_value['dataModelType'])
+                result['attribute'] = {
+                    'serviceLocationID': int(service_location_id),
+                    'roadsideUnitID': int(roadside_unit_id),
+                    'updateTimeInfo': target_value['updateTimeInfo'],
+                    'formatVersion': int(target_value['formatVersion']),
+                    'deviceNum': 0,
+                    'deviceIndividualInfo': [],
+                }
+            # 最新のupdateTimeInfoを代入
+            update_time = time_util.parse_epoch_ms(target_value['updateTimeInfo'])
+            if latest_update_time is None or update_time > latest_update_time:
+                latest_update_time = update_time
+                result['attribute']['updateTimeInfo'] = target_value['updateTimeInfo']
+
+            device_individual_info = device_individual_infos.setdefault(target_value['deviceID'], {
+                'deviceID': target_value['deviceID'],
+                'targetNum': 0,
+                'targetIndividualInfo': []
+            })
+            device_individual_info['targetIndividualInfo'].append(target_value['targetIndividualInfo'])
+            device_individual_info['targetNum'] = len(device_individual_info['targetIndividualInfo'])
+
+        if result:
+            result['attribute']['deviceIndividualInfo'] = list(device_individual_infos.values())
+            result['attribute']['deviceNum'] = len(device_individual_infos)
+        else:
+            response_status = 204
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+    return result, response_status
+
+
 def get_target_value(target_items, response_status):
     """
     物標情報を整形し、取得
@@ -175,11 +363,11 @@ def get_target_value(target_items, response_status):
 
             # updateTimeInfo比較し、変数に値がない場合代入
             if latest_update_time == '':
-                latest_update_time = datetime.strptime(target_item['attribute']['updateTimeInfo'], '%Y-%m-%dT%H:%M:%S.%f%z')
+                latest_update_time = time_util.parse_epoch_ms(target_item['attribute']['updateTimeInfo'])
                 result['attribute']['updateTimeInfo'] = target_item['attribute']['updateTimeInfo']
             # updateTimeInfoを比較し、最新のupdateTimeInfoを代入
             else:
-                current_update_time = datetime.strptime(target_item['attribute']['updateTimeInfo'], '%Y-%m-%dT%H:%M:%S.%f%z')
+                current_update_time = time_util.parse_epoch_ms(target_item['attribute']['updateTimeInfo'])
                 if current_update_time > latest_update_time:
                     latest_update_time = current_update_time
                     result['attribute']['updateTimeInfo'] = target_item['attribute']['updateTimeInfo']
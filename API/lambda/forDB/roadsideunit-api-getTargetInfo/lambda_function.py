@@ -47,8 +47,15 @@ def lambda_handler(event, context):
 
         # パラメータにて時間の指定がされている場合はDynamoDBからデータを取得
         if 'startAt' in query_params or 'endAt' in query_params:
+            # 範囲がElastiCacheの履歴の保持期間内の場合は履歴から取得(間引き階層を使用する場合は除く)
+            history_items = None
+            if dynamodb_execute.get_tier_seconds(query_params) == 0:
+                history_items = elasticache_execute.get_history_items(roadside_unit_id, service_location_id, query_params, REDIS_HOST, dynamodb_execute.RANGE_SECONDS)
             # DynamoDBからデータ取得
-            data, res = dynamodb_execute.get_data(roadside_unit_id, service_location_id, query_params)
+            data, res = dynamodb_execute.get_data(roadside_unit_id, service_location_id, query_params, history_items)
+        # 物標IDが指定された場合はElastiCacheから物標IDごとの最新のデータを取得
+        elif 'targetID' in query_params:
+            data, res = elasticache_execute.get_target_index_data(roadside_unit_id, service_location_id, query_params, REDIS_HOST)
         # パラメータの時間指定がない場合はElastiCacheから最新のデータを取得
         else:
             # ElastiCacheからデータ取得
@@ -1,39 +1,102 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
-from datetime import datetime
 
+import time_util
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 死活情報のスキーマ(データフォーマット仕様書)
+ALIVE_MONITORING_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': [
+                'serviceLocationID',
+                'roadsideUnitID',
+                'updateTimeInfo',
+                'formatVersion',
+                'operationClassificationCode',
+                'serviceAvailability',
+                'deviceClassificationNum',
+                'deviceClassificationAliveInfo',
+            ],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'operationClassificationCode': {'type': 'integer', 'minimum': 0, 'maximum': 1},
+                'serviceAvailability': {'type': 'integer', 'minimum': 0, 'maximum': 2},
+                'deviceClassificationNum': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                'deviceClassificationAliveInfo': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'required': ['deviceClassification'],
+                        'properties': {
+                            'deviceClassification': {'type': 'integer', 'minimum': 0, 'maximum': 2},
+                            'deviceNum': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                            'deviceAliveInfo': {
+                                'type': 'array',
+                                'items': {
+                                    'type': 'object',
+                                    'required': ['deviceID'],
+                                    'properties': {
+                                        'deviceID': {'type': 'integer', 'minimum': 0, 'maximum': 16777215},
+                                        'deviceOperationStatus': {'type': 'integer', 'minimum': 0, 'maximum': 1},
+                                        'deviceAliveStatus': {'type': 'integer', 'minimum': 0, 'maximum': 2},
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
 
-def get_body(body):
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_alive_monitoring_info = validator.compile_schema(ALIVE_MONITORING_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     body 要素取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
+
     Returns
     -------
     parameters  : Array
         グループ名
     """
 
-    body_data = json.loads(body)
+    body_data = validate_alive_monitoring_info(body_data)
 
     parameters = {}
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
     parameters['attribute']['time_minutes'] = getTimeMinutes(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['roadsideUnitID'] = int(body_data['attribute']['roadsideUnitID'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
-    parameters['attribute']['operationClassificationCode'] = int(body_data['attribute']['operationClassificationCode'])
-    parameters['attribute']['serviceAvailability'] = int(body_data['attribute']['serviceAvailability'])
-    parameters['attribute']['deviceClassificationNum'] = int(body_data['attribute']['deviceClassificationNum'])
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['roadsideUnitID'] = body_data['attribute']['roadsideUnitID']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
+    parameters['attribute']['operationClassificationCode'] = body_data['attribute']['operationClassificationCode']
+    parameters['attribute']['serviceAvailability'] = body_data['attribute']['serviceAvailability']
+    parameters['attribute']['deviceClassificationNum'] = body_data['attribute']['deviceClassificationNum']
     parameters['attribute']['deviceClassificationAliveInfo'] = body_data['attribute']['deviceClassificationAliveInfo']
 
     return parameters
@@ -52,8 +115,7 @@ def getTimeMinutes(updateTimeInfo):
     format_update_time : String
         更新時刻情報（分まで）
     """
-    update_time = datetime.strptime(updateTimeInfo, '%Y-%m-%dT%H:%M:%S.%f%z')
     # 時刻を「分」までのフォーマットで取得
-    format_update_time = update_time.strftime('%Y-%m-%d %H:%M')
+    format_update_time = time_util.to_minutes(updateTimeInfo)
 
     return format_update_time
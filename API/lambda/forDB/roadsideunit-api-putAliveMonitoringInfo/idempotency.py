@@ -0,0 +1,189 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import hashlib
+import json
+import logging
+import os
+
+import redis
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '300'))
+# 処理中の重複判定キーの保持秒数(処理中にLambdaがタイムアウトした場合も再送を受け付けるよう、Lambdaのタイムアウト程度とする)
+IDEMPOTENCY_PROCESSING_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_PROCESSING_TTL_SECONDS', '30'))
+
+# 重複判定キーを格納するElastiCacheのDB番号(db0:物標情報、db1:死活監視情報)
+IDEMPOTENCY_DB = 2
+
+# 重複判定キーの状態
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+
+# ElastiCache接続(ウォームスタート時は再利用する)
+redis_clients = {}
+
+
+def claim(parameters_list, redis_host):
+    """
+    フレームごとの重複判定キーを登録し、未処理のフレームのみ取得
+    ElastiCacheに接続できない場合は重複判定を行わず全フレームを返す
+    Parameters
+    ----------
+    parameters_list : list
+        フレームごとのパラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    new_parameters_list : list
+        未処理のフレームのパラメータ
+    claimed_keys : list
+        今回登録した重複判定キー
+    is_conflict : bool
+        他のリクエストで処理中のフレームがある場合True
+    """
+
+    if not redis_host:
+        return parameters_list, [], False
+
+    # 同じリクエスト内の同一フレーム(NDJSONの再送等)は先頭のみ判定対象とし、以降は重複として除外
+    unique_parameters_list = []
+    fingerprints = []
+    for parameters in parameters_list:
+        fingerprint = get_fingerprint(parameters)
+        if fingerprint in fingerprints:
+            logger.info(f'duplicate frame in request skipped {fingerprint}')
+            continue
+        unique_parameters_list.append(parameters)
+        fingerprints.append(fingerprint)
+
+    try:
+        redis_client = get_redis_client(redis_host)
+
+        # 未登録の場合のみ処理中として登録
+        pipeline = redis_client.pipeline(transaction=False)
+        for fingerprint in fingerprints:
+            pipeline.set(fingerprint, STATUS_PROCESSING, nx=True, ex=IDEMPOTENCY_PROCESSING_TTL_SECONDS)
+        for fingerprint in fingerprints:
+            pipeline.get(fingerprint)
+        results = pipeline.execute()
+    except redis.RedisError:
+        logger.warning('idempotency check skipped')
+        return unique_parameters_list, [], False
+
+    claimed_results = results[:len(fingerprints)]
+    current_statuses = results[len(fingerprints):]
+
+    new_parameters_list = []
+    claimed_keys = []
+    is_conflict = False
+    for parameters, fingerprint, claimed, current_status in zip(unique_parameters_list, fingerprints, claimed_results, current_statuses):
+        if claimed:
+            new_parameters_list.append(parameters)
+            claimed_keys.append(fingerprint)
+        elif current_status == STATUS_DONE:
+            logger.info(f'duplicate frame skipped {fingerprint}')
+        else:
+            logger.info(f'frame in progress {fingerprint}')
+            is_conflict = True
+
+    # 処理中のフレームがある場合は今回登録したキーを解放し、リトライさせる
+    if is_conflict:
+        release(claimed_keys, redis_host)
+        return [], [], True
+
+    return new_parameters_list, claimed_keys, False
+
+
+def complete(claimed_keys, redis_host):
+    """
+    重複判定キーを処理済みに更新
+    Parameters
+    ----------
+    claimed_keys : list
+        重複判定キー
+    redis_host
+        redis接続用のホスト
+    """
+
+    if not claimed_keys:
+        return
+
+    try:
+        pipeline = get_redis_client(redis_host).pipeline(transaction=False)
+        for claimed_key in claimed_keys:
+            pipeline.set(claimed_key, STATUS_DONE, ex=IDEMPOTENCY_TTL_SECONDS)
+        pipeline.execute()
+    except redis.RedisError:
+        logger.warning('idempotency complete skipped')
+
+
+def release(claimed_keys, redis_host):
+    """
+    登録失敗時に重複判定キーを削除し、リトライを受け付ける
+    Parameters
+    ----------
+    claimed_keys : list
+        重複判定キー
+    redis_host
+        redis接続用のホスト
+    """
+
+    if not claimed_keys:
+        return
+
+    try:
+        get_redis_client(redis_host).delete(*claimed_keys)
+    except redis.RedisError:
+        logger.warning('idempotency release skipped')
+
+
+def get_fingerprint(parameters):
+    """
+    フレームの重複判定キーを取得
+    (路側機ID、サービス地点情報ID、更新時刻情報、内容のハッシュ値)
+    Parameters
+    ----------
+    parameters : dict
+        1フレーム分のパラメータ
+
+    Returns
+    -------
+    fingerprint : String
+        重複判定キー
+    """
+
+    payload = json.dumps(parameters, separators=(',', ':'), default=str).encode('utf-8')
+    payload_hash = hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+    return f"idem:r{parameters['attribute']['roadsideUnitID']}s{parameters['attribute']['serviceLocationID']}:{parameters['attribute']['updateTimeInfo']}:{payload_hash}"
+
+
+def get_redis_client(redis_host):
+    """
+    重複判定用のElastiCache接続を取得
+    Parameters
+    ----------
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    redis_client :
+        接続したElastiCache
+    """
+
+    if redis_host not in redis_clients:
+        redis_clients[redis_host] = redis.StrictRedis(
+            host=redis_host,
+            port='6379',
+            decode_responses=True,
+            db=IDEMPOTENCY_DB
+        )
+
+    return redis_clients[redis_host]
@@ -1,13 +1,16 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
 import os
+import time
 import traceback
 
-import dynamodb_execute
-import elasticache_execute
+import dual_write_execute
 import get_parameter
+import idempotency
+import rate_limit
+import request_body
+import validator
 from log import logger
 
 # ログレベル設定
@@ -38,28 +41,73 @@ def lambda_handler(event, context):
     }
 
     try:
-        # curlの場合
-        if type(event['body']) is dict:
-            request['body'] = json.dumps(event['body'], default=str)
-        # Postmanから実行の場合
-        else:
-            request['body'] = \
-                event['body'].replace('\\n', '').replace('\\r', '')
-
         headers = dict()
         for k, v in event['headers'].items():
             headers[k.lower()] = v
         if 'x-tracking' in headers:
             logger.info(headers['x-tracking'])
 
-        # パラメータ取得
-        parameters = get_parameter.get_body(request['body'])
-
-        # 死活監視情報をElastiCacheに登録
-        res = elasticache_execute.put_data(parameters, REDIS_HOST)
-
-        # 死活監視情報をDynamoDBに登録
-        res = dynamodb_execute.put_data(parameters)
+        # Content-Typeに応じてbodyを読み込む(JSON・MessagePack・CBOR)
+        body_format = request_body.get_format(headers)
+        content_encoding = request_body.get_encoding(headers)
+        if body_format is None or content_encoding is None:
+            response['statusCode'] = 415
+            return response
+        # Content-Encoding(gzip・deflate)が指定された場合は上限サイズまで展開して読み込む
+        try:
+            request['body'] = request_body.load(event, body_format, content_encoding)
+        except request_body.BodyTooLargeError as e:
+            response['statusCode'] = 413
+            response['body'] = str(e)
+            return response
+        except request_body.BinaryContentTypeError as e:
+            response['statusCode'] = 415
+            response['body'] = str(e)
+            return response
+        except request_body.ContentEncodingError as e:
+            response['statusCode'] = 400
+            response['body'] = str(e)
+            logger.error(f'content encoding error {e}')
+            return response
+
+        # パラメータ取得(データフォーマット仕様に合致しない場合は登録しない)
+        start_time = time.perf_counter()
+        try:
+            parameters = get_parameter.get_body(request['body'])
+        except validator.ValidationError as e:
+            response['statusCode'] = 400
+            response['body'] = str(e)
+            logger.error(f'validation error {e}')
+            return response
+        logger.info(f'validation latency:{(time.perf_counter() - start_time) * 1000:.1f}ms')
+
+        # 登録API・路側機ごとの流量制限(超過した場合は登録せず再送を待たせる)
+        try:
+            is_allowed, retry_after = rate_limit.acquire(rate_limit.get_costs([parameters]), REDIS_HOST, 'putAliveMonitoringInfo')
+        except rate_limit.CostTooLargeError as e:
+            response['statusCode'] = 413
+            response['body'] = str(e)
+            return response
+        if not is_allowed:
+            response['statusCode'] = 429
+            response['headers'] = {'Retry-After': str(retry_after)}
+            return response
+
+        # 処理済みのフレームの場合は登録しない(リトライによる重複登録を防止)
+        new_parameters_list, claimed_keys, is_conflict = idempotency.claim([parameters], REDIS_HOST)
+        if is_conflict:
+            response['statusCode'] = 409
+            return response
+
+        res = 201
+        if new_parameters_list:
+            # 死活監視情報をElastiCacheとDynamoDBに並列登録
+            try:
+                res = dual_write_execute.put_data(parameters, REDIS_HOST)
+            except Exception:
+                idempotency.release(claimed_keys, REDIS_HOST)
+                raise
+            idempotency.complete(claimed_keys, REDIS_HOST)
 
         response['statusCode'] = res
 
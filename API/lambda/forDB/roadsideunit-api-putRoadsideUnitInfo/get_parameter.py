@@ -1,50 +1,114 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
 
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 路側機属性情報のスキーマ(データフォーマット仕様書)
+ROADSIDE_UNIT_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': [
+                'serviceLocationID',
+                'roadsideUnitID',
+                'updateTimeInfo',
+                'formatVersion',
+                'roadsideUnitName',
+                'productNumber',
+                'licensingInfo',
+                'initialRegistrationDate',
+                'powerConsumption',
+                'grossWeight',
+                'materialType',
+                'dateOfInstallation',
+                'latitude',
+                'longitude',
+                'roadsideUnitManager',
+                'installationSiteManager',
+                'lastInspectionDate',
+                'nextInspectionDate',
+            ],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'roadsideUnitName': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'productNumber': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'manufacturer': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'customer': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'licensingInfo': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'initialRegistrationDate': {'type': 'string'},
+                'powerConsumption': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'grossWeight': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'materialType': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                'dateOfInstallation': {'type': 'string'},
+                'latitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 900000000},
+                'longitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 1800000000},
+                'roadsideUnitManager': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'installationSiteManager': {'type': 'string', 'minLength': 1, 'maxLength': 255},
+                'lastInspectionDate': {'type': 'string'},
+                'nextInspectionDate': {'type': 'string'},
+            },
+        },
+    },
+}
 
-def get_body(body):
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_roadside_unit_info = validator.compile_schema(ROADSIDE_UNIT_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     event body 要素取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
+
     Returns
     -------
     parameters  : Array
         グループ名
     """
-    body_data = json.loads(body)
+
+    body_data = validate_roadside_unit_info(body_data)
 
     parameters = {}
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['roadsideUnitID'] = int(body_data['attribute']['roadsideUnitID'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
-    parameters['attribute']['roadsideUnitName'] = str(body_data['attribute']['roadsideUnitName'])
-    parameters['attribute']['productNumber'] = str(body_data['attribute']['productNumber'])
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['roadsideUnitID'] = body_data['attribute']['roadsideUnitID']
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
+    parameters['attribute']['roadsideUnitName'] = body_data['attribute']['roadsideUnitName']
+    parameters['attribute']['productNumber'] = body_data['attribute']['productNumber']
     if 'manufacturer' in body_data['attribute']:
-        parameters['attribute']['manufacturer'] = str(body_data['attribute']['manufacturer'])
+        parameters['attribute']['manufacturer'] = body_data['attribute']['manufacturer']
     if 'customer' in body_data['attribute']:
-        parameters['attribute']['customer'] = str(body_data['attribute']['customer'])
-    parameters['attribute']['licensingInfo'] = str(body_data['attribute']['licensingInfo'])
-    parameters['attribute']['initialRegistrationDate'] = str(body_data['attribute']['initialRegistrationDate'])
-    parameters['attribute']['powerConsumption'] = int(body_data['attribute']['powerConsumption'])
-    parameters['attribute']['grossWeight'] = int(body_data['attribute']['grossWeight'])
-    parameters['attribute']['materialType'] = int(body_data['attribute']['materialType'])
-    parameters['attribute']['dateOfInstallation'] = str(body_data['attribute']['dateOfInstallation'])
-    parameters['attribute']['latitude'] = int(body_data['attribute']['latitude'])
-    parameters['attribute']['longitude'] = int(body_data['attribute']['longitude'])
-    parameters['attribute']['roadsideUnitManager'] = str(body_data['attribute']['roadsideUnitManager'])
-    parameters['attribute']['installationSiteManager'] = str(body_data['attribute']['installationSiteManager'])
-    parameters['attribute']['lastInspectionDate'] = str(body_data['attribute']['lastInspectionDate'])
-    parameters['attribute']['nextInspectionDate'] = str(body_data['attribute']['nextInspectionDate'])
+        parameters['attribute']['customer'] = body_data['attribute']['customer']
+    parameters['attribute']['licensingInfo'] = body_data['attribute']['licensingInfo']
+    parameters['attribute']['initialRegistrationDate'] = body_data['attribute']['initialRegistrationDate']
+    parameters['attribute']['powerConsumption'] = body_data['attribute']['powerConsumption']
+    parameters['attribute']['grossWeight'] = body_data['attribute']['grossWeight']
+    parameters['attribute']['materialType'] = body_data['attribute']['materialType']
+    parameters['attribute']['dateOfInstallation'] = body_data['attribute']['dateOfInstallation']
+    parameters['attribute']['latitude'] = body_data['attribute']['latitude']
+    parameters['attribute']['longitude'] = body_data['attribute']['longitude']
+    parameters['attribute']['roadsideUnitManager'] = body_data['attribute']['roadsideUnitManager']
+    parameters['attribute']['installationSiteManager'] = body_data['attribute']['installationSiteManager']
+    parameters['attribute']['lastInspectionDate'] = body_data['attribute']['lastInspectionDate']
+    parameters['attribute']['nextInspectionDate'] = body_data['attribute']['nextInspectionDate']
 
     return parameters
@@ -0,0 +1,206 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import logging
+from datetime import datetime
+
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+
+class ValidationError(ValueError):
+    """
+    bodyがデータフォーマット仕様に合致しない場合のエラー
+    """
+
+
+def to_int(value, path):
+    """
+    integer項目の値を整数に変換(数字の文字列・整数値の小数は変換し、それ以外はエラー)
+    Parameters
+    ----------
+    value :
+        項目の値
+    path : str
+        項目のパス
+
+    Returns
+    -------
+    value : int
+        変換後の値
+    """
+
+    if type(value) is float and value.is_integer():
+        return int(value)
+    if type(value) is str:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+
+    raise ValidationError(f'{path}: integer required')
+
+
+def to_str(value, path):
+    """
+    string項目の値を文字列に変換(数値は変換し、それ以外はエラー)
+    Parameters
+    ----------
+    value :
+        項目の値
+    path : str
+        項目のパス
+
+    Returns
+    -------
+    value : str
+        変換後の値
+    """
+
+    if type(value) in (int, float):
+        return str(value)
+
+    raise ValidationError(f'{path}: string required')
+
+
+def check_date_time(value, path):
+    """
+    date-time項目の値がISO8601形式か判定
+    Parameters
+    ----------
+    value : str
+        項目の値
+    path : str
+        項目のパス
+    """
+
+    try:
+        datetime.fromisoformat(value)
+    except ValueError:
+        raise ValidationError(f'{path}: date-time required') from None
+
+
+def compile_schema(schema):
+    """
+    スキーマ(JSON Schemaのtype・properties・required・items・minimum・maximum・minLength・maxLength・maxItems・format)から
+    検証・型変換関数を生成
+    検証コードはインポート時に1回だけ生成・コンパイルし、リクエストごとにはスキーマを解釈しない
+    Parameters
+    ----------
+    schema : dict
+        スキーマ
+
+    Returns
+    -------
+    validate : function
+        bodyを検証し、型変換した値で置き換えて返す関数(合致しない場合はValidationError)
+    """
+
+    lines = ['def validate(data):']
+    generate(schema, 'data', "'body'", lines, 1, [0])
+    lines.append('    return data')
+
+    namespace = {
+        'ValidationError': ValidationError,
+        'to_int': to_int,
+        'to_str': to_str,
+        'check_date_time': check_date_time,
+    }
+    exec(compile('\n'.join(lines), '<schema>', 'exec'), namespace)
+
+    return namespace['validate']
+
+
+def generate(schema, target, path, lines, depth, counter):
+    """
+    1項目分の検証コードを生成
+    Parameters
+    ----------
+    schema : dict
+        項目のスキーマ
+    target : str
+        検証する値の式(代入可能な式)
+    path : str
+        エラー時の項目のパスを組み立てる式
+    lines : list
+        生成したコードの行
+    depth : int
+        インデントの深さ
+    counter : list
+        変数名の採番
+    """
+
+    indent = '    ' * depth
+    schema_type = schema.get('type')
+
+    if schema_type == 'object':
+        counter[0] += 1
+        value = f'v{counter[0]}'
+        lines.append(f'{indent}{value} = {target}')
+        lines.append(f'{indent}if type({value}) is not dict:')
+        lines.append(f"{indent}    raise ValidationError({path} + ': object required')")
+        for key in schema.get('required', []):
+            lines.append(f'{indent}if {key!r} not in {value}:')
+            lines.append(f"{indent}    raise ValidationError({path} + '.{key}: required')")
+        for key, property_schema in schema.get('properties', {}).items():
+            property_path = f"{path} + '.{key}'"
+            if key in schema.get('required', []):
+                generate(property_schema, f'{value}[{key!r}]', property_path, lines, depth, counter)
+            else:
+                lines.append(f'{indent}if {key!r} in {value}:')
+                generate(property_schema, f'{value}[{key!r}]', property_path, lines, depth + 1, counter)
+
+    elif schema_type == 'array':
+        counter[0] += 1
+        value, index = f'v{counter[0]}', f'i{counter[0]}'
+        lines.append(f'{indent}{value} = {target}')
+        lines.append(f'{indent}if type({value}) is not list:')
+        lines.append(f"{indent}    raise ValidationError({path} + ': array required')")
+        if 'maxItems' in schema:
+            lines.append(f"{indent}if len({value}) > {schema['maxItems']}:")
+            lines.append(f"{indent}    raise ValidationError({path} + ': too many items')")
+        if 'items' in schema:
+            lines.append(f'{indent}for {index} in range(len({value})):')
+            generate(schema['items'], f'{value}[{index}]', f"{path} + '[' + str({index}) + ']'", lines, depth + 1, counter)
+
+    elif schema_type == 'integer':
+        counter[0] += 1
+        value = f'v{counter[0]}'
+        lines.append(f'{indent}{value} = {target}')
+        lines.append(f'{indent}if type({value}) is not int:')
+        lines.append(f'{indent}    {value} = {target} = to_int({value}, {path})')
+        conditions = []
+        if 'minimum' in schema:
+            conditions.append(f"{value} < {schema['minimum']}")
+        if 'maximum' in schema:
+            conditions.append(f"{value} > {schema['maximum']}")
+        if conditions:
+            lines.append(f"{indent}if {' or '.join(conditions)}:")
+            lines.append(f"{indent}    raise ValidationError({path} + ': out of range')")
+
+    elif schema_type == 'string':
+        counter[0] += 1
+        value = f'v{counter[0]}'
+        lines.append(f'{indent}{value} = {target}')
+        lines.append(f'{indent}if type({value}) is not str:')
+        lines.append(f'{indent}    {value} = {target} = to_str({value}, {path})')
+        conditions = []
+        if 'minLength' in schema:
+            conditions.append(f"len({value}) < {schema['minLength']}")
+        if 'maxLength' in schema:
+            conditions.append(f"len({value}) > {schema['maxLength']}")
+        if conditions:
+            lines.append(f"{indent}if {' or '.join(conditions)}:")
+            lines.append(f"{indent}    raise ValidationError({path} + ': invalid length')")
+        if schema.get('format') == 'date-time':
+            lines.append(f'{indent}check_date_time({value}, {path})')
+
+    elif schema_type == 'boolean':
+        # 0/1で送信される場合も受け付ける
+        lines.append(f'{indent}if {target} not in (0, 1):')
+        lines.append(f"{indent}    raise ValidationError({path} + ': boolean required')")
+
+    else:
+        # 型の指定がない項目は検証しない
+        lines.append(f'{indent}pass')
@@ -1,36 +1,107 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
-from datetime import datetime
 
+import time_util
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# センサ情報のスキーマ(データフォーマット仕様書)
+SENSOR_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': ['serviceLocationID', 'roadsideUnitID', 'updateTimeInfo', 'formatVersion', 'sensorNum', 'sensorAttributeInfo'],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'sensorNum': {'type': 'integer', 'minimum': 0, 'maximum': 16},
+                'sensorAttributeInfo': {
+                    'type': 'array',
+                    'maxItems': 16,
+                    'items': {
+                        'type': 'object',
+                        'required': ['deviceID'],
+                        'properties': {
+                            'deviceID': {'type': 'integer', 'minimum': 0, 'maximum': 16777215},
+                            'latitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 900000000},
+                            'longitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 1800000000},
+                            'elevation': {'type': 'integer', 'minimum': -4095, 'maximum': 61440},
+                            'sensorDetectionRanges': {'type': 'integer', 'minimum': 1, 'maximum': 16},
+                            'sensorDetectionRangeInfo': {
+                                'type': 'array',
+                                'maxItems': 16,
+                                'items': {
+                                    'type': 'object',
+                                    'properties': {
+                                        'detectionRangeID': {'type': 'integer', 'minimum': 1, 'maximum': 16},
+                                        'undetectableRate': {'type': 'integer', 'minimum': 1, 'maximum': 255},
+                                        'vertices': {'type': 'integer', 'minimum': 1, 'maximum': 16},
+                                        'verticesPos': {
+                                            'type': 'array',
+                                            'maxItems': 16,
+                                            'items': {
+                                                'type': 'object',
+                                                'properties': {
+                                                    'verticesLat': {'type': 'integer', 'minimum': -2147483648, 'maximum': 900000000},
+                                                    'verticesLon': {'type': 'integer', 'minimum': -2147483648, 'maximum': 1800000000},
+                                                },
+                                            },
+                                        },
+                                        'detectableObjectType': {'type': 'integer', 'minimum': 0, 'maximum': 255},
+                                        'detectionReliability': {'type': 'integer', 'minimum': 0, 'maximum': 101},
+                                        'detectionLimitObjectSize': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
 
-def get_body(body):
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_sensor_info = validator.compile_schema(SENSOR_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     event body 要素取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
+
     Returns
     -------
     parameters : Array
         グループ名
     """
-    body_data = json.loads(body)
+
+    body_data = validate_sensor_info(body_data)
 
     parameters = {}
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
     parameters['attribute']['time_minutes'] = getTimeMinutes(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['roadsideUnitID'] = int(body_data['attribute']['roadsideUnitID'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
-    parameters['attribute']['sensorNum'] = int(body_data['attribute']['sensorNum'])
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['roadsideUnitID'] = body_data['attribute']['roadsideUnitID']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
+    parameters['attribute']['sensorNum'] = body_data['attribute']['sensorNum']
     parameters['attribute']['sensorAttributeInfo'] = body_data['attribute']['sensorAttributeInfo']
 
     return parameters
@@ -49,8 +120,7 @@ def getTimeMinutes(updateTimeInfo):
     format_update_time : String
         更新時刻情報（分まで）
     """
-    update_time = datetime.strptime(updateTimeInfo, '%Y-%m-%dT%H:%M:%S.%f%z')
     # 時刻を「分」までのフォーマットで取得
-    format_update_time = update_time.strftime('%Y-%m-%d %H:%M')
+    format_update_time = time_util.to_minutes(updateTimeInfo)
 
     return format_update_time
@@ -124,6 +124,8 @@ def create_target_table(target_table_name):
         物標情報テーブル名
     """
 
+    # time_minutesは「UTCの分#シャード番号」形式で登録し、同一分の書き込みをパーティション分散する
+    # (シャード数は登録・取得処理の環境変数TARGET_SHARD_NUMで指定)
     dynamoDB.create_table(
         TableName=target_table_name,
         KeySchema=[
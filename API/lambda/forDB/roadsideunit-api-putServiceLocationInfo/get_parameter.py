@@ -1,36 +1,100 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
 
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# サービス地点情報のスキーマ(データフォーマット仕様書)
+SERVICE_LOCATION_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': [
+                'serviceLocationID',
+                'updateTimeInfo',
+                'formatVersion',
+                'latitude',
+                'longitude',
+                'elevation',
+                'approachAttributeSize',
+                'approachAttributeInfo',
+                'roadsideUnitList',
+            ],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'latitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 900000000},
+                'longitude': {'type': 'integer', 'minimum': -2147483648, 'maximum': 1800000000},
+                'elevation': {'type': 'integer', 'minimum': -4095, 'maximum': 61440},
+                'approachAttributeSize': {'type': 'integer', 'minimum': 0, 'maximum': 15},
+                'approachAttributeInfo': {
+                    'type': 'array',
+                    'maxItems': 15,
+                    'items': {
+                        'type': 'object',
+                        'properties': {
+                            'approachID': {'type': 'integer', 'minimum': 1, 'maximum': 15},
+                            'approachHeading': {'type': 'integer', 'minimum': 0, 'maximum': 239},
+                        },
+                    },
+                },
+                'roadsideUnitList': {
+                    'type': 'array',
+                    'items': {
+                        'type': 'object',
+                        'required': ['roadsideUnitID', 'roadsideUnitClassification'],
+                        'properties': {
+                            'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                            'roadsideUnitClassification': {'type': 'integer', 'minimum': 0, 'maximum': 7},
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
 
-def get_body(body):
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_service_location_info = validator.compile_schema(SERVICE_LOCATION_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     event body 要素取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
+
     Returns
     -------
     parameters  : Array
         グループ名
     """
-    body_data = json.loads(body)
+
+    body_data = validate_service_location_info(body_data)
 
     parameters = {}
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
-    parameters['attribute']['latitude'] = int(body_data['attribute']['latitude'])
-    parameters['attribute']['longitude'] = int(body_data['attribute']['longitude'])
-    parameters['attribute']['elevation'] = int(body_data['attribute']['elevation'])
-    parameters['attribute']['approachAttributeSize'] = int(body_data['attribute']['approachAttributeSize'])
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
+    parameters['attribute']['latitude'] = body_data['attribute']['latitude']
+    parameters['attribute']['longitude'] = body_data['attribute']['longitude']
+    parameters['attribute']['elevation'] = body_data['attribute']['elevation']
+    parameters['attribute']['approachAttributeSize'] = body_data['attribute']['approachAttributeSize']
     parameters['attribute']['approachAttributeInfo'] = body_data['attribute']['approachAttributeInfo']
     parameters['attribute']['roadsideUnitList'] = body_data['attribute']['roadsideUnitList']
 
@@ -1,35 +1,75 @@
 # Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
 
-import json
 import logging
 
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 信号機情報のスキーマ(データフォーマット仕様書)
+SIGNAL_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': [
+                'serviceLocationID',
+                'roadsideUnitID',
+                'updateTimeInfo',
+                'formatVersion',
+                'prefectureID',
+                'roadType',
+                'intersectionID',
+            ],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'prefectureID': {'type': 'integer', 'minimum': 1, 'maximum': 47},
+                'roadType': {'type': 'integer', 'minimum': 0, 'maximum': 1},
+                'intersectionID': {'type': 'integer', 'minimum': 1, 'maximum': 32767},
+            },
+        },
+    },
+}
 
-def get_body(body):
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_signal_info = validator.compile_schema(SIGNAL_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     event body 要素取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
+
     Returns
     -------
     parameters  : Array
         グループ名
     """
-    body_data = json.loads(body)
+
+    body_data = validate_signal_info(body_data)
 
     parameters = {}
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['roadsideUnitID'] = int(body_data['attribute']['roadsideUnitID'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
-    parameters['attribute']['prefectureID'] = int(body_data['attribute']['prefectureID'])
-    parameters['attribute']['roadType'] = int(body_data['attribute']['roadType'])
-    parameters['attribute']['intersectionID'] = int(body_data['attribute']['intersectionID'])
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['roadsideUnitID'] = body_data['attribute']['roadsideUnitID']
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
+    parameters['attribute']['prefectureID'] = body_data['attribute']['prefectureID']
+    parameters['attribute']['roadType'] = body_data['attribute']['roadType']
+    parameters['attribute']['intersectionID'] = body_data['attribute']['intersectionID']
 
     return parameters
@@ -0,0 +1,170 @@
+import logging
+import os
+
+import elasticache_execute
+import time_util
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+TARGET_AGGREGATE_ENABLED = os.environ.get('TARGET_AGGREGATE_ENABLED', 'true').lower() == 'true'
+TARGET_AGGREGATE_TTL_SECONDS = int(os.environ.get('TARGET_AGGREGATE_TTL_SECONDS', '3600'))
+
+# 集計キーのプレフィックス(物標情報のキー r{路側機ID}s{サービス地点情報ID}d{機器種別ID} と区別する)
+AGGREGATE_KEY_PREFIX = 'agg:'
+
+# DynamoDBへの反映待ちの集計キー
+AGGREGATE_PENDING_KEY = 'agg:pending'
+
+# 最大速度の更新(現在値より大きい場合のみ更新)
+SPEED_MAX_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], 'speedMax')
+if not current or tonumber(ARGV[1]) > tonumber(current) then
+    redis.call('HSET', KEYS[1], 'speedMax', ARGV[1])
+end
+return 1
+"""
+
+
+def put_data_list(parameters_list, redis_host):
+    """
+    物標情報を機器・分単位で集計し、ElastiCacheの集計値に加算
+    集計値はaggregate_functionがDynamoDBの集計テーブルに反映する
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+    """
+
+    if not TARGET_AGGREGATE_ENABLED:
+        return
+
+    try:
+        aggregates = get_aggregates(parameters_list)
+        if not aggregates:
+            return
+
+        # ElastiCacheに接続
+        redis_client = elasticache_execute.get_redis_client(redis_host)
+
+        # 全機器・全分の加算を1回の通信で実行
+        pipeline = redis_client.pipeline(transaction=False)
+        for aggregate_key, aggregate in aggregates.items():
+            ids_key = f'{aggregate_key}:ids'
+            pipeline.hincrby(aggregate_key, 'count', aggregate['count'])
+            if aggregate['speedCount']:
+                pipeline.hincrby(aggregate_key, 'speedSum', aggregate['speedSum'])
+                pipeline.hincrby(aggregate_key, 'speedCount', aggregate['speedCount'])
+                pipeline.eval(SPEED_MAX_SCRIPT, 1, aggregate_key, aggregate['speedMax'])
+            for size_classification, count in aggregate['size'].items():
+                pipeline.hincrby(aggregate_key, f'size:{size_classification}', count)
+            pipeline.pfadd(ids_key, *aggregate['targetIDs'])
+            pipeline.expire(aggregate_key, TARGET_AGGREGATE_TTL_SECONDS)
+            pipeline.expire(ids_key, TARGET_AGGREGATE_TTL_SECONDS)
+        pipeline.sadd(AGGREGATE_PENDING_KEY, *aggregates.keys())
+        pipeline.execute()
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+
+def get_aggregates(parameters_list):
+    """
+    物標情報を機器・分(UTC)単位で集計
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+
+    Returns
+    -------
+    aggregates : dict
+        集計キーごとの集計値
+    """
+
+    aggregates = {}
+    for parameters in parameters_list:
+        for device_individual_value in parameters['attribute']['deviceIndividualInfo']:
+            for target in device_individual_value.get('targetIndividualInfo', []):
+                time_minutes = time_util.to_utc(target['time'])[:16]
+                aggregate_key = get_aggregate_key(
+                    parameters['attribute']['roadsideUnitID'],
+                    parameters['attribute']['serviceLocationID'],
+                    device_individual_value['deviceID'],
+                    time_minutes
+                )
+
+                aggregate = aggregates.setdefault(aggregate_key, {
+                    'count': 0,
+                    'speedSum': 0,
+                    'speedCount': 0,
+                    'speedMax': 0,
+                    'size': {},
+                    'targetIDs': set(),
+                })
+                aggregate['count'] += 1
+                if 'speed' in target:
+                    aggregate['speedSum'] += target['speed']
+                    aggregate['speedCount'] += 1
+                    aggregate['speedMax'] = max(aggregate['speedMax'], target['speed'])
+                if 'sizeClassification' in target:
+                    size_classification = target['sizeClassification']
+                    aggregate['size'][size_classification] = aggregate['size'].get(size_classification, 0) + 1
+                aggregate['targetIDs'].add(target['targetID'])
+
+    return aggregates
+
+
+def get_aggregate_key(roadside_unit_id, service_location_id, device_id, time_minutes):
+    """
+    集計キーを作成
+    Parameters
+    ----------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    device_id : int
+        機器種別ID
+    time_minutes : str
+        集計対象の分(UTC、YYYY-MM-DDTHH:MM)
+
+    Returns
+    -------
+    aggregate_key : str
+        集計キー
+    """
+
+    return f'{AGGREGATE_KEY_PREFIX}r{roadside_unit_id}s{service_location_id}d{device_id}:{time_minutes}'
+
+
+def parse_aggregate_key(aggregate_key):
+    """
+    集計キーを分解
+    Parameters
+    ----------
+    aggregate_key : str
+        集計キー
+
+    Returns
+    -------
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    device_id : int
+        機器種別ID
+    time_minutes : str
+        集計対象の分(UTC、YYYY-MM-DDTHH:MM)
+    """
+
+    device_key, time_minutes = aggregate_key[len(AGGREGATE_KEY_PREFIX):].split(':', 1)
+    roadside_unit_id, rest = device_key[1:].split('s', 1)
+    service_location_id, device_id = rest.split('d', 1)
+
+    return int(roadside_unit_id), int(service_location_id), int(device_id), time_minutes
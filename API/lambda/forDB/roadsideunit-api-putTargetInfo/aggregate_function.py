@@ -0,0 +1,153 @@
+import logging
+import os
+import traceback
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import aggregate_execute
+import dynamodb_execute
+import elasticache_execute
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+REDIS_HOST = os.environ['REDIS_HOST']
+TARGET_AGGREGATE_TABLE_NAME = os.environ['TARGET_AGGREGATE_TABLE_NAME']
+TARGET_AGGREGATE_FLUSH_DELAY_SECONDS = int(os.environ.get('TARGET_AGGREGATE_FLUSH_DELAY_SECONDS', '120'))
+
+# 1回の通信で読み込む集計キー数
+FLUSH_CHUNK_SIZE = 100
+
+# 反映後に加算されていない場合のみ反映待ちから除外
+REMOVE_PENDING_SCRIPT = """
+if redis.call('HGET', KEYS[2], 'count') == ARGV[1] then
+    redis.call('SREM', KEYS[1], KEYS[2])
+end
+return 1
+"""
+
+
+def lambda_handler(event, context):
+    """
+    ElastiCacheの物標情報の集計値をDynamoDBの集計テーブルに反映
+    集計中の分は現時点の値で上書きし、確定した分(反映待ち時間経過後)は反映待ちから除外する
+    Parameters
+    ----------
+    event : dict
+        スケジュール実行イベント
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        反映件数
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        redis_client = elasticache_execute.get_redis_client(REDIS_HOST)
+
+        # 確定済みとみなす分(この値より前の分は以降加算されない)
+        closed_before = (datetime.now(timezone.utc) - timedelta(seconds=TARGET_AGGREGATE_FLUSH_DELAY_SECONDS)).strftime('%Y-%m-%dT%H:%M')
+        update_time = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+        aggregate_keys = sorted(redis_client.smembers(aggregate_execute.AGGREGATE_PENDING_KEY))
+        flushed_count = 0
+        closed_count = 0
+        for start in range(0, len(aggregate_keys), FLUSH_CHUNK_SIZE):
+            chunk_keys = aggregate_keys[start:start + FLUSH_CHUNK_SIZE]
+
+            # 集計値と物標ID数を取得
+            pipeline = redis_client.pipeline(transaction=False)
+            for aggregate_key in chunk_keys:
+                pipeline.hgetall(aggregate_key)
+                pipeline.pfcount(f'{aggregate_key}:ids')
+            values = pipeline.execute()
+
+            requests = []
+            counts = {}
+            for index, aggregate_key in enumerate(chunk_keys):
+                aggregate, distinct_count = values[index * 2], values[index * 2 + 1]
+                counts[aggregate_key] = aggregate.get('count')
+                if aggregate:
+                    requests.append({'PutRequest': {'Item': get_aggregate_item(aggregate_key, aggregate, distinct_count, update_time)}})
+
+            # 集計テーブルに登録
+            dynamodb_execute.batch_write_requests(TARGET_AGGREGATE_TABLE_NAME, requests)
+            flushed_count += len(requests)
+
+            # 確定した分、または有効期限切れの集計キーを反映待ちから除外
+            pipeline = redis_client.pipeline(transaction=False)
+            for aggregate_key in chunk_keys:
+                if counts[aggregate_key] is None:
+                    pipeline.srem(aggregate_execute.AGGREGATE_PENDING_KEY, aggregate_key)
+                elif aggregate_execute.parse_aggregate_key(aggregate_key)[3] < closed_before:
+                    pipeline.eval(REMOVE_PENDING_SCRIPT, 2, aggregate_execute.AGGREGATE_PENDING_KEY, aggregate_key, counts[aggregate_key])
+                    closed_count += 1
+            pipeline.execute()
+
+        response['body'] = {
+            'flushedCount': flushed_count,
+            'closedCount': closed_count,
+        }
+        logger.info(response['body'])
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo aggregate')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def get_aggregate_item(aggregate_key, aggregate, distinct_count, update_time):
+    """
+    集計テーブルの登録アイテムを生成
+    Parameters
+    ----------
+    aggregate_key : str
+        集計キー
+    aggregate : dict
+        ElastiCacheの集計値
+    distinct_count : int
+        物標ID数(推定値)
+    update_time : str
+        反映時刻(UTC)
+
+    Returns
+    -------
+    item : dict
+        登録アイテム
+    """
+
+    roadside_unit_id, service_location_id, device_id, time_minutes = aggregate_execute.parse_aggregate_key(aggregate_key)
+
+    item = {
+        'locationKey': f'r{roadside_unit_id}s{service_location_id}',
+        'minuteDeviceKey': f'{time_minutes}#{device_id:010d}',
+        'roadsideUnitID': roadside_unit_id,
+        'serviceLocationID': service_location_id,
+        'deviceID': device_id,
+        'time_minutes': time_minutes,
+        'targetCount': int(aggregate['count']),
+        'distinctTargetCount': distinct_count,
+        'sizeClassificationCount': {
+            key.split(':', 1)[1]: int(value) for key, value in aggregate.items() if key.startswith('size:')
+        },
+        'updateTime': update_time,
+    }
+
+    # 速度の平均と最大(単位: 0.01m/s)
+    if int(aggregate.get('speedCount', 0)):
+        item['speedMean'] = round(Decimal(aggregate['speedSum']) / Decimal(aggregate['speedCount']), 2)
+        item['speedMax'] = int(aggregate['speedMax'])
+
+    return item
@@ -0,0 +1,558 @@
+import json
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import awswrangler as wr
+import boto3
+import dynamodb_execute
+import pandas as pd
+import target_codec
+import time_util
+from boto3.dynamodb.conditions import Attr, Key
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+TARGET_ARCHIVE_PATH = os.environ['TARGET_ARCHIVE_PATH']
+TARGET_COMPACTION_DELAY_SECONDS = int(os.environ.get('TARGET_COMPACTION_DELAY_SECONDS', '300'))
+TARGET_COMPACTION_MAX_HOURS = int(os.environ.get('TARGET_COMPACTION_MAX_HOURS', '24'))
+
+# Parquetの圧縮形式
+PARQUET_COMPRESSION = 'zstd'
+
+# 1時間(ミリ秒)
+HOUR_MS = 3600 * 1000
+
+# テーブルごとの書き出し済みの時間の記録(書き出し先の{テーブル名}/_manifest.json)
+# startHour : 有効期限を設定したアイテムの最古の時間(UTCのYYYY-MM-DDTHH)
+# archivedHours : 書き出しを確定した時間ごとの物標数
+# provisionalHours : 書き出したが遅れて届くアイテムを待つため、確定するまで実行ごとに書き出し直す時間ごとの物標数
+MANIFEST_FILE_NAME = '_manifest.json'
+
+# 確定の判定から登録までの間(登録処理中)のアイテムを待つ余裕(秒)
+FINAL_MARGIN_SECONDS = 60
+
+# 残り実行時間がこの値を下回ったら未書き出しの時間の書き出しを中断する
+REMAINING_TIME_MARGIN_MS = 60000
+
+# アイテムから各物標の行に引き継ぐ属性
+ITEM_COLUMNS = ['roadsideUnitID', 'serviceLocationID', 'deviceID', 'updateTimeInfo', 'formatVersion']
+
+# パーティション並列検索用スレッドプール
+executor = ThreadPoolExecutor(max_workers=16)
+
+# 書き出し済みの時間の記録の読み書き用
+s3_client = boto3.client('s3')
+
+
+def lambda_handler(event, context):
+    """
+    物標情報テーブルの確定した1時間分をソート・圧縮したParquetとしてS3に書き出す
+    失敗・未実行により書き出されていない過去の時間も古い順に書き出し、
+    有効期限を設定したアイテムの全時間を書き出した後にテーブルのTTLを有効化する
+    時間の終了からTARGET_ARCHIVE_FINAL_DELAY_SECONDS経過するまでは遅れて届くアイテムを含めるため実行ごとに書き出し直す
+    Parameters
+    ----------
+    event : dict
+        スケジュール実行イベント
+        hour(任意、UTCのYYYY-MM-DDTHH)、roadsideUnitID・serviceLocationID(任意)
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        テーブルごとの書き出し件数
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        # 対象の時間(指定がない場合は反映待ち時間経過後に確定した直前の1時間)
+        if event.get('hour'):
+            hour_start_ms = get_hour_ms(event['hour'])
+        else:
+            hour_start_ms = (int(time.time() * 1000) - TARGET_COMPACTION_DELAY_SECONDS * 1000) // HOUR_MS * HOUR_MS - HOUR_MS
+
+        if event.get('roadsideUnitID') is not None and event.get('serviceLocationID') is not None:
+            table_names = [f"{dynamodb_execute.TARGET_INFO_TABLE_NAME}_{event['roadsideUnitID']}_{event['serviceLocationID']}"]
+        else:
+            table_names = get_target_table_names()
+
+        # 1テーブルの失敗で他のテーブルの書き出しを止めない
+        compacted = {}
+        failed = []
+        for table_name in table_names:
+            try:
+                compacted[table_name] = archive_table(table_name, hour_start_ms, bool(event.get('hour')), context)
+            except Exception:
+                failed.append(table_name)
+                logger.error(f'error compact table:{table_name}')
+                logger.error(traceback.format_exc())
+
+        response['body'] = {
+            'hour': get_hour(hour_start_ms),
+            'compacted': compacted,
+            'failed': failed,
+        }
+        if failed:
+            response['statusCode'] = 500
+        logger.info(response['body'])
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo compact')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def get_target_table_names():
+    """
+    物標情報テーブル({TARGET_INFO_TABLE_NAME}_{路側機ID}_{サービス地点情報ID})の一覧を取得
+
+    Returns
+    -------
+    table_names : list
+        物標情報テーブル名
+    """
+
+    prefix = f'{dynamodb_execute.TARGET_INFO_TABLE_NAME}_'
+
+    table_names = []
+    for table in dynamodb_execute.dynamoDB.tables.all():
+        ids = table.name[len(prefix):].split('_') if table.name.startswith(prefix) else []
+        if len(ids) == 2 and all(id_value.isdigit() for id_value in ids):
+            table_names.append(table.name)
+
+    return table_names
+
+
+def archive_table(table_name, hour_start_ms, is_specified, context):
+    """
+    1テーブルの未確定の時間を書き出し、全時間を書き出し済みの場合はTTLを有効化
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+    hour_start_ms : int
+        対象の時間の開始時刻(UNIXエポックからのミリ秒)
+    is_specified : bool
+        対象の時間が指定された場合True(指定された時間のみ書き出す)
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    compacted : dict
+        書き出した時間ごとの物標数
+    """
+
+    # 有効期限を設定したアイテムがない場合は以降のアイテムが対象の時間以降となるため、対象の時間から記録する
+    manifest = read_manifest(table_name)
+    if dynamodb_execute.TARGET_INFO_TTL_SECONDS > 0 and manifest.get('startHour') is None:
+        manifest['startHour'] = get_start_hour(table_name) or get_hour(hour_start_ms)
+
+    if is_specified:
+        hours = [hour_start_ms]
+    else:
+        hours = get_pending_hours(manifest, hour_start_ms)[:TARGET_COMPACTION_MAX_HOURS]
+
+    # 登録処理中のアイテムを含められるよう、余裕を引いた時刻で確定した時間を判定する
+    # 確定後に登録されたアイテムは有効期限が設定されないため、確定した時間は書き出し直さない
+    final_hour = dynamodb_execute.get_final_hour(int(time.time() * 1000) - FINAL_MARGIN_SECONDS * 1000)
+
+    # 古い時間から書き出し、1時間ごとに確定・未確定を記録
+    compacted = {}
+    for hour_ms in hours:
+        hour = get_hour(hour_ms)
+        row_count = compact_table(table_name, hour_ms)
+        compacted[hour] = row_count
+        if hour < final_hour:
+            manifest.setdefault('archivedHours', {})[hour] = row_count
+            manifest.get('provisionalHours', {}).pop(hour, None)
+        else:
+            manifest.setdefault('provisionalHours', {})[hour] = row_count
+        write_manifest(table_name, manifest)
+
+        if context is not None and context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+            break
+
+    if dynamodb_execute.TARGET_INFO_TTL_SECONDS > 0:
+        # 未確定の時間は書き出し済みで、有効期限より前に以降の実行で書き出し直して確定する
+        provisional_hours = manifest.get('provisionalHours', {})
+        pending_hours = [hour_ms for hour_ms in get_pending_hours(manifest, hour_start_ms) if get_hour(hour_ms) not in provisional_hours]
+        # 有効期限を設定したアイテムの全時間を書き出すまでTTLを有効化しない
+        if not pending_hours:
+            enable_time_to_live(table_name)
+            if prune_manifest(manifest):
+                write_manifest(table_name, manifest)
+        else:
+            logger.warning(f'unarchived hours table:{table_name} count:{len(pending_hours)} from:{get_hour(pending_hours[0])}')
+
+    return compacted
+
+
+def get_hour(hour_start_ms):
+    """
+    時間の開始時刻を時間の文字列(UTCのYYYY-MM-DDTHH)に変換
+    Parameters
+    ----------
+    hour_start_ms : int
+        時間の開始時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    hour : str
+        時間
+    """
+
+    return time_util.format_utc(hour_start_ms)[:13]
+
+
+def get_hour_ms(hour):
+    """
+    時間の文字列(UTCのYYYY-MM-DDTHH)を開始時刻に変換
+    Parameters
+    ----------
+    hour : str
+        時間
+
+    Returns
+    -------
+    hour_start_ms : int
+        時間の開始時刻(UNIXエポックからのミリ秒)
+    """
+
+    return time_util.parse_epoch_ms(f'{hour}:00:00+00:00')
+
+
+def get_pending_hours(manifest, hour_start_ms):
+    """
+    有効期限を設定したアイテムの最古の時間から対象の時間までのうち、未確定の時間を取得
+    Parameters
+    ----------
+    manifest : dict
+        書き出し済みの時間の記録
+    hour_start_ms : int
+        対象の時間の開始時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    pending_hours : list
+        未確定の時間の開始時刻(古い順)
+    """
+
+    # 有効期限を設定しない場合は未確定の時間と対象の時間のみ
+    if manifest.get('startHour') is None:
+        return sorted({get_hour_ms(hour) for hour in manifest.get('provisionalHours', {})} | {hour_start_ms})
+
+    archived_hours = manifest.get('archivedHours', {})
+
+    return [
+        hour_ms for hour_ms in range(min(get_hour_ms(manifest['startHour']), hour_start_ms), hour_start_ms + HOUR_MS, HOUR_MS)
+        if get_hour(hour_ms) not in archived_hours
+    ]
+
+
+def get_start_hour(table_name):
+    """
+    有効期限を設定したアイテムの最古の時間を取得(書き出し済みの時間の記録がない場合のみ全件検索する)
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+
+    Returns
+    -------
+    start_hour : str
+        時間(UTCのYYYY-MM-DDTHH)、該当するアイテムがない場合はNone
+    """
+
+    scan_params = {
+        'TableName': table_name,
+        'FilterExpression': Attr(dynamodb_execute.TTL_ATTRIBUTE_NAME).exists() & Attr('time_utc').exists(),
+        'ProjectionExpression': 'time_utc',
+    }
+
+    start_time_utc = None
+    while True:
+        response = dynamodb_execute.dynamoDB.meta.client.scan(**scan_params)
+        for item in response.get('Items', []):
+            if start_time_utc is None or item['time_utc'] < start_time_utc:
+                start_time_utc = item['time_utc']
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return start_time_utc[:13] if start_time_utc else None
+
+
+def prune_manifest(manifest):
+    """
+    TTLで削除済みの時間を書き出し済みの時間の記録から除外
+    Parameters
+    ----------
+    manifest : dict
+        書き出し済みの時間の記録
+
+    Returns
+    -------
+    is_pruned : bool
+        除外した時間がある場合True
+    """
+
+    # 保持期間に1時間の余裕を加えた時間より前の時間はテーブルに残っていない
+    expired_hour = get_hour((int(time.time() * 1000) - dynamodb_execute.TARGET_INFO_TTL_SECONDS * 1000) // HOUR_MS * HOUR_MS - HOUR_MS)
+    if manifest['startHour'] >= expired_hour:
+        return False
+
+    manifest['startHour'] = expired_hour
+    for hours_key in ('archivedHours', 'provisionalHours'):
+        manifest[hours_key] = {hour: row_count for hour, row_count in manifest.get(hours_key, {}).items() if hour >= expired_hour}
+
+    return True
+
+
+def read_manifest(table_name):
+    """
+    テーブルの書き出し済みの時間の記録を読み込む
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+
+    Returns
+    -------
+    manifest : dict
+        書き出し済みの時間の記録(未作成の場合は空)
+    """
+
+    path = get_manifest_path(table_name)
+    if path.startswith('s3://'):
+        bucket, key = path[len('s3://'):].split('/', 1)
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+        except s3_client.exceptions.NoSuchKey:
+            return {}
+    else:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'rb') as file:
+            body = file.read()
+
+    return json.loads(body)
+
+
+def write_manifest(table_name, manifest):
+    """
+    テーブルの書き出し済みの時間の記録を書き出す
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+    manifest : dict
+        書き出し済みの時間の記録
+    """
+
+    path = get_manifest_path(table_name)
+    body = json.dumps(manifest, sort_keys=True).encode('utf-8')
+    if path.startswith('s3://'):
+        bucket, key = path[len('s3://'):].split('/', 1)
+        s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType='application/json')
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file:
+            file.write(body)
+
+
+def get_manifest_path(table_name):
+    """
+    テーブルの書き出し済みの時間の記録の書き出し先を取得
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+
+    Returns
+    -------
+    path : str
+        書き出し先
+    """
+
+    return f'{TARGET_ARCHIVE_PATH.rstrip("/")}/{table_name}/{MANIFEST_FILE_NAME}'
+
+
+def compact_table(table_name, hour_start_ms):
+    """
+    1テーブル・1時間分の物標情報をParquetに書き出す
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+    hour_start_ms : int
+        対象の時間の開始時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    row_count : int
+        書き出した物標数
+    """
+
+    # シャードなしの従来形式(路側機の時刻の分)のパーティションはUTCの時間から特定できないため、
+    # 書き出さずに書き出し済みとして記録しないよう失敗とする(migrate_tableで移行してから対象とする)
+    if dynamodb_execute.TARGET_SHARD_NUM <= 0:
+        raise ValueError(f'TARGET_SHARD_NUM must be positive to compact table:{table_name}')
+
+    t_target_info = dynamodb_execute.dynamoDB.Table(table_name)
+
+    # 1時間分の分単位パーティション(「UTCの分#シャード番号」)を全シャード並列に検索
+    partition_keys = [
+        f"{time_util.format_utc(hour_start_ms + minute * 60000)[:16].replace('T', ' ')}#{shard}"
+        for minute in range(60) for shard in range(dynamodb_execute.TARGET_SHARD_NUM)
+    ]
+    items = []
+    for partition_items in executor.map(lambda partition_key: query_partition(table_name, partition_key), partition_keys):
+        items.extend(partition_items)
+
+    row_count = 0
+    if items:
+        # 差分フレームを基準フレームと合成して物標単位の行に展開
+        df = get_target_frame(target_codec.resolve_items(t_target_info, items))
+        row_count = len(df)
+
+        hour_utc = time_util.format_utc(hour_start_ms)
+        path = f'{TARGET_ARCHIVE_PATH.rstrip("/")}/{table_name}/date={hour_utc[:10]}/hour={hour_utc[11:13]}/part.parquet'
+        write_parquet(df, path)
+        logger.info(f'compacted table:{table_name} items:{len(items)} rows:{row_count} path:{path}')
+
+    return row_count
+
+
+def query_partition(table_name, partition_key):
+    """
+    1パーティションを検索(ページングして全件取得)
+    Parameters
+    ----------
+    table_name : string
+        物標情報テーブル名
+    partition_key : string
+        パーティションキー
+
+    Returns
+    -------
+    items : list
+        物標情報アイテム
+    """
+
+    query = {
+        'TableName': table_name,
+        'KeyConditionExpression': Key('time_minutes').eq(partition_key),
+        # 確定の判定前に登録されたアイテムを漏らさないよう強い整合性で読み込む
+        'ConsistentRead': True,
+    }
+
+    items = []
+    while True:
+        # スレッド間で共有できるクライアントを使用
+        response = dynamodb_execute.dynamoDB.meta.client.query(**query)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    return items
+
+
+def get_target_frame(items):
+    """
+    アイテムを物標単位の行に展開し、時刻・機器種別ID・物標ID順にソート
+    Parameters
+    ----------
+    items : list
+        物標情報アイテム
+
+    Returns
+    -------
+    df : DataFrame
+        物標単位のデータ
+    """
+
+    rows = []
+    for item in items:
+        item_values = {column: to_native(item[column]) for column in ITEM_COLUMNS if column in item}
+        for target in target_codec.decode(item['targetIndividualInfo']):
+            rows.append({**item_values, 'time_utc': time_util.to_utc(target['time']), **target})
+
+    df = pd.DataFrame(rows)
+
+    return df.sort_values(['time_utc', 'deviceID', 'targetID'], kind='stable').reset_index(drop=True)
+
+
+def to_native(value):
+    """
+    DynamoDBの数値(Decimal)をintまたはfloatに変換
+    Parameters
+    ----------
+    value :
+        属性値
+
+    Returns
+    -------
+    value :
+        変換後の値
+    """
+
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+
+    return value
+
+
+def write_parquet(df, path):
+    """
+    Parquetを書き出す(s3://で始まらない場合はローカルファイルシステムに書き出す)
+    Parameters
+    ----------
+    df : DataFrame
+        物標単位のデータ
+    path : str
+        書き出し先
+    """
+
+    if path.startswith('s3://'):
+        wr.s3.to_parquet(df=df, path=path, index=False, compression=PARQUET_COMPRESSION)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path, index=False, compression=PARQUET_COMPRESSION)
+
+
+def enable_time_to_live(table_name):
+    """
+    テーブルのTTL(有効期限属性 expire_at)を有効化
+    Parameters
+    ----------
+    table_name : str
+        物標情報テーブル名
+    """
+
+    client = dynamodb_execute.dynamoDB.meta.client
+    description = client.describe_time_to_live(TableName=table_name)['TimeToLiveDescription']
+    if description.get('TimeToLiveStatus') in ('ENABLED', 'ENABLING'):
+        return
+
+    client.update_time_to_live(
+        TableName=table_name,
+        TimeToLiveSpecification={'Enabled': True, 'AttributeName': dynamodb_execute.TTL_ATTRIBUTE_NAME}
+    )
+    logger.info(f'time to live enabled table:{table_name}')
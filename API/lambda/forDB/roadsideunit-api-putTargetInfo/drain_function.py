@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+import time
+import traceback
+
+import dynamodb_execute
+import elasticache_execute
+import redis
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+REDIS_HOST = os.environ['REDIS_HOST']
+TARGET_STREAM_GROUP = os.environ.get('TARGET_STREAM_GROUP', 'dynamodb')
+DRAIN_BATCH_SIZE = int(os.environ.get('DRAIN_BATCH_SIZE', '100'))
+DRAIN_BLOCK_MS = int(os.environ.get('DRAIN_BLOCK_MS', '1000'))
+DRAIN_MIN_IDLE_MS = int(os.environ.get('DRAIN_MIN_IDLE_MS', '60000'))
+DRAIN_MAX_DELIVERIES = int(os.environ.get('DRAIN_MAX_DELIVERIES', '5'))
+
+# 登録に失敗し続けたフレームの退避先ストリーム
+DEAD_LETTER_STREAM_KEY = f'{elasticache_execute.TARGET_STREAM_KEY}:dead'
+
+# 残り実行時間がこの値を下回ったら終了する
+REMAINING_TIME_MARGIN_MS = 10000
+
+
+def lambda_handler(event, context):
+    """
+    DynamoDB登録待ちストリームの物標情報をDynamoDBに一括登録
+    コンシューマグループで読み込み、登録に成功したエントリのみACKする(少なくとも1回の登録)
+    Parameters
+    ----------
+    event : dict
+        スケジュール実行イベント
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        登録件数と未処理件数
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        redis_client = elasticache_execute.get_redis_client(REDIS_HOST)
+        create_group(redis_client)
+
+        # コンテナごとにコンシューマを分ける
+        consumer = context.log_stream_name
+
+        drained_count = 0
+
+        # 他のコンシューマが処理中のまま停止したエントリを引き継ぐ
+        entries = claim_idle_entries(redis_client, consumer)
+        while True:
+            if not entries:
+                entries = redis_client.xreadgroup(
+                    TARGET_STREAM_GROUP,
+                    consumer,
+                    {elasticache_execute.TARGET_STREAM_KEY: '>'},
+                    count=DRAIN_BATCH_SIZE,
+                    block=DRAIN_BLOCK_MS
+                )
+                entries = entries[0][1] if entries else []
+            if not entries:
+                break
+
+            drained_count += drain_entries(redis_client, entries)
+            entries = []
+
+            if context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+                break
+
+        response['body'] = {
+            'drainedCount': drained_count,
+            **get_stream_metrics(redis_client),
+        }
+        logger.info(response['body'])
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo drain')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def create_group(redis_client):
+    """
+    コンシューマグループを作成(作成済みの場合は何もしない)
+    Parameters
+    ----------
+    redis_client :
+        接続したElastiCache
+    """
+
+    try:
+        redis_client.xgroup_create(elasticache_execute.TARGET_STREAM_KEY, TARGET_STREAM_GROUP, id='0', mkstream=True)
+    except redis.exceptions.ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def claim_idle_entries(redis_client, consumer):
+    """
+    一定時間ACKされていないエントリを自コンシューマに引き継ぐ
+    登録に失敗し続けたエントリは退避先ストリームに移動する
+    Parameters
+    ----------
+    redis_client :
+        接続したElastiCache
+    consumer : str
+        コンシューマ名
+
+    Returns
+    -------
+    entries : list
+        引き継いだエントリ
+    """
+
+    _, entries, *_ = redis_client.xautoclaim(
+        elasticache_execute.TARGET_STREAM_KEY,
+        TARGET_STREAM_GROUP,
+        consumer,
+        min_idle_time=DRAIN_MIN_IDLE_MS,
+        count=DRAIN_BATCH_SIZE
+    )
+    if not entries:
+        return entries
+
+    # 配信回数が上限に達したエントリを退避
+    pending_entries = redis_client.xpending_range(
+        elasticache_execute.TARGET_STREAM_KEY,
+        TARGET_STREAM_GROUP,
+        min=entries[0][0],
+        max=entries[-1][0],
+        count=len(entries),
+        consumername=consumer
+    )
+    dead_ids = {pending['message_id'] for pending in pending_entries if pending['times_delivered'] > DRAIN_MAX_DELIVERIES}
+    if dead_ids:
+        pipeline = redis_client.pipeline(transaction=True)
+        for entry_id, fields in entries:
+            if entry_id in dead_ids:
+                pipeline.xadd(DEAD_LETTER_STREAM_KEY, {**fields, 'id': entry_id})
+        pipeline.xack(elasticache_execute.TARGET_STREAM_KEY, TARGET_STREAM_GROUP, *dead_ids)
+        pipeline.xdel(elasticache_execute.TARGET_STREAM_KEY, *dead_ids)
+        pipeline.execute()
+        logger.error(f'dead letter count:{len(dead_ids)}')
+
+    return [(entry_id, fields) for entry_id, fields in entries if entry_id not in dead_ids]
+
+
+def drain_entries(redis_client, entries):
+    """
+    エントリの物標情報をDynamoDBに登録し、ACKして削除
+    登録先テーブルが存在しないエントリは退避先ストリームに移動する
+    Parameters
+    ----------
+    redis_client :
+        接続したElastiCache
+    entries : list
+        ストリームのエントリ
+
+    Returns
+    -------
+    drained_count : int
+        登録したエントリ数
+    """
+
+    # 削除済みのエントリ(フィールドなし)は登録せずACKする
+    frames = {entry_id: json.loads(fields['frame']) for entry_id, fields in entries if fields}
+    not_found_table_names = set()
+    if frames:
+        not_found_table_names = set(dynamodb_execute.put_data_by_table(list(frames.values())))
+
+    # 登録先テーブルが存在しないエントリ(テーブル作成後に再投入できるよう退避する)
+    dead_ids = {entry_id for entry_id, parameters in frames.items() if dynamodb_execute.get_table_name(parameters) in not_found_table_names}
+
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipeline = redis_client.pipeline(transaction=True)
+    for entry_id, fields in entries:
+        if entry_id in dead_ids:
+            pipeline.xadd(DEAD_LETTER_STREAM_KEY, {**fields, 'id': entry_id})
+    pipeline.xack(elasticache_execute.TARGET_STREAM_KEY, TARGET_STREAM_GROUP, *entry_ids)
+    pipeline.xdel(elasticache_execute.TARGET_STREAM_KEY, *entry_ids)
+    pipeline.execute()
+    if dead_ids:
+        logger.error(f"dead letter count:{len(dead_ids)} tables:{','.join(sorted(not_found_table_names))}")
+
+    return len(frames) - len(dead_ids)
+
+
+def get_stream_metrics(redis_client):
+    """
+    ストリームの滞留状況を取得
+    Parameters
+    ----------
+    redis_client :
+        接続したElastiCache
+
+    Returns
+    -------
+    metrics : dict
+        ストリーム長、未読件数(lag)、未ACK件数(pending)、最古エントリの経過時間(ミリ秒)
+    """
+
+    metrics = {
+        'streamLength': redis_client.xlen(elasticache_execute.TARGET_STREAM_KEY),
+        'lag': None,
+        'pending': None,
+        'oldestAgeMs': 0,
+    }
+
+    # エントリIDの先頭は追加時刻(ミリ秒)
+    oldest_entries = redis_client.xrange(elasticache_execute.TARGET_STREAM_KEY, count=1)
+    if oldest_entries:
+        metrics['oldestAgeMs'] = int(time.time() * 1000) - int(oldest_entries[0][0].split('-')[0])
+
+    for group in redis_client.xinfo_groups(elasticache_execute.TARGET_STREAM_KEY):
+        if group['name'] == TARGET_STREAM_GROUP:
+            metrics['lag'] = group.get('lag')
+            metrics['pending'] = group['pending']
+
+    return metrics
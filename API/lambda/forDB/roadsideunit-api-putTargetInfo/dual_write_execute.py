@@ -0,0 +1,125 @@
+import logging
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import dynamodb_execute
+import elasticache_execute
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 登録先ごとの並列実行用スレッドプール(ウォームスタート時は再利用する)
+executor = ThreadPoolExecutor(max_workers=2)
+
+
+def put_data(parameters, redis_host):
+    """
+    物標情報をElastiCacheとDynamoDBに並列登録
+    parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
+    return put_data_list([parameters], redis_host)
+
+
+def put_data_list(parameters_list, redis_host):
+    """
+    複数フレームの物標情報をElastiCacheとDynamoDBに並列登録
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
+    # 登録先ごとに並列実行
+    futures = {
+        'ElastiCache': executor.submit(execute_sink, elasticache_execute.put_data_list, parameters_list, redis_host),
+        'DynamoDB': executor.submit(execute_sink, dynamodb_execute.put_data_list, parameters_list),
+    }
+
+    return get_response_status(futures)
+
+
+def execute_sink(put_function, *args):
+    """
+    登録処理を実行し、処理時間を計測
+    parameters
+    ----------
+    put_function : function
+        登録処理
+    args
+        登録処理の引数
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス(失敗時はNone)
+    elapsed_ms : float
+        処理時間(ミリ秒)
+    error : str
+        失敗時のトレースバック(成功時はNone)
+    """
+
+    start_time = time.perf_counter()
+    try:
+        response_status = put_function(*args)
+        error = None
+    except Exception:
+        response_status = None
+        error = traceback.format_exc()
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    return response_status, elapsed_ms, error
+
+
+def get_response_status(futures):
+    """
+    登録先ごとの結果を集約
+    いずれかの登録先が失敗した場合は例外を送出する
+    parameters
+    ----------
+    futures : dict
+        登録先名と実行結果
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
+    response_status = 201
+    failed_sinks = []
+
+    for sink_name, future in futures.items():
+        sink_status, elapsed_ms, error = future.result()
+        logger.info(f'{sink_name} status:{sink_status} latency:{elapsed_ms:.1f}ms')
+
+        if error is not None:
+            logger.error(f'error {sink_name}')
+            logger.error(error)
+            failed_sinks.append(sink_name)
+        else:
+            response_status = max(response_status, sink_status)
+
+    if failed_sinks:
+        raise Exception(f"put_data failed: {', '.join(failed_sinks)}")
+
+    return response_status
@@ -1,8 +1,14 @@
+import json
 import logging
 import os
-from datetime import datetime, timezone
+import random
+import time as time_module
+import zlib
 
 import boto3
+import geohash
+import target_codec
+import time_util
 from botocore.exceptions import ClientError
 from log import logger
 
@@ -11,7 +17,45 @@ logger.setLevel(logging.INFO)
 
 # 環境変数取得
 TARGET_INFO_TABLE_NAME = os.environ['TARGET_INFO_TABLE_NAME']
-RECORD_MAX_TARGET = int(os.environ['RECORD_MAX_TARGET'])
+RECORD_MAX_BYTES = int(os.environ.get('RECORD_MAX_BYTES', '32768'))
+TARGET_INFO_ENCODING_VERSION = int(os.environ.get('TARGET_INFO_ENCODING_VERSION', target_codec.ENCODING_VERSION_DICTIONARY))
+TARGET_INFO_STORAGE_MODE = os.environ.get('TARGET_INFO_STORAGE_MODE', target_codec.STORAGE_MODE_FULL)
+TARGET_KEYFRAME_INTERVAL = int(os.environ.get('TARGET_KEYFRAME_INTERVAL', '30'))
+TARGET_SHARD_NUM = int(os.environ.get('TARGET_SHARD_NUM', '8'))
+TARGET_INFO_TTL_SECONDS = int(os.environ.get('TARGET_INFO_TTL_SECONDS', '604800'))
+TARGET_ARCHIVE_FINAL_DELAY_SECONDS = int(os.environ.get('TARGET_ARCHIVE_FINAL_DELAY_SECONDS', '3600'))
+TARGET_GEOHASH_PRECISION = int(os.environ.get('TARGET_GEOHASH_PRECISION', '7'))
+# 1アイテムに格納する物標の時刻の幅の上限(getTargetInfoのRANGE_SECONDS以下とする)
+RANGE_SECONDS = int(os.environ.get('RANGE_SECONDS', '1'))
+BATCH_WRITE_MAX_RETRY = int(os.environ.get('BATCH_WRITE_MAX_RETRY', '8'))
+BATCH_WRITE_BASE_DELAY = float(os.environ.get('BATCH_WRITE_BASE_DELAY', '0.05'))
+BATCH_WRITE_MAX_DELAY = float(os.environ.get('BATCH_WRITE_MAX_DELAY', '2.0'))
+
+# BatchWriteItem 1リクエストあたりの最大アイテム数
+BATCH_WRITE_MAX_ITEMS = 25
+
+# DynamoDB 1アイテムあたりの最大サイズ
+DYNAMODB_ITEM_MAX_BYTES = 400 * 1024
+
+# 有効期限(UNIX時間・秒)の属性名、物標の時刻から保持期間経過後にDynamoDBのTTLで削除される
+# TTLはcompact_functionが有効期限を設定したアイテムの全時間をS3に書き出した後にテーブルごとに有効化する
+# 時間の終了からTARGET_ARCHIVE_FINAL_DELAY_SECONDS経過後はcompact_functionが書き出しを確定するため、
+# それ以降に登録された(遅れて届いた)アイテムは書き出されないまま削除されないよう有効期限を設定しない
+TTL_ATTRIBUTE_NAME = 'expire_at'
+
+# アイテム内の物標の位置を含むセル(geohash)の集合の属性名
+# 範囲検索では対象のセルを含むアイテムのみ復元する
+GEOHASH_CELLS_ATTRIBUTE_NAME = 'geohash_cells'
+
+# 間引き階層のパーティションキーのプレフィックス(「tier{間隔}#UTCの時#機器種別ID」)
+# 間引き階層のアイテムはtime_utcを持たないため、GSI(deviceID-time_utc-index)には含まれない
+TIER_PARTITION_KEY_PREFIX = 'tier'
+
+# 物標情報の圧縮率(非圧縮サイズ/格納サイズ)の推定値、登録ごとに更新する
+compression_ratio = 1.0
+
+# 差分格納モードの基準フレーム(テーブル名・機器種別IDごと)、登録成功後に更新する
+keyframes = {}
 
 # DynamoDBオブジェクト
 dynamoDB = boto3.resource('dynamodb')
@@ -31,96 +75,554 @@ def put_data(parameters):
         処理完了ステータス
     """
 
+    return put_data_list([parameters])
+
+
+def put_data_list(parameters_list):
+    """
+    複数フレームの物標情報を登録先テーブルごとにまとめて登録
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
     response_status = 201
 
+    put_data_by_table(parameters_list)
+
+    return response_status
+
+
+def put_data_by_table(parameters_list):
+    """
+    複数フレームの物標情報を登録先テーブルごとにまとめて登録し、登録先テーブルが存在しなかったテーブル名を取得
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+
+    Returns
+    -------
+    not_found_table_names : list
+        存在しなかったため登録できなかったテーブル名
+    """
+
+    not_found_table_names = []
+
     try:
-        # 登録する物標情報テーブル名を作成
-        base_table_name = TARGET_INFO_TABLE_NAME
-        t_target_name = f"{base_table_name}_{parameters['attribute']['roadsideUnitID']}_{parameters['attribute']['serviceLocationID']}"
-        t_target_info = dynamoDB.Table(t_target_name)
+        # 登録する物標情報テーブルごとに登録アイテムをまとめる
+        items_by_table = {}
+        pending_keyframes = {}
+        for parameters in parameters_list:
+            t_target_name = get_table_name(parameters)
+            items_by_table.setdefault(t_target_name, []).extend(get_target_items(parameters, t_target_name, pending_keyframes))
 
         # 物標情報登録
-        for device_individual_value in parameters['attribute']['deviceIndividualInfo']:
-            if 'targetIndividualInfo' in device_individual_value:
-                # timeで昇順にソート
-                device_individual_value['targetIndividualInfo'] = sorted(device_individual_value['targetIndividualInfo'], key=lambda x: getTimeUtc(x["time"]))
-
-                # 100物標ずつの配列を生成
-                split_array = [device_individual_value['targetIndividualInfo'][i:i + RECORD_MAX_TARGET] for i in range(0, len(device_individual_value['targetIndividualInfo']), RECORD_MAX_TARGET)]
-
-                for split_target_individual_value in split_array:
-                    # プライマリーキー(time_minutes,time)の重複を防ぐためtargetIDを末尾に結合
-                    unique_time = f"{split_target_individual_value[0]['time']}_{split_target_individual_value[0]['targetID']}"
-
-                    # 物標情報登録
-                    item = {
-                        'time_minutes': getTimeMinutes(split_target_individual_value[0]['time']),
-                        'unique_time': unique_time,
-                        'roadsideUnitID': parameters['attribute']['roadsideUnitID'],
-                        'serviceLocationID': parameters['attribute']['serviceLocationID'],
-                        'updateTimeInfo': parameters['attribute']['updateTimeInfo'],
-                        'formatVersion': parameters['attribute']['formatVersion'],
-                        'deviceID': device_individual_value['deviceID'],
-                        'time_utc': getTimeUtc(split_target_individual_value[0]['time']),
-                        'targetIndividualInfo': str(split_target_individual_value),
-                    }
-                    if 'dataModelType' in parameters:
-                        item['dataModelType'] = parameters['dataModelType']
-
-                    try:
-                        t_target_info.put_item(
-                            Item=item
-                        )
-                    except ClientError as e:
-                        if e.response['Error']['Code'] == 'ResourceNotFoundException':
-                            logger.error('Not Found ' + t_target_name)
+        for t_target_name, items in items_by_table.items():
+            try:
+                batch_write_items(t_target_name, items)
+
+                # 登録に成功したテーブルの基準フレームを更新
+                keyframes.update({key: keyframe for key, keyframe in pending_keyframes.items() if key[0] == t_target_name})
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                    logger.error('Not Found ' + t_target_name)
+                    not_found_table_names.append(t_target_name)
+                else:
+                    raise
     except Exception:
         logger.error('other error')
         raise
 
-    return response_status
+    return not_found_table_names
+
+
+def get_table_name(parameters):
+    """
+    物標情報の登録先テーブル名を取得
+    parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+
+    Returns
+    -------
+    t_target_name : str
+        登録先テーブル名
+    """
+
+    return f"{TARGET_INFO_TABLE_NAME}_{parameters['attribute']['roadsideUnitID']}_{parameters['attribute']['serviceLocationID']}"
+
+
+def get_target_items(parameters, t_target_name, pending_keyframes):
+    """
+    1フレーム分の物標情報登録アイテムを生成
+    parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+    t_target_name : str
+        登録先テーブル名
+    pending_keyframes : dict
+        登録待ちの基準フレーム
+
+    Returns
+    -------
+    items : list
+        登録アイテム
+    """
+
+    items = []
+
+    for device_individual_value in parameters['attribute']['deviceIndividualInfo']:
+        if 'targetIndividualInfo' in device_individual_value:
+            # timeで昇順にソート
+            target_individual_info = sorted(device_individual_value['targetIndividualInfo'], key=lambda x: time_util.parse_epoch_ms(x["time"]))
+            # 差分では位置が変化しない物標の緯度・経度が省略されるため、差分生成前の物標情報からセルを算出
+            target_cells = get_target_cells(target_individual_info)
+
+            if TARGET_INFO_STORAGE_MODE == target_codec.STORAGE_MODE_DELTA:
+                # 差分格納モードの場合は基準フレームとの差分として登録
+                items.extend(get_delta_items(parameters, device_individual_value, target_individual_info, t_target_name, pending_keyframes, target_cells))
+            else:
+                # 格納サイズの上限に収まるよう物標を詰めた配列を生成
+                for split_target_individual_value in pack_targets(target_individual_info):
+                    items.extend(get_sized_items(parameters, device_individual_value, split_target_individual_value, target_cells=target_cells))
+
+    # 書き出しを確定した時間のアイテムは有効期限を設定しない
+    final_hour = get_final_hour(int(time_module.time() * 1000))
+    late_items = [item for item in items if TTL_ATTRIBUTE_NAME in item and item['time_utc'][:13] < final_hour]
+    for item in late_items:
+        del item[TTL_ATTRIBUTE_NAME]
+    if late_items:
+        late_hours = sorted({item['time_utc'][:13] for item in late_items})
+        logger.warning(f"late items without expire_at table:{t_target_name} items:{len(late_items)} hours:{','.join(late_hours)}")
+
+    # アイテムサイズを出力
+    if items:
+        item_sizes = [get_item_size(item) for item in items]
+        logger.info(f'items:{len(items)} totalBytes:{sum(item_sizes)} minBytes:{min(item_sizes)} maxBytes:{max(item_sizes)} avgBytes:{sum(item_sizes) // len(items)}')
+
+    return items
+
+
+def get_final_hour(now_ms):
+    """
+    compact_functionが書き出しを確定した時間の境界を取得(この時間より前の時間は確定済み)
+    parameters
+    ----------
+    now_ms : int
+        現在時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    final_hour : str
+        時間(UTCのYYYY-MM-DDTHH)
+    """
 
+    return time_util.format_utc(now_ms - TARGET_ARCHIVE_FINAL_DELAY_SECONDS * 1000)[:13]
 
-def getTimeMinutes(time):
+
+def get_delta_items(parameters, device_individual_value, target_individual_info, t_target_name, pending_keyframes, target_cells=None):
+    """
+    差分格納モードの登録アイテムを生成
+    一定フレームごとに全項目を持つ基準フレームを登録し、それ以外は基準フレームとの差分のみ登録する
+    parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+    device_individual_value : dict
+        機器情報
+    target_individual_info : list
+        時刻順の物標情報配列
+    t_target_name : str
+        登録先テーブル名
+    pending_keyframes : dict
+        登録待ちの基準フレーム
+    target_cells : dict
+        物標IDごとのセル(geohash)
+
+    Returns
+    -------
+    items : list
+        登録アイテム
+    """
+
+    keyframe_key = (t_target_name, device_individual_value['deviceID'])
+    keyframe = pending_keyframes.get(keyframe_key, keyframes.get(keyframe_key))
+
+    items = []
+
+    # 基準フレームが有効な場合は差分を登録
+    if keyframe is not None and keyframe['count'] < TARGET_KEYFRAME_INTERVAL:
+        delta_target_individual_info = target_codec.get_delta(keyframe['targets'], target_individual_info)
+        extra_attributes = {
+            'targetInfoFrameType': target_codec.FRAME_TYPE_DELTA,
+            'keyframeKeys': keyframe['keys'],
+        }
+        # 基準フレームより後に削除されないよう有効期限を基準フレームに揃える
+        if keyframe.get('expire_at') is not None:
+            extra_attributes[TTL_ATTRIBUTE_NAME] = keyframe['expire_at']
+        for split_target_individual_value in pack_targets(delta_target_individual_info):
+            items.extend(get_sized_items(parameters, device_individual_value, split_target_individual_value, extra_attributes, target_cells))
+
+        pending_keyframes[keyframe_key] = {**keyframe, 'count': keyframe['count'] + 1}
+
+    # 基準フレームがない、または一定フレーム経過した場合は基準フレームを登録
+    else:
+        extra_attributes = {
+            'targetInfoFrameType': target_codec.FRAME_TYPE_KEYFRAME,
+        }
+        for split_target_individual_value in pack_targets(target_individual_info):
+            items.extend(get_sized_items(parameters, device_individual_value, split_target_individual_value, extra_attributes, target_cells))
+
+        pending_keyframes[keyframe_key] = {
+            'keys': [{'time_minutes': item['time_minutes'], 'unique_time': item['unique_time']} for item in items],
+            'targets': {target['targetID']: target for target in target_individual_info},
+            'count': 0,
+            'expire_at': min((item[TTL_ATTRIBUTE_NAME] for item in items if TTL_ATTRIBUTE_NAME in item), default=None),
+        }
+
+    return items
+
+
+def pack_targets(target_individual_info):
     """
-    時刻「分」までをフォーマットで取得
+    推定格納サイズが上限に収まり、先頭から末尾の物標の時刻の幅がRANGE_SECONDS以内となるよう物標を順に詰めて分割
+    (getTargetInfoはアイテムの時刻の幅がRANGE_SECONDS以内であることを前提に検索範囲の下限を決める)
     Parameters
     ----------
-    time : string
-        時刻情報
+    target_individual_info : list
+        時刻順の物標情報配列
 
     Returns
     -------
-    format_time  : String
-        時刻「分」まで時刻情報
+    split_array : list
+        分割した物標情報配列
     """
-    time = datetime.strptime(time, '%Y-%m-%dT%H:%M:%S.%f%z')
-    # 時刻「分」までをフォーマットで取得
-    format_time = time.strftime('%Y-%m-%d %H:%M')
 
-    return format_time
+    # 圧縮率の推定値から非圧縮時のサイズ上限を算出
+    raw_max_bytes = min(RECORD_MAX_BYTES, DYNAMODB_ITEM_MAX_BYTES) * compression_ratio
+
+    split_array = []
+    current_targets = []
+    current_bytes = 0
+    current_start_ms = None
+    for target in target_individual_info:
+        target_bytes = len(json.dumps(target, separators=(',', ':')))
+        target_ms = time_util.parse_epoch_ms(target['time'])
+        if current_targets and (current_bytes + target_bytes > raw_max_bytes or target_ms - current_start_ms > RANGE_SECONDS * 1000):
+            split_array.append(current_targets)
+            current_targets = []
+            current_bytes = 0
+        if not current_targets:
+            current_start_ms = target_ms
+        current_targets.append(target)
+        current_bytes += target_bytes
+
+    if current_targets:
+        split_array.append(current_targets)
+
+    return split_array
 
 
-def getTimeUtc(time):
+def get_sized_items(parameters, device_individual_value, split_target_individual_value, extra_attributes=None, target_cells=None):
     """
-    タイムゾーンをutcに変換
+    登録アイテムを生成し、格納サイズが上限を超える場合は分割
+    Parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+    device_individual_value : dict
+        機器情報
+    split_target_individual_value : list
+        1アイテムに格納する物標情報配列
+    extra_attributes : dict
+        追加で登録する属性
+    target_cells : dict
+        物標IDごとのセル(geohash)
+
+    Returns
+    -------
+    items : list
+        登録アイテム
+    """
+    global compression_ratio
+
+    item = get_item(parameters, device_individual_value, split_target_individual_value, extra_attributes, target_cells)
+    item_bytes = get_item_size(item)
+
+    # 圧縮率の推定値を更新
+    raw_bytes = len(json.dumps(split_target_individual_value, separators=(',', ':')))
+    value_bytes = get_attribute_size(item['targetIndividualInfo'])
+    compression_ratio = (compression_ratio + raw_bytes / value_bytes) / 2
+
+    if item_bytes <= min(RECORD_MAX_BYTES, DYNAMODB_ITEM_MAX_BYTES):
+        return [item]
+
+    # 上限を超えた場合は半分に分割して再生成
+    if len(split_target_individual_value) > 1:
+        half = len(split_target_individual_value) // 2
+        return get_sized_items(parameters, device_individual_value, split_target_individual_value[:half], extra_attributes, target_cells) + \
+            get_sized_items(parameters, device_individual_value, split_target_individual_value[half:], extra_attributes, target_cells)
+
+    # 1物標でも上限を超える場合、DynamoDBの上限内であれば登録する
+    if item_bytes <= DYNAMODB_ITEM_MAX_BYTES:
+        return [item]
+
+    logger.error(f"target exceeds item size limit deviceID:{device_individual_value['deviceID']} targetID:{split_target_individual_value[0]['targetID']} bytes:{item_bytes}")
+    raise ValueError('target exceeds DynamoDB item size limit')
+
+
+def get_item(parameters, device_individual_value, split_target_individual_value, extra_attributes=None, target_cells=None):
+    """
+    登録アイテムを生成
+    Parameters
+    ----------
+    parameters : Array
+        物標情報パラメータ
+    device_individual_value : dict
+        機器情報
+    split_target_individual_value : list
+        1アイテムに格納する物標情報配列
+    extra_attributes : dict
+        追加で登録する属性
+    target_cells : dict
+        物標IDごとのセル(geohash)
+
+    Returns
+    -------
+    item : dict
+        登録アイテム
+    """
+
+    # プライマリーキー(time_minutes,time)の重複を防ぐためtargetIDを末尾に結合
+    unique_time = f"{split_target_individual_value[0]['time']}_{split_target_individual_value[0]['targetID']}"
+    # 物標情報は時刻順のため先頭が最小、末尾が最大の時刻
+    time_utc = time_util.to_utc(split_target_individual_value[0]['time'])
+    time_utc_max = time_util.to_utc(split_target_individual_value[-1]['time'])
+
+    item = {
+        'time_minutes': get_partition_key(split_target_individual_value[0]['time'], time_utc, device_individual_value['deviceID'], split_target_individual_value[0]['targetID']),
+        'unique_time': unique_time,
+        'roadsideUnitID': parameters['attribute']['roadsideUnitID'],
+        'serviceLocationID': parameters['attribute']['serviceLocationID'],
+        'updateTimeInfo': parameters['attribute']['updateTimeInfo'],
+        'formatVersion': parameters['attribute']['formatVersion'],
+        'deviceID': device_individual_value['deviceID'],
+        'time_utc': time_utc,
+        'time_utc_max': time_utc_max,
+        'targetIndividualInfo': target_codec.encode(split_target_individual_value, TARGET_INFO_ENCODING_VERSION),
+    }
+    if 'dataModelType' in parameters:
+        item['dataModelType'] = parameters['dataModelType']
+    if target_cells:
+        cells = {target_cells[target['targetID']] for target in split_target_individual_value if target['targetID'] in target_cells}
+        if cells:
+            item[GEOHASH_CELLS_ATTRIBUTE_NAME] = cells
+    if TARGET_INFO_TTL_SECONDS > 0:
+        item[TTL_ATTRIBUTE_NAME] = time_util.parse_epoch_ms(split_target_individual_value[0]['time']) // 1000 + TARGET_INFO_TTL_SECONDS
+    if extra_attributes:
+        item.update(extra_attributes)
+
+    return item
+
+
+def get_target_cells(target_individual_info):
+    """
+    物標IDごとに位置を含むセル(geohash)を算出
+    Parameters
+    ----------
+    target_individual_info : list
+        物標情報配列
+
+    Returns
+    -------
+    target_cells : dict
+        物標IDごとのセル(緯度・経度が不明な物標は含まない)
+    """
+
+    if TARGET_GEOHASH_PRECISION <= 0:
+        return {}
+
+    target_cells = {}
+    for target in target_individual_info:
+        latitude = target.get('latitude')
+        longitude = target.get('longitude')
+        if latitude is not None and longitude is not None and geohash.is_valid(latitude, longitude):
+            target_cells[target['targetID']] = geohash.encode(latitude, longitude, TARGET_GEOHASH_PRECISION)
+
+    return target_cells
+
+
+def get_item_size(item):
+    """
+    DynamoDBのアイテムサイズを算出(属性名と値のバイト数の合計)
+    Parameters
+    ----------
+    item : dict
+        登録アイテム
+
+    Returns
+    -------
+    item_size : int
+        アイテムサイズ(バイト)
+    """
+
+    return sum(len(key.encode('utf-8')) + get_attribute_size(value) for key, value in item.items())
+
+
+def get_attribute_size(value):
+    """
+    DynamoDBの属性値サイズを算出
+    Parameters
+    ----------
+    value
+        属性値
+
+    Returns
+    -------
+    attribute_size : int
+        属性値サイズ(バイト)
+    """
+
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (int, float)):
+        # 数値は有効桁2桁ごとに1バイト+1バイト
+        return (len(str(abs(value)).replace('.', '')) + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + get_attribute_size(element) + 1 for key, element in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 3 + sum(get_attribute_size(element) + 1 for element in value)
+
+    return 1
+
+
+def batch_write_items(table_name, items):
+    """
+    BatchWriteItemで25件ずつ一括登録
+    未処理アイテムはジッター付き指数バックオフで再送する
+    parameters
+    ----------
+    table_name : str
+        登録先テーブル名
+    items : list
+        登録アイテム
+    """
+
+    # 同一バッチ内でキーが重複するとBatchWriteItemがエラーとなるため、put_item同様に後勝ちで除外
+    unique_items = {}
+    for item in items:
+        unique_items[(item['time_minutes'], item['unique_time'])] = item
+    items = list(unique_items.values())
+
+    batch_write_requests(table_name, [{'PutRequest': {'Item': item}} for item in items])
+
+
+def batch_write_requests(table_name, requests):
+    """
+    BatchWriteItemで登録・削除リクエストを25件ずつ実行
+    未処理アイテムはジッター付き指数バックオフで再送する
+    parameters
+    ----------
+    table_name : str
+        対象テーブル名
+    requests : list
+        PutRequestまたはDeleteRequest
+    """
+
+    for i in range(0, len(requests), BATCH_WRITE_MAX_ITEMS):
+        request_items = {
+            table_name: requests[i:i + BATCH_WRITE_MAX_ITEMS]
+        }
+        retry_count = 0
+
+        while request_items:
+            response = dynamoDB.meta.client.batch_write_item(
+                RequestItems=request_items,
+                ReturnConsumedCapacity='TOTAL'
+            )
+
+            # バッチごとの消費WCUを出力
+            consumed_capacity = sum(capacity.get('CapacityUnits', 0) for capacity in response.get('ConsumedCapacity', []))
+            write_count = sum(len(table_requests) for table_requests in request_items.values())
+            logger.info(f'batch_write_item table:{table_name} items:{write_count} retry:{retry_count} consumedWCU:{consumed_capacity}')
+
+            request_items = response.get('UnprocessedItems', {})
+            if request_items:
+                if retry_count >= BATCH_WRITE_MAX_RETRY:
+                    unprocessed_count = sum(len(table_requests) for table_requests in request_items.values())
+                    logger.error(f'UnprocessedItems remain table:{table_name} items:{unprocessed_count}')
+                    raise Exception('batch_write_item retry limit exceeded')
+
+                # フルジッター付き指数バックオフ
+                time_module.sleep(random.uniform(0, min(BATCH_WRITE_MAX_DELAY, BATCH_WRITE_BASE_DELAY * (2 ** retry_count))))
+                retry_count += 1
+
+
+def get_partition_key(time, time_utc, device_id, target_id):
+    """
+    パーティションキー(time_minutes)を取得
+    シャード数が指定されている場合は「UTCの分#シャード番号」とし、同一分の書き込みを分散する
     Parameters
     ----------
     time : string
         時刻情報
+    time_utc : string
+        UTCに変換した時刻情報
+    device_id : int
+        機器種別ID
+    target_id : int
+        物標ID
 
     Returns
     -------
-    utc_time  : String
-        時刻をUTCに変換
+    partition_key : String
+        パーティションキー
     """
-    # iso形式の文字列をdatetimeオブジェクトに変換
-    iso_time = datetime.fromisoformat(time)
 
-    # タイムゾーンをutcに変換
-    utc_time = iso_time.astimezone(timezone.utc)
+    # シャード数が未指定の場合は従来形式(分まで)
+    if TARGET_SHARD_NUM <= 0:
+        return time_util.to_minutes(time)
+
+    # UTC時刻の「分」まで(YYYY-MM-DD HH:MM)
+    minutes_utc = time_utc[:16].replace('T', ' ')
+
+    # 機器種別IDと物標IDからシャード番号を決定
+    shard = zlib.crc32(f'{device_id}_{target_id}'.encode('utf-8')) % TARGET_SHARD_NUM
+
+    return f'{minutes_utc}#{shard}'
+
+
+def get_tier_partition_key(tier_seconds, bucket_utc, device_id):
+    """
+    間引き階層のパーティションキーを取得
+    機器種別ごとに1時間分の区間を1パーティションにまとめ、区間の開始時刻(unique_time)の範囲で検索する
+    Parameters
+    ----------
+    tier_seconds : int
+        間引きの間隔(秒)
+    bucket_utc : string
+        区間の開始時刻(UTC)
+    device_id : int
+        機器種別ID
+
+    Returns
+    -------
+    partition_key : String
+        パーティションキー
+    """
 
-    # フォーマットを整える
-    utc_time = utc_time.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+    # UTC時刻の「時」まで(YYYY-MM-DD HH)
+    hours_utc = bucket_utc[:13].replace('T', ' ')
 
-    return utc_time
+    return f'{TIER_PARTITION_KEY_PREFIX}{tier_seconds}#{hours_utc}#{device_id}'
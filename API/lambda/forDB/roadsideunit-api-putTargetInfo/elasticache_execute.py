@@ -1,12 +1,93 @@
 import json
 import logging
+import os
+import time
 
+import cache_codec
+import geohash
 import redis
+import time_util
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 環境変数取得
+TARGET_STREAM_KEY = os.environ.get('TARGET_STREAM_KEY', 'stream:targetInfo')
+TARGET_STREAM_MAX_LEN = int(os.environ.get('TARGET_STREAM_MAX_LEN', '100000'))
+TARGET_STREAM_RETRY_AFTER_SECONDS = int(os.environ.get('TARGET_STREAM_RETRY_AFTER_SECONDS', '5'))
+TARGET_CACHE_COMPRESSION = cache_codec.get_compression(os.environ.get('TARGET_CACHE_COMPRESSION', cache_codec.COMPRESSION_NONE))
+TARGET_CACHE_COMPRESS_MIN_BYTES = int(os.environ.get('TARGET_CACHE_COMPRESS_MIN_BYTES', '1024'))
+TARGET_HISTORY_SECONDS = int(os.environ.get('TARGET_HISTORY_SECONDS', '0'))
+TARGET_INDEX_SECONDS = int(os.environ.get('TARGET_INDEX_SECONDS', '0'))
+
+# 機器ごとの直近の物標情報(履歴)のキーのプレフィックス(h:r{路側機ID}s{サービス地点情報ID}d{機器種別ID})
+# 物標の最小の時刻(UNIXエポックからのミリ秒)をスコアとするソート済みセットに、機器ごとのフレームを格納する
+HISTORY_KEY_PREFIX = 'h:'
+
+# 路側機・サービス地点ごとに履歴の格納を開始したフレームの時刻のキーのプレフィックス(h:since:r{路側機ID}s{サービス地点情報ID})
+# 取得時はこの時刻以降かつ保持期間内の範囲のみ履歴から返却する
+HISTORY_SINCE_KEY_PREFIX = 'h:since:'
+
+# 路側機・サービス地点ごとの物標IDから最新の物標情報へのハッシュのキーのプレフィックス(t:r{路側機ID}s{サービス地点情報ID})
+TARGET_INDEX_KEY_PREFIX = 't:'
+
+# 物標IDごとの最新の時刻(UNIXエポックからのミリ秒)のソート済みセットのキーのプレフィックス(t:seen:r{路側機ID}s{サービス地点情報ID})
+# 保持期間を過ぎても更新されない物標をハッシュから削除するために使用する
+TARGET_INDEX_SEEN_KEY_PREFIX = 't:seen:'
+
+# 物標IDごとの最新の位置(GEO)のキーのプレフィックス(g:r{路側機ID}s{サービス地点情報ID})
+# GEOSEARCHで矩形・円の範囲内の物標IDを取得し、物標情報はハッシュから取得する
+TARGET_GEO_KEY_PREFIX = 'g:'
+
+# GEOに登録できる緯度の上限(1/10^7度)
+GEO_MAX_LATITUDE = 850511287
+
+# 物標IDごとの最新の物標情報・位置の更新
+# 既に新しい時刻の物標情報がある物標は更新せず、保持期間を過ぎた物標はハッシュ・GEOから削除する
+# KEYS : ハッシュ, ソート済みセット, GEO
+# ARGV : 保持期間(ミリ秒), (物標ID, 時刻, 物標情報, 経度, 緯度)...(位置が不明な場合は経度・緯度は空文字)
+TARGET_INDEX_SCRIPT = """
+local retention = tonumber(ARGV[1])
+local latest = 0
+for i = 2, #ARGV, 5 do
+    local score = tonumber(ARGV[i + 1])
+    local current = redis.call('ZSCORE', KEYS[2], ARGV[i])
+    if not current or tonumber(current) <= score then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2])
+        redis.call('ZADD', KEYS[2], score, ARGV[i])
+        if ARGV[i + 3] ~= '' then
+            redis.call('GEOADD', KEYS[3], ARGV[i + 3], ARGV[i + 4], ARGV[i])
+        else
+            redis.call('ZREM', KEYS[3], ARGV[i])
+        end
+    end
+    latest = math.max(latest, score)
+end
+
+local cutoff = string.format('(%d', latest - retention)
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', cutoff)
+for i = 1, #expired, 1000 do
+    redis.call('HDEL', KEYS[1], unpack(expired, i, math.min(i + 999, #expired)))
+    redis.call('ZREM', KEYS[3], unpack(expired, i, math.min(i + 999, #expired)))
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', cutoff)
+
+for i = 1, #KEYS do
+    redis.call('PEXPIRE', KEYS[i], retention * 2)
+end
+return #expired
+"""
+
+# ElastiCache接続(ウォームスタート時は再利用する)
+redis_clients = {}
+
+
+class StreamBacklogError(Exception):
+    """
+    DynamoDB登録待ちストリームの未登録件数が上限に達し、登録を受け付けられない場合のエラー
+    """
+
 
 def put_data(parameters, redis_host):
     """
@@ -24,22 +105,129 @@ def put_data(parameters, redis_host):
         処理完了ステータス
     """
 
+    return put_data_list([parameters], redis_host)
+
+
+def put_data_list(parameters_list, redis_host):
+    """
+    複数フレームの物標情報を1回の通信で登録
+    同一機器のフレームが複数ある場合は更新時刻が最新のものを登録する
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
     response_status = 201
 
     try:
         # ElastiCacheに接続
-        redis_client = redis.StrictRedis(
-            host=redis_host,
-            port='6379',
-            decode_responses=True,
-            db=0
-        )
+        redis_client = get_redis_client(redis_host)
+
+        # 全フレーム・全機器分の物標情報を1回の通信で登録
+        target_mapping = get_target_mapping(parameters_list)
+        if target_mapping:
+            pipeline = redis_client.pipeline(transaction=True)
+            pipeline.mset(target_mapping)
+            add_history(pipeline, parameters_list)
+            update_target_index(pipeline, parameters_list)
+            pipeline.execute()
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+    return response_status
+
+
+def put_data_list_write_behind(parameters_list, redis_host):
+    """
+    最新の物標情報の登録と、DynamoDB登録待ちストリームへの追加を1回の通信で実行
+    ストリームに追加したフレームはdrain_functionがDynamoDBに登録する
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    response_status : int
+        処理完了ステータス
+    """
+
+    response_status = 201
+
+    try:
+        # ElastiCacheに接続
+        redis_client = get_redis_client(redis_host)
+
+        # ストリームのエントリはdrain_functionがDynamoDBに登録後に削除するため、件数が未登録の件数となる
+        # 上限に達している場合は未登録のエントリを切り詰めず、登録せずに再送を待たせる
+        if TARGET_STREAM_MAX_LEN > 0:
+            stream_length = redis_client.xlen(TARGET_STREAM_KEY)
+            if stream_length >= TARGET_STREAM_MAX_LEN:
+                raise StreamBacklogError(f'stream backlog {stream_length} >= {TARGET_STREAM_MAX_LEN}')
+
+        pipeline = redis_client.pipeline(transaction=True)
+        target_mapping = get_target_mapping(parameters_list)
+        if target_mapping:
+            pipeline.mset(target_mapping)
+            add_history(pipeline, parameters_list)
+            update_target_index(pipeline, parameters_list)
+
+        # フレームごとにストリームへ追加
+        for parameters in parameters_list:
+            pipeline.xadd(TARGET_STREAM_KEY, {'frame': json.dumps(parameters)})
+        pipeline.execute()
+
+    except StreamBacklogError:
+        raise
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+    return response_status
+
+
+def get_target_mapping(parameters_list):
+    """
+    機器ごとの最新の物標情報の登録データを作成
+    同一機器のフレームが複数ある場合は更新時刻が最新のものを登録する
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+
+    Returns
+    -------
+    target_mapping : dict
+        キーごとの登録データ
+    """
+
+    # 機器情報数分の登録データを作成
+    target_mapping = {}
+    target_update_times = {}
+    for parameters in parameters_list:
+        update_time = time_util.parse_epoch_ms(parameters['attribute']['updateTimeInfo'])
 
-        # 機器情報数分だけループして登録
         for deviceIndividual in parameters['attribute']['deviceIndividualInfo']:
             # セットするキーを作成
             target_key = f"r{parameters['attribute']['roadsideUnitID']}s{parameters['attribute']['serviceLocationID']}d{deviceIndividual['deviceID']}"
 
+            # 既により新しいフレームがある場合は登録しない
+            if target_key in target_update_times and target_update_times[target_key] > update_time:
+                continue
+
             # セットする情報を再構築
             target_value = {
                 'attribute': {
@@ -53,13 +241,171 @@ def put_data(parameters, redis_host):
             if 'dataModelType' in parameters:
                 target_value['dataModelType'] = parameters['dataModelType']
 
-            target_value = json.dumps(target_value)
+            target_mapping[target_key] = json.dumps(target_value)
+            target_update_times[target_key] = update_time
 
-            # 物標情報登録
-            redis_client.mset({target_key: target_value})
+    # 圧縮する場合は圧縮前後のサイズと圧縮時間を出力
+    if TARGET_CACHE_COMPRESSION != cache_codec.COMPRESSION_NONE and target_mapping:
+        start_time = time.perf_counter()
+        raw_bytes = sum(len(target_value) for target_value in target_mapping.values())
+        target_mapping = {
+            target_key: cache_codec.compress(target_value, TARGET_CACHE_COMPRESSION, TARGET_CACHE_COMPRESS_MIN_BYTES)
+            for target_key, target_value in target_mapping.items()
+        }
+        stored_bytes = sum(len(target_value) for target_value in target_mapping.values())
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logger.info(f'cache compression:{TARGET_CACHE_COMPRESSION} keys:{len(target_mapping)} rawBytes:{raw_bytes} storedBytes:{stored_bytes} latency:{elapsed_ms:.1f}ms')
 
-    except Exception:
-        logger.error('other error')
-        raise
+    return target_mapping
 
-    return response_status
+
+def add_history(pipeline, parameters_list):
+    """
+    機器ごとのフレームを履歴に追加し、保持期間を過ぎたフレームを削除
+    parameters
+    ----------
+    pipeline :
+        ElastiCacheのパイプライン
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    """
+
+    if TARGET_HISTORY_SECONDS <= 0:
+        return
+
+    history_ms = TARGET_HISTORY_SECONDS * 1000
+    since_times = {}
+    for parameters in parameters_list:
+        attribute = parameters['attribute']
+        location_key = f"r{attribute['roadsideUnitID']}s{attribute['serviceLocationID']}"
+
+        for deviceIndividual in attribute['deviceIndividualInfo']:
+            if not deviceIndividual.get('targetIndividualInfo'):
+                continue
+
+            # 物標の時刻の範囲(取得時に検索範囲との重なりを判定する)
+            epoch_times = [time_util.parse_epoch_ms(target['time']) for target in deviceIndividual['targetIndividualInfo']]
+            min_time = min(epoch_times)
+            history_value = {
+                'roadsideUnitID': attribute['roadsideUnitID'],
+                'serviceLocationID': attribute['serviceLocationID'],
+                'updateTimeInfo': attribute['updateTimeInfo'],
+                'formatVersion': attribute['formatVersion'],
+                'deviceID': deviceIndividual['deviceID'],
+                'time_utc': time_util.format_utc(min_time),
+                'time_utc_max': time_util.format_utc(max(epoch_times)),
+                'targetIndividualInfo': deviceIndividual['targetIndividualInfo'],
+            }
+            if 'dataModelType' in parameters:
+                history_value['dataModelType'] = parameters['dataModelType']
+
+            history_key = f"{HISTORY_KEY_PREFIX}{location_key}d{deviceIndividual['deviceID']}"
+            history_member = cache_codec.compress(json.dumps(history_value), TARGET_CACHE_COMPRESSION, TARGET_CACHE_COMPRESS_MIN_BYTES)
+            pipeline.zadd(history_key, {history_member: min_time})
+            pipeline.zremrangebyscore(history_key, '-inf', f'({min_time - history_ms}')
+            pipeline.pexpire(history_key, history_ms * 2)
+
+            since_times[location_key] = min(since_times.get(location_key, min_time), min_time)
+
+    # 格納開始時刻は既に格納中の場合は更新しない(一定期間登録がない場合は期限切れとなり再設定される)
+    for location_key, since_time in since_times.items():
+        since_key = f'{HISTORY_SINCE_KEY_PREFIX}{location_key}'
+        pipeline.set(since_key, since_time, nx=True)
+        pipeline.pexpire(since_key, history_ms * 2)
+
+
+def update_target_index(pipeline, parameters_list):
+    """
+    路側機・サービス地点ごとに物標IDから最新の物標情報へのハッシュと、物標IDごとの最新の位置(GEO)を更新
+    parameters
+    ----------
+    pipeline :
+        ElastiCacheのパイプライン
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    """
+
+    if TARGET_INDEX_SECONDS <= 0:
+        return
+
+    # 路側機・サービス地点ごとに(物標ID, 時刻, 物標情報)をまとめる
+    index_args = {}
+    for parameters in parameters_list:
+        attribute = parameters['attribute']
+        location_key = f"r{attribute['roadsideUnitID']}s{attribute['serviceLocationID']}"
+
+        for deviceIndividual in attribute['deviceIndividualInfo']:
+            for target in deviceIndividual.get('targetIndividualInfo', []):
+                target_value = {
+                    'deviceID': deviceIndividual['deviceID'],
+                    'updateTimeInfo': attribute['updateTimeInfo'],
+                    'formatVersion': attribute['formatVersion'],
+                    'targetIndividualInfo': target,
+                }
+                if 'dataModelType' in parameters:
+                    target_value['dataModelType'] = parameters['dataModelType']
+
+                # 位置が不明、またはGEOの範囲外の場合はGEOから削除する
+                longitude, latitude = '', ''
+                if is_geo_position(target):
+                    longitude, latitude = f"{target['longitude'] / 10000000:.7f}", f"{target['latitude'] / 10000000:.7f}"
+
+                index_args.setdefault(location_key, []).extend([
+                    target['targetID'],
+                    time_util.parse_epoch_ms(target['time']),
+                    json.dumps(target_value, separators=(',', ':')),
+                    longitude,
+                    latitude,
+                ])
+
+    for location_key, args in index_args.items():
+        keys = [f'{TARGET_INDEX_KEY_PREFIX}{location_key}', f'{TARGET_INDEX_SEEN_KEY_PREFIX}{location_key}', f'{TARGET_GEO_KEY_PREFIX}{location_key}']
+        pipeline.eval(TARGET_INDEX_SCRIPT, len(keys), *keys, TARGET_INDEX_SECONDS * 1000, *args)
+
+
+def is_geo_position(target):
+    """
+    物標の位置をGEOに登録できるか判定
+    parameters
+    ----------
+    target : dict
+        物標情報
+
+    Returns
+    -------
+    is_geo_position : bool
+        登録できる場合True
+    """
+
+    latitude = target.get('latitude')
+    longitude = target.get('longitude')
+    if latitude is None or longitude is None:
+        return False
+
+    return geohash.is_valid(latitude, longitude) and abs(latitude) <= GEO_MAX_LATITUDE
+
+
+def get_redis_client(redis_host):
+    """
+    ElastiCache接続を取得
+    同一ホストへの接続はコンテナ内で再利用する
+    Parameters
+    ----------
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    redis_client :
+        接続したElastiCache
+    """
+
+    if redis_host not in redis_clients:
+        redis_clients[redis_host] = redis.StrictRedis(
+            host=redis_host,
+            port='6379',
+            decode_responses=True,
+            db=0
+        )
+
+    return redis_clients[redis_host]
@@ -0,0 +1,174 @@
+import logging
+
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# geohashの文字(base32)
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 緯度・経度の範囲(物標情報と同じ1/10^7度単位)
+LATITUDE_RANGE = (-900000000, 900000000)
+LONGITUDE_RANGE = (-1800000000, 1800000000)
+
+# 範囲検索で対象とするセル数の上限
+MAX_BOX_CELLS = 1024
+
+
+def is_valid(latitude, longitude):
+    """
+    緯度・経度が有効な範囲か判定(範囲外は不明値として扱う)
+    Parameters
+    ----------
+    latitude : int
+        緯度(1/10^7度)
+    longitude : int
+        経度(1/10^7度)
+
+    Returns
+    -------
+    is_valid : bool
+        有効な場合True
+    """
+
+    return LATITUDE_RANGE[0] <= latitude <= LATITUDE_RANGE[1] and LONGITUDE_RANGE[0] <= longitude <= LONGITUDE_RANGE[1]
+
+
+def get_bit_counts(precision):
+    """
+    geohashの桁数から緯度・経度それぞれのビット数を取得
+    Parameters
+    ----------
+    precision : int
+        geohashの桁数
+
+    Returns
+    -------
+    latitude_bits : int
+        緯度のビット数
+    longitude_bits : int
+        経度のビット数
+    """
+
+    bit_count = precision * 5
+
+    return bit_count // 2, (bit_count + 1) // 2
+
+
+def get_cell_index(latitude, longitude, precision):
+    """
+    緯度・経度を含むセルの格子上の位置を取得
+    Parameters
+    ----------
+    latitude : int
+        緯度(1/10^7度)
+    longitude : int
+        経度(1/10^7度)
+    precision : int
+        geohashの桁数
+
+    Returns
+    -------
+    latitude_index : int
+        緯度方向の位置
+    longitude_index : int
+        経度方向の位置
+    """
+
+    latitude_bits, longitude_bits = get_bit_counts(precision)
+
+    # 範囲の上端(北緯90度・東経180度)は最後のセルに含める
+    latitude_index = min((latitude - LATITUDE_RANGE[0]) * (1 << latitude_bits) // (LATITUDE_RANGE[1] - LATITUDE_RANGE[0]), (1 << latitude_bits) - 1)
+    longitude_index = min((longitude - LONGITUDE_RANGE[0]) * (1 << longitude_bits) // (LONGITUDE_RANGE[1] - LONGITUDE_RANGE[0]), (1 << longitude_bits) - 1)
+
+    return latitude_index, longitude_index
+
+
+def encode_cell(latitude_index, longitude_index, precision):
+    """
+    セルの格子上の位置をgeohashに変換(経度・緯度の順にビットを交互に並べる)
+    Parameters
+    ----------
+    latitude_index : int
+        緯度方向の位置
+    longitude_index : int
+        経度方向の位置
+    precision : int
+        geohashの桁数
+
+    Returns
+    -------
+    cell : str
+        geohash
+    """
+
+    latitude_bits, longitude_bits = get_bit_counts(precision)
+
+    bits = 0
+    for bit_index in range(precision * 5):
+        if bit_index % 2 == 0:
+            longitude_bits -= 1
+            bits = bits << 1 | longitude_index >> longitude_bits & 1
+        else:
+            latitude_bits -= 1
+            bits = bits << 1 | latitude_index >> latitude_bits & 1
+
+    return ''.join(BASE32[bits >> (5 * (precision - 1 - char_index)) & 31] for char_index in range(precision))
+
+
+def encode(latitude, longitude, precision):
+    """
+    緯度・経度をgeohashに変換
+    Parameters
+    ----------
+    latitude : int
+        緯度(1/10^7度)
+    longitude : int
+        経度(1/10^7度)
+    precision : int
+        geohashの桁数
+
+    Returns
+    -------
+    cell : str
+        geohash
+    """
+
+    return encode_cell(*get_cell_index(latitude, longitude, precision), precision)
+
+
+def get_box_cells(min_latitude, min_longitude, max_latitude, max_longitude, precision):
+    """
+    矩形範囲と重なるセルのgeohashを取得(範囲検索で参照するセルの算出に使用)
+    Parameters
+    ----------
+    min_latitude : int
+        南端の緯度(1/10^7度)
+    min_longitude : int
+        西端の経度(1/10^7度)
+    max_latitude : int
+        北端の緯度(1/10^7度)
+    max_longitude : int
+        東端の経度(1/10^7度)
+    precision : int
+        geohashの桁数
+
+    Returns
+    -------
+    cells : list
+        geohash
+    """
+
+    min_latitude_index, min_longitude_index = get_cell_index(min_latitude, min_longitude, precision)
+    max_latitude_index, max_longitude_index = get_cell_index(max_latitude, max_longitude, precision)
+
+    cell_count = (max_latitude_index - min_latitude_index + 1) * (max_longitude_index - min_longitude_index + 1)
+    if cell_count > MAX_BOX_CELLS:
+        raise ValueError(f'too many cells: {cell_count}')
+
+    return [
+        encode_cell(latitude_index, longitude_index, precision)
+        for latitude_index in range(min_latitude_index, max_latitude_index + 1)
+        for longitude_index in range(min_longitude_index, max_longitude_index + 1)
+    ]
@@ -1,33 +1,194 @@
-import json
 import logging
 
+import validator
 from log import logger
 
 # ログレベル設定
 logger.setLevel(logging.INFO)
 
+# 物標個別情報のinteger項目の範囲(データフォーマット仕様書「物標情報」)
+TARGET_INTEGER_RANGES = {
+    'commonServiceStandardID': (0, 7),
+    'targetMessageID': (0, 3),
+    'targetIndividualVersionInfo': (0, 7),
+    'targetID': (0, 4294967295),
+    'targetIndividualIncrementCounter': (0, 255),
+    'dataLength': (0, 255),
+    'individualOptionFlag': (0, 255),
+    'latitude': (-2147483648, 900000000),
+    'longitude': (-2147483648, 1800000000),
+    'elevation': (-4095, 61440),
+    'positionConf': (0, 15),
+    'elevationConf': (0, 15),
+    'speed': (0, 65535),
+    'heading': (0, 65535),
+    'acceleration': (-32768, 2000),
+    'speedConf': (0, 7),
+    'headingConf': (0, 7),
+    'forwardRearAccelerationConf': (0, 7),
+    'transmissionState': (0, 7),
+    'steeringWheelAngle': (-2048, 2047),
+    'sizeClassification': (0, 15),
+    'roleClassification': (0, 15),
+    'vehicleWidth': (1, 1023),
+    'vehicleLength': (1, 16383),
+    'positionDelay': (1, 31),
+    'revisionCounter': (1, 31),
+    'roadFacilities': (0, 7),
+    'roadClassification': (0, 7),
+    'semiMajorAxisOfPositionalErrorEllipse': (0, 255),
+    'semiMinorAxisOfPositionalErrorEllipse': (0, 255),
+    'semiMajorAxisOrientationOfPositionalErrorEllipse': (0, 65535),
+    'GPSPositioningMode': (0, 3),
+    'GPSPDOP': (0, 63),
+    'numberOfGPSSatellitesInUse': (0, 15),
+    'GPSMultiPathDetection': (0, 3),
+    'yawRate': (-32768, 32767),
+    'brakeAppliedStatus': (0, 63),
+    'auxiliaryBrakeAppliedStatus': (0, 3),
+    'throttlePosition': (0, 255),
+    'exteriorLights': (0, 255),
+    'adaptiveCruiseControlStatus': (0, 3),
+    'cooperativeAdaptiveCruiseControlStatus': (0, 3),
+    'preCrashSafetyStatus': (0, 3),
+    'antilockBrakeStatus': (0, 3),
+    'tractionControlStatus': (0, 3),
+    'electronicStabilityControlStatus': (0, 3),
+    'laneKeepingAssistStatus': (0, 3),
+    'laneDepartureWarningStatus': (0, 3),
+    'intersectionDistanceInformationAvailability': (0, 7),
+    'intersectionDistance': (0, 1023),
+    'intersectionPositionInformationAvailability': (0, 7),
+    'intersectionLatitude': (-2147483648, 900000000),
+    'intersectionLongitude': (-2147483648, 1800000000),
+    'extendedInformation': (0, 255),
+    'restingState': (0, 3602),
+    'existingTime': (0, 36001),
+}
 
-def get_body(body):
+# 物標情報のスキーマ
+# 物標個別情報は登録・集計に用いる物標ID・時刻のみ必須とし、その他の項目は存在する場合に型・範囲を検証する
+TARGET_INFO_SCHEMA = {
+    'type': 'object',
+    'required': ['attribute'],
+    'properties': {
+        'dataModelType': {'type': 'string'},
+        'attribute': {
+            'type': 'object',
+            'required': ['roadsideUnitID', 'serviceLocationID', 'updateTimeInfo', 'formatVersion', 'deviceIndividualInfo'],
+            'properties': {
+                'serviceLocationID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'roadsideUnitID': {'type': 'integer', 'minimum': 0, 'maximum': 4294967295},
+                'updateTimeInfo': {'type': 'string', 'format': 'date-time'},
+                'formatVersion': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                'deviceNum': {'type': 'integer', 'minimum': 0, 'maximum': 16},
+                'deviceIndividualInfo': {
+                    'type': 'array',
+                    'maxItems': 16,
+                    'items': {
+                        'type': 'object',
+                        'required': ['deviceID'],
+                        'properties': {
+                            'deviceID': {'type': 'integer', 'minimum': 0, 'maximum': 16777215},
+                            'targetNum': {'type': 'integer', 'minimum': 0, 'maximum': 65535},
+                            'targetIndividualInfo': {
+                                'type': 'array',
+                                'items': {
+                                    'type': 'object',
+                                    'required': ['targetID', 'time'],
+                                    'properties': {
+                                        **{
+                                            key: {'type': 'integer', 'minimum': minimum, 'maximum': maximum}
+                                            for key, (minimum, maximum) in TARGET_INTEGER_RANGES.items()
+                                        },
+                                        'leapSecondCorrectionInfo': {'type': 'boolean'},
+                                        'time': {'type': 'string', 'format': 'date-time'},
+                                        'deadReckoningAvailability': {'type': 'boolean'},
+                                        'mapMatchingAvailability': {'type': 'boolean'},
+                                        'targetIndividualExtendedData': {'type': 'string', 'maxLength': 1000},
+                                    },
+                                },
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+# 検証・型変換関数(インポート時に1回だけ生成)
+validate_target_info = validator.compile_schema(TARGET_INFO_SCHEMA)
+
+
+def get_body(body_data):
     """
     body 要素取得
+    Parameters
+    ----------
+    body_data : dict
+        読み込んだbody
 
     Returns
     -------
     parameters  : Array
         グループ名
     """
-    body_data = json.loads(body)
 
+    return get_parameters(body_data)
+
+
+def get_bodies(body_data_list):
+    """
+    body 要素取得(複数フレーム対応)
+    単一のオブジェクト、配列、連結された複数の値(NDJSON等)のいずれも受け付ける
+    Parameters
+    ----------
+    body_data_list : list
+        読み込んだbodyの値
+
+    Returns
+    -------
+    parameters_list : list
+        フレームごとのパラメータ
+    """
+    parameters_list = []
+
+    for body_data in body_data_list:
+        # 配列の場合は要素ごとに1フレームとする
+        if isinstance(body_data, list):
+            parameters_list.extend(get_parameters(frame) for frame in body_data)
+        else:
+            parameters_list.append(get_parameters(body_data))
+
+    return parameters_list
+
+
+def get_parameters(body_data):
+    """
+    1フレーム分のパラメータ取得
+    スキーマで検証・型変換し、仕様に合致しない場合はValidationErrorとする
+    Parameters
+    ----------
+    body_data : dict
+        1フレーム分のbody
+
+    Returns
+    -------
+    parameters  : Array
+        グループ名
+    """
+    body_data = validate_target_info(body_data)
     parameters = {}
 
     # パラメータを代入
     if 'dataModelType' in body_data:
-        parameters['dataModelType'] = str(body_data['dataModelType'])
+        parameters['dataModelType'] = body_data['dataModelType']
     parameters['attribute'] = {}
-    parameters['attribute']['roadsideUnitID'] = int(body_data['attribute']['roadsideUnitID'])
-    parameters['attribute']['serviceLocationID'] = int(body_data['attribute']['serviceLocationID'])
-    parameters['attribute']['updateTimeInfo'] = str(body_data['attribute']['updateTimeInfo'])
-    parameters['attribute']['formatVersion'] = int(body_data['attribute']['formatVersion'])
+    parameters['attribute']['roadsideUnitID'] = body_data['attribute']['roadsideUnitID']
+    parameters['attribute']['serviceLocationID'] = body_data['attribute']['serviceLocationID']
+    parameters['attribute']['updateTimeInfo'] = body_data['attribute']['updateTimeInfo']
+    parameters['attribute']['formatVersion'] = body_data['attribute']['formatVersion']
     parameters['attribute']['deviceIndividualInfo'] = body_data['attribute']['deviceIndividualInfo']
 
     return parameters
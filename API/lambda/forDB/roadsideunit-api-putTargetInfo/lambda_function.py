@@ -1,11 +1,17 @@
-import json
 import logging
 import os
+import time
 import traceback
 
-import dynamodb_execute
+import aggregate_execute
+import dual_write_execute
 import elasticache_execute
 import get_parameter
+import idempotency
+import rate_limit
+import request_body
+import tier_execute
+import validator
 from log import logger
 
 # ログレベル設定
@@ -13,6 +19,13 @@ logger.setLevel(logging.INFO)
 
 # 環境変数取得
 REDIS_HOST = os.environ['REDIS_HOST']
+TARGET_INFO_WRITE_MODE = os.environ.get('TARGET_INFO_WRITE_MODE', 'sync')
+
+# DynamoDBへの登録方式
+# sync         : リクエスト内でElastiCacheとDynamoDBに登録
+# write_behind : ElastiCacheとストリームに登録し、DynamoDBへはdrain_functionが非同期に登録
+WRITE_MODE_SYNC = 'sync'
+WRITE_MODE_WRITE_BEHIND = 'write_behind'
 
 
 def lambda_handler(event, context):
@@ -36,28 +49,98 @@ def lambda_handler(event, context):
     }
 
     try:
-        # curlの場合
-        if type(event['body']) is dict:
-            request['body'] = json.dumps(event['body'], default=str)
-        # Postmanから実行の場合
-        else:
-            request['body'] = \
-                event['body'].replace('\\n', '').replace('\\r', '')
-
         headers = dict()
         for k, v in event['headers'].items():
             headers[k.lower()] = v
         if 'x-tracking' in headers:
             logger.info(headers['x-tracking'])
 
-        # パラメータ取得
-        parameters = get_parameter.get_body(request['body'])
+        # Content-Typeに応じてbodyを読み込む(JSON・MessagePack・CBOR)
+        body_format = request_body.get_format(headers)
+        content_encoding = request_body.get_encoding(headers)
+        if body_format is None or content_encoding is None:
+            response['statusCode'] = 415
+            return response
+        # Content-Encoding(gzip・deflate)が指定された場合は上限サイズまで展開して読み込む
+        try:
+            request['body'] = request_body.load_all(event, body_format, content_encoding)
+        except request_body.BodyTooLargeError as e:
+            response['statusCode'] = 413
+            response['body'] = str(e)
+            return response
+        except request_body.BinaryContentTypeError as e:
+            response['statusCode'] = 415
+            response['body'] = str(e)
+            return response
+        except request_body.ContentEncodingError as e:
+            response['statusCode'] = 400
+            response['body'] = str(e)
+            logger.error(f'content encoding error {e}')
+            return response
+
+        # パラメータ取得(JSON配列・NDJSONの場合は複数フレーム)
+        # データフォーマット仕様に合致しないフレームを含む場合はElastiCache・DynamoDBに登録しない
+        start_time = time.perf_counter()
+        try:
+            parameters_list = get_parameter.get_bodies(request['body'])
+        except validator.ValidationError as e:
+            response['statusCode'] = 400
+            response['body'] = str(e)
+            logger.error(f'validation error {e}')
+            return response
+        logger.info(f'frames:{len(parameters_list)} validation latency:{(time.perf_counter() - start_time) * 1000:.1f}ms')
+
+        # 登録API・路側機ごとの流量制限(超過した場合は登録せず再送を待たせる)
+        try:
+            is_allowed, retry_after = rate_limit.acquire(rate_limit.get_costs(parameters_list), REDIS_HOST, 'putTargetInfo')
+        except rate_limit.CostTooLargeError as e:
+            response['statusCode'] = 413
+            response['body'] = str(e)
+            return response
+        if not is_allowed:
+            response['statusCode'] = 429
+            response['headers'] = {'Retry-After': str(retry_after)}
+            return response
+
+        # 処理済みのフレームを除外(リトライによる重複登録を防止)
+        parameters_list, claimed_keys, is_conflict = idempotency.claim(parameters_list, REDIS_HOST)
+        if is_conflict:
+            response['statusCode'] = 409
+            return response
+
+        res = 201
+        if parameters_list:
+            try:
+                if TARGET_INFO_WRITE_MODE == WRITE_MODE_WRITE_BEHIND:
+                    # 物標情報をElastiCacheとストリームに登録
+                    res = elasticache_execute.put_data_list_write_behind(parameters_list, REDIS_HOST)
+                else:
+                    # 物標情報をElastiCacheとDynamoDBに並列登録
+                    res = dual_write_execute.put_data_list(parameters_list, REDIS_HOST)
+            except elasticache_execute.StreamBacklogError as e:
+                # DynamoDBへの登録が遅延している場合は登録せず再送を待たせる
+                idempotency.release(claimed_keys, REDIS_HOST)
+                logger.warning(str(e))
+                response['statusCode'] = 503
+                response['headers'] = {'Retry-After': str(elasticache_execute.TARGET_STREAM_RETRY_AFTER_SECONDS)}
+                return response
+            except Exception:
+                idempotency.release(claimed_keys, REDIS_HOST)
+                raise
+
+            # 機器・分単位の集計値に加算(失敗しても登録結果には影響させない)
+            try:
+                aggregate_execute.put_data_list(parameters_list, REDIS_HOST)
+            except Exception:
+                logger.error(traceback.format_exc())
 
-        # 物標情報をElastiCacheに登録
-        res = elasticache_execute.put_data(parameters, REDIS_HOST)
+            # 機器・間隔ごとの間引き値を更新(失敗しても登録結果には影響させない)
+            try:
+                tier_execute.put_data_list(parameters_list, REDIS_HOST)
+            except Exception:
+                logger.error(traceback.format_exc())
 
-        # 物標情報をDynamoDBに登録
-        res = dynamodb_execute.put_data(parameters)
+            idempotency.complete(claimed_keys, REDIS_HOST)
 
         response['statusCode'] = res
 
@@ -0,0 +1,138 @@
+import logging
+import traceback
+
+import dynamodb_execute
+import time_util
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 1回のScanで取得するアイテム数
+SCAN_LIMIT = 100
+
+# 残り実行時間がこの値を下回ったら中断し、再開用のキーを返す
+REMAINING_TIME_MARGIN_MS = 30000
+
+
+def lambda_handler(event, context):
+    """
+    物標情報テーブルのパーティションキー(time_minutes)を現在のシャード形式に移行
+    中断した場合は返却したexclusiveStartKeyを指定して再実行する
+    Parameters
+    ----------
+    event : dict
+        roadsideUnitID, serviceLocationID, exclusiveStartKey(任意)
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        移行件数と再開用のキー
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        table_name = f"{dynamodb_execute.TARGET_INFO_TABLE_NAME}_{event['roadsideUnitID']}_{event['serviceLocationID']}"
+        t_target_info = dynamodb_execute.dynamoDB.Table(table_name)
+
+        scan_params = {'Limit': SCAN_LIMIT}
+        if event.get('exclusiveStartKey'):
+            scan_params['ExclusiveStartKey'] = event['exclusiveStartKey']
+
+        migrated_count = 0
+        while True:
+            scan_result = t_target_info.scan(**scan_params)
+
+            # 新しいキーで登録し、旧キーのアイテムを削除
+            requests = []
+            for item in scan_result.get('Items', []):
+                # 間引き階層のアイテムは移行対象外
+                if 'tier_seconds' in item:
+                    continue
+                partition_key = get_migrated_partition_key(item)
+                migrated_item = {**item, 'time_minutes': partition_key}
+                # 差分フレームは参照する基準フレームのキーも移行先のキーに更新
+                if 'keyframeKeys' in item:
+                    migrated_item['keyframeKeys'] = get_migrated_keyframe_keys(item)
+                if migrated_item == item:
+                    continue
+                requests.append({'PutRequest': {'Item': migrated_item}})
+                if partition_key != item['time_minutes']:
+                    requests.append({'DeleteRequest': {'Key': {'time_minutes': item['time_minutes'], 'unique_time': item['unique_time']}}})
+                migrated_count += 1
+            dynamodb_execute.batch_write_requests(table_name, requests)
+
+            if 'LastEvaluatedKey' not in scan_result:
+                scan_params.pop('ExclusiveStartKey', None)
+                break
+            scan_params['ExclusiveStartKey'] = scan_result['LastEvaluatedKey']
+
+            # 実行時間が残り少ない場合は中断
+            if context is not None and context.get_remaining_time_in_millis() < REMAINING_TIME_MARGIN_MS:
+                break
+
+        logger.info(f'migrated table:{table_name} items:{migrated_count}')
+        response['body'] = {
+            'migratedCount': migrated_count,
+            'exclusiveStartKey': scan_params.get('ExclusiveStartKey')
+        }
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo migrate_table')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def get_migrated_partition_key(item):
+    """
+    アイテムの移行先パーティションキーを取得
+    Parameters
+    ----------
+    item : dict
+        物標情報アイテム
+
+    Returns
+    -------
+    partition_key : String
+        パーティションキー
+    """
+
+    # unique_timeは「先頭物標の時刻_物標ID」
+    time, target_id = item['unique_time'].rsplit('_', 1)
+
+    return dynamodb_execute.get_partition_key(time, item['time_utc'], item['deviceID'], target_id)
+
+
+def get_migrated_keyframe_keys(item):
+    """
+    差分フレームが参照する基準フレームの移行先キーを取得
+    基準フレームは同じ機器種別IDのアイテムのため、キーのみから移行先を算出できる
+    Parameters
+    ----------
+    item : dict
+        差分フレームのアイテム
+
+    Returns
+    -------
+    keyframe_keys : list
+        移行先の基準フレームのキー
+    """
+
+    keyframe_keys = []
+    for key in item['keyframeKeys']:
+        time, target_id = key['unique_time'].rsplit('_', 1)
+        keyframe_keys.append({
+            'time_minutes': dynamodb_execute.get_partition_key(time, time_util.to_utc(time), item['deviceID'], target_id),
+            'unique_time': key['unique_time'],
+        })
+
+    return keyframe_keys
@@ -0,0 +1,204 @@
+import logging
+import os
+
+import redis
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', '20'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '40'))
+
+# 流量制限のキーを格納するElastiCacheのDB番号(db0:物標情報、db1:死活監視情報、db2:重複判定・流量制限)
+RATE_LIMIT_DB = 2
+
+# 登録API・路側機ごとのトークンバケットのキーのプレフィックス(rl:{API名}:r{路側機ID}s{サービス地点情報ID})
+RATE_LIMIT_KEY_PREFIX = 'rl:'
+
+# 登録API・路側機ごとの許可・制限回数(フィールド {API名}:r{路側機ID}s{サービス地点情報ID}:allowed / :throttled)
+# 全登録APIで1つのハッシュに集計し、putTargetInfoのrate_limit_functionが定期的に実行間隔ごとの回数をログに出力する
+RATE_LIMIT_COUNTER_KEY = 'rl:counters'
+
+# トークンバケット
+# 全バケットにトークンがある場合のみ消費して許可し、不足する場合は補充までの待ち時間(ミリ秒)を返す
+# KEYS : 集計用ハッシュ, バケット...
+# ARGV : 補充レート(個/秒), 上限, (カウンタ名, 消費数)...
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now_time = redis.call('TIME')
+local now = tonumber(now_time[1]) * 1000 + math.floor(tonumber(now_time[2]) / 1000)
+
+local tokens = {}
+local wait_ms = 0
+for i = 2, #KEYS do
+    local bucket = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local current = tonumber(bucket[1]) or burst
+    local ts = tonumber(bucket[2]) or now
+    current = math.min(burst, current + math.max(0, now - ts) * rate / 1000)
+    local cost = tonumber(ARGV[2 + (i - 1) * 2])
+    if current < cost then
+        wait_ms = math.max(wait_ms, math.ceil((cost - current) * 1000 / rate))
+    end
+    tokens[i] = current
+end
+
+local ttl = math.ceil(burst * 1000 / rate) + 1000
+for i = 2, #KEYS do
+    local counter = ARGV[1 + (i - 1) * 2]
+    local cost = tonumber(ARGV[2 + (i - 1) * 2])
+    if wait_ms == 0 then
+        tokens[i] = tokens[i] - cost
+        redis.call('HINCRBY', KEYS[1], counter .. ':allowed', 1)
+    else
+        redis.call('HINCRBY', KEYS[1], counter .. ':throttled', 1)
+    end
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens[i]), 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], ttl)
+end
+
+return wait_ms
+"""
+
+# ElastiCache接続(ウォームスタート時は再利用する)
+redis_clients = {}
+
+
+class CostTooLargeError(ValueError):
+    """
+    1リクエストの消費数がトークンの上限を超える(待っても許可されない)場合のエラー
+    """
+
+
+def acquire(costs, redis_host, api_name):
+    """
+    登録API・路側機ごとのトークンを消費し、登録を許可するか判定
+    ElastiCacheに接続できない場合は制限しない
+    Parameters
+    ----------
+    costs : dict
+        (路側機ID, サービス地点情報ID)ごとの消費数
+    redis_host
+        redis接続用のホスト
+    api_name : str
+        登録API名(登録APIごとにバケットを分ける)
+
+    Returns
+    -------
+    is_allowed : bool
+        登録を許可する場合True
+    retry_after : int
+        制限時の再送までの待ち時間(秒)
+
+    Raises
+    ------
+    CostTooLargeError
+        消費数がトークンの上限を超える場合
+    """
+
+    if not redis_host or not costs:
+        return True, 0
+
+    # 上限を超える消費数は補充を待っても許可されないため、分割して再送させる
+    max_cost = max(costs.values())
+    if max_cost > RATE_LIMIT_BURST:
+        raise CostTooLargeError(f'{max_cost} frames per roadside unit exceeds rate limit burst {RATE_LIMIT_BURST:g}')
+
+    keys = [RATE_LIMIT_COUNTER_KEY]
+    args = [RATE_LIMIT_RATE, RATE_LIMIT_BURST]
+    for (roadside_unit_id, service_location_id), cost in costs.items():
+        counter = f'{api_name}:r{roadside_unit_id}s{service_location_id}'
+        keys.append(f'{RATE_LIMIT_KEY_PREFIX}{counter}')
+        args.extend([counter, cost])
+
+    try:
+        wait_ms = get_redis_client(redis_host).eval(TOKEN_BUCKET_SCRIPT, len(keys), *keys, *args)
+    except redis.RedisError:
+        logger.warning('rate limit skipped')
+        return True, 0
+
+    if wait_ms:
+        retry_after = -(-int(wait_ms) // 1000)
+        logger.warning(f'rate limited {list(costs)} retry_after:{retry_after}')
+        return False, retry_after
+
+    return True, 0
+
+
+def get_costs(parameters_list):
+    """
+    フレームを(路側機ID, サービス地点情報ID)ごとに数える
+    サービス地点情報のように路側機一覧を持つ場合は一覧の路側機ごとに数える
+    Parameters
+    ----------
+    parameters_list : list
+        フレームごとのパラメータ
+
+    Returns
+    -------
+    costs : dict
+        (路側機ID, サービス地点情報ID)ごとのフレーム数
+    """
+
+    costs = {}
+    for parameters in parameters_list:
+        attribute = parameters['attribute']
+        if 'roadsideUnitID' in attribute:
+            roadside_unit_ids = [attribute['roadsideUnitID']]
+        else:
+            roadside_unit_ids = [roadside_unit['roadsideUnitID'] for roadside_unit in attribute.get('roadsideUnitList', [])]
+
+        for roadside_unit_id in roadside_unit_ids:
+            key = (roadside_unit_id, attribute['serviceLocationID'])
+            costs[key] = costs.get(key, 0) + 1
+
+    return costs
+
+
+def get_counters(redis_host):
+    """
+    登録API・路側機ごとの許可・制限回数を取得
+    Parameters
+    ----------
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    counters : dict
+        {API名}:r{路側機ID}s{サービス地点情報ID}ごとの許可回数(allowed)・制限回数(throttled)
+    """
+
+    counters = {}
+    for field, value in get_redis_client(redis_host).hgetall(RATE_LIMIT_COUNTER_KEY).items():
+        counter, result = field.rsplit(':', 1)
+        counters.setdefault(counter, {'allowed': 0, 'throttled': 0})[result] = int(value)
+
+    return counters
+
+
+def get_redis_client(redis_host):
+    """
+    流量制限用のElastiCache接続を取得
+    Parameters
+    ----------
+    redis_host
+        redis接続用のホスト
+
+    Returns
+    -------
+    redis_client :
+        接続したElastiCache
+    """
+
+    if redis_host not in redis_clients:
+        redis_clients[redis_host] = redis.StrictRedis(
+            host=redis_host,
+            port='6379',
+            decode_responses=True,
+            db=RATE_LIMIT_DB
+        )
+
+    return redis_clients[redis_host]
@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import traceback
+
+import rate_limit
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+REDIS_HOST = os.environ['REDIS_HOST']
+
+# 前回実行時の許可・制限回数のキー(実行間隔ごとの回数の算出に使用する)
+RATE_LIMIT_LAST_COUNTER_KEY = 'rl:counters:last'
+
+
+def lambda_handler(event, context):
+    """
+    登録API・路側機ごとの許可・制限回数をログに出力
+    前回実行時からの増分を出力し、制限された登録API・路側機を制限回数の多い順に並べる
+    Parameters
+    ----------
+    event : dict
+        スケジュール実行イベント
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        登録API・路側機ごとの許可・制限回数
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        redis_client = rate_limit.get_redis_client(REDIS_HOST)
+
+        counters = rate_limit.get_counters(REDIS_HOST)
+        last_counters = json.loads(redis_client.get(RATE_LIMIT_LAST_COUNTER_KEY) or '{}')
+        redis_client.set(RATE_LIMIT_LAST_COUNTER_KEY, json.dumps(counters))
+
+        interval_counters = {}
+        for counter, values in counters.items():
+            last_values = last_counters.get(counter, {})
+            # 回数がリセットされている場合は現在の回数を増分とする
+            interval_values = {
+                result: value - last_values.get(result, 0) if value >= last_values.get(result, 0) else value
+                for result, value in values.items()
+            }
+            if any(interval_values.values()):
+                interval_counters[counter] = interval_values
+
+        throttled = sorted(
+            ({'api': counter.rpartition(':')[0], 'roadsideUnit': counter.rpartition(':')[2], **values}
+             for counter, values in interval_counters.items() if values['throttled'] > 0),
+            key=lambda values: values['throttled'],
+            reverse=True
+        )
+
+        response['body'] = {
+            'counters': interval_counters,
+            'throttled': throttled,
+            'totalCounters': counters,
+        }
+        logger.info(json.dumps({'counters': interval_counters, 'throttled': throttled}))
+        if throttled:
+            logger.warning(f"throttled roadside units:{','.join(values['api'] + ':' + values['roadsideUnit'] for values in throttled)}")
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo rate_limit')
+        logger.error(traceback.format_exc())
+
+    return response
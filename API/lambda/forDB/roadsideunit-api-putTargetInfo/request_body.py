@@ -0,0 +1,333 @@
+import binascii
+import io
+import json
+import logging
+import os
+import re
+import zlib
+
+from log import logger
+
+# MessagePack・CBORはLambdaレイヤーに含まれる場合のみ受け付ける
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+REQUEST_BODY_MAX_INFLATED_BYTES = int(os.environ.get('REQUEST_BODY_MAX_INFLATED_BYTES', '16777216'))
+
+# bodyの形式
+BODY_FORMAT_JSON = 'json'
+BODY_FORMAT_MSGPACK = 'msgpack'
+BODY_FORMAT_CBOR = 'cbor'
+
+# Content-Typeごとのbodyの形式(Content-Typeの指定がない場合はJSON)
+# curl(-d)の既定値 application/x-www-form-urlencoded と text/plain は従来どおりJSONとして扱う
+CONTENT_TYPES = {
+    'application/json': BODY_FORMAT_JSON,
+    'application/x-ndjson': BODY_FORMAT_JSON,
+    'application/x-www-form-urlencoded': BODY_FORMAT_JSON,
+    'text/plain': BODY_FORMAT_JSON,
+    'application/msgpack': BODY_FORMAT_MSGPACK,
+    'application/x-msgpack': BODY_FORMAT_MSGPACK,
+    'application/vnd.msgpack': BODY_FORMAT_MSGPACK,
+    'application/cbor': BODY_FORMAT_CBOR,
+    'application/gzip': BODY_FORMAT_JSON,
+    'application/octet-stream': BODY_FORMAT_JSON,
+}
+
+# API Gatewayでバイナリとして受け付けるContent-Type(APIGateway.ymlのBinaryMediaTypes)
+# 圧縮したJSONはapplication/gzip(Content-Encodingの指定がない場合はgzipとして展開)、
+# またはapplication/octet-streamとContent-Encodingを指定して送信する
+CONTENT_TYPE_GZIP = 'application/gzip'
+CONTENT_TYPE_OCTET_STREAM = 'application/octet-stream'
+
+# bodyの圧縮形式
+CONTENT_ENCODING_IDENTITY = 'identity'
+CONTENT_ENCODING_GZIP = 'gzip'
+CONTENT_ENCODING_DEFLATE = 'deflate'
+
+# Content-Encodingごとのbodyの圧縮形式(Content-Encodingの指定がない場合は非圧縮)
+CONTENT_ENCODINGS = {
+    'identity': CONTENT_ENCODING_IDENTITY,
+    'gzip': CONTENT_ENCODING_GZIP,
+    'x-gzip': CONTENT_ENCODING_GZIP,
+    'deflate': CONTENT_ENCODING_DEFLATE,
+}
+
+# 展開時に1回で取り出す最大バイト数(上限の判定単位)
+INFLATE_CHUNK_BYTES = 65536
+
+# JSON値の区切りとなる空白・改行
+WHITESPACE = re.compile(r'\s*')
+
+
+class BodyTooLargeError(ValueError):
+    """
+    展開後のbodyが上限サイズを超える場合のエラー
+    """
+
+
+class ContentEncodingError(ValueError):
+    """
+    圧縮されたbodyを展開できない場合のエラー
+    """
+
+
+class BinaryContentTypeError(ValueError):
+    """
+    圧縮されたbodyがバイナリとして受け付けるContent-Type以外で送信された場合のエラー
+    (API Gatewayがbodyを文字列として扱うため、展開できない形に変換されている)
+    """
+
+
+def get_format(headers):
+    """
+    Content-Typeからbodyの形式を判定
+    Parameters
+    ----------
+    headers : dict
+        ヘッダー(キーは小文字)
+
+    Returns
+    -------
+    body_format : str
+        bodyの形式(対応していない場合はNone)
+    """
+
+    content_type = headers.get('content-type')
+    if not content_type:
+        return BODY_FORMAT_JSON
+
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    if media_type.endswith('+json'):
+        return BODY_FORMAT_JSON
+
+    body_format = CONTENT_TYPES.get(media_type)
+    if body_format == BODY_FORMAT_MSGPACK and msgpack is None:
+        return None
+    if body_format == BODY_FORMAT_CBOR and cbor2 is None:
+        return None
+
+    return body_format
+
+
+def get_encoding(headers):
+    """
+    Content-Encoding(指定がない場合はContent-Type)からbodyの圧縮形式を判定
+    Parameters
+    ----------
+    headers : dict
+        ヘッダー(キーは小文字)
+
+    Returns
+    -------
+    content_encoding : str
+        bodyの圧縮形式(対応していない場合はNone)
+    """
+
+    content_encoding = headers.get('content-encoding')
+    if not content_encoding:
+        media_type = (headers.get('content-type') or '').split(';', 1)[0].strip().lower()
+        return CONTENT_ENCODING_GZIP if media_type == CONTENT_TYPE_GZIP else CONTENT_ENCODING_IDENTITY
+
+    # 多重に圧縮されたbodyは受け付けない
+    encodings = [encoding.strip().lower() for encoding in content_encoding.split(',') if encoding.strip()]
+    if len(encodings) != 1:
+        return None
+
+    return CONTENT_ENCODINGS.get(encodings[0])
+
+
+def load(event, body_format, content_encoding=CONTENT_ENCODING_IDENTITY):
+    """
+    bodyを1件のデータとして読み込む
+    Parameters
+    ----------
+    event : dict
+        イベント
+    body_format : str
+        bodyの形式
+    content_encoding : str
+        bodyの圧縮形式
+
+    Returns
+    -------
+    body_data : dict
+        読み込んだbody
+    """
+
+    body = get_raw_body(event, content_encoding)
+
+    # curlの場合は読み込み済み
+    if isinstance(body, dict):
+        return body
+
+    if body_format == BODY_FORMAT_MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    if body_format == BODY_FORMAT_CBOR:
+        return cbor2.loads(body)
+
+    return json.loads(body)
+
+
+def load_all(event, body_format, content_encoding=CONTENT_ENCODING_IDENTITY):
+    """
+    bodyを複数件のデータとして読み込む
+    JSONは単一の値・NDJSON(改行区切り)、MessagePack・CBORは連結された値を先頭から順に読み込む
+    Parameters
+    ----------
+    event : dict
+        イベント
+    body_format : str
+        bodyの形式
+    content_encoding : str
+        bodyの圧縮形式
+
+    Returns
+    -------
+    body_data_list : list
+        読み込んだ値
+    """
+
+    body = get_raw_body(event, content_encoding)
+
+    # curlの場合は読み込み済み
+    if isinstance(body, (dict, list)):
+        return [body]
+
+    if body_format == BODY_FORMAT_MSGPACK:
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(body)
+        return list(unpacker)
+
+    if body_format == BODY_FORMAT_CBOR:
+        stream = io.BytesIO(body)
+        decoder = cbor2.CBORDecoder(stream)
+        body_data_list = []
+        while stream.tell() < len(body):
+            body_data_list.append(decoder.decode())
+        return body_data_list
+
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+
+    # JSON値を先頭から順に取り出す
+    decoder = json.JSONDecoder()
+    body_data_list = []
+    index = WHITESPACE.match(body, 0).end()
+    while index < len(body):
+        body_data, index = decoder.raw_decode(body, index)
+        index = WHITESPACE.match(body, index).end()
+        body_data_list.append(body_data)
+
+    return body_data_list
+
+
+def get_raw_body(event, content_encoding=CONTENT_ENCODING_IDENTITY):
+    """
+    イベントからbodyを取り出す
+    API Gatewayでbase64エンコードされている場合はbytesに復号し、圧縮されている場合は展開する
+    Parameters
+    ----------
+    event : dict
+        イベント
+    content_encoding : str
+        bodyの圧縮形式
+
+    Returns
+    -------
+    body : str or bytes or dict
+        body
+    """
+
+    body = event['body']
+
+    # 圧縮されたbodyはBinaryMediaTypesのContent-Typeで送信された場合のみbase64エンコードされたまま渡される
+    if content_encoding != CONTENT_ENCODING_IDENTITY and not event.get('isBase64Encoded') and isinstance(body, str):
+        raise BinaryContentTypeError(f'compressed body requires Content-Type {CONTENT_TYPE_GZIP} or {CONTENT_TYPE_OCTET_STREAM}')
+
+    if event.get('isBase64Encoded'):
+        # ASCII文字列のまま復号する(base64.b64decodeのようにbytesへの変換を挟まない)
+        body = binascii.a2b_base64(body)
+
+    # Postmanから実行の場合(エスケープされた改行を含む場合のみ除去し、それ以外はコピーしない)
+    elif isinstance(body, str) and '\\' in body and content_encoding == CONTENT_ENCODING_IDENTITY:
+        body = body.replace('\\n', '').replace('\\r', '')
+
+    if content_encoding != CONTENT_ENCODING_IDENTITY and isinstance(body, (str, bytes)):
+        body = inflate(body, content_encoding)
+
+    return body
+
+
+def inflate(body, content_encoding):
+    """
+    圧縮されたbodyを上限サイズまで順に展開
+    展開後のサイズが上限を超えた時点で展開を中止する(展開前のサイズに比べて極端に大きいbodyを受け付けない)
+    Parameters
+    ----------
+    body : str or bytes
+        圧縮されたbody
+    content_encoding : str
+        bodyの圧縮形式(gzip・deflate)
+
+    Returns
+    -------
+    body : bytes
+        展開したbody
+    """
+
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+
+    # gzip、deflateはzlib形式(RFC1950)を基本とし、ヘッダーがない場合は生のdeflate形式(RFC1951)として展開
+    if content_encoding == CONTENT_ENCODING_GZIP:
+        wbits = 16 + zlib.MAX_WBITS
+    elif len(body) >= 2 and body[0] & 0x0f == 8 and (body[0] << 8 | body[1]) % 31 == 0:
+        wbits = zlib.MAX_WBITS
+    else:
+        wbits = -zlib.MAX_WBITS
+
+    decompressor = zlib.decompressobj(wbits)
+    chunks = []
+    inflated_bytes = 0
+    data = body
+    try:
+        while True:
+            chunk = decompressor.decompress(data, INFLATE_CHUNK_BYTES)
+            inflated_bytes += len(chunk)
+            if inflated_bytes > REQUEST_BODY_MAX_INFLATED_BYTES:
+                logger.error(f'inflated body too large content-encoding:{content_encoding} bytes:{len(body)}')
+                raise BodyTooLargeError(f'body: inflated size exceeds {REQUEST_BODY_MAX_INFLATED_BYTES} bytes')
+            chunks.append(chunk)
+            data = decompressor.unconsumed_tail
+
+            if decompressor.eof:
+                # gzipは連結された複数のメンバーを順に展開
+                if content_encoding == CONTENT_ENCODING_GZIP and decompressor.unused_data:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits)
+                    continue
+                break
+
+            # 入力を使い切り、出力も残っていない場合は終了
+            if not data and len(chunk) < INFLATE_CHUNK_BYTES:
+                break
+    except zlib.error as e:
+        raise ContentEncodingError(f'body: invalid {content_encoding} data') from e
+
+    if not decompressor.eof:
+        raise ContentEncodingError(f'body: truncated {content_encoding} data')
+
+    logger.info(f'content-encoding:{content_encoding} bytes:{len(body)} inflatedBytes:{inflated_bytes}')
+
+    return b''.join(chunks)
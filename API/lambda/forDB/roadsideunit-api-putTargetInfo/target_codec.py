@@ -0,0 +1,510 @@
+import ast
+import json
+import logging
+import os
+import random
+import time
+import zlib
+
+from boto3.dynamodb.types import Binary
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+BATCH_GET_BASE_DELAY = float(os.environ.get('BATCH_GET_BASE_DELAY', '0.05'))
+BATCH_GET_MAX_DELAY = float(os.environ.get('BATCH_GET_MAX_DELAY', '2.0'))
+
+# 物標情報の格納形式バージョン
+# 0 : Pythonのrepr文字列(従来形式、String属性)
+# 1 : 列指向JSONをzlib圧縮したバイナリ(Binary属性)
+# 2 : 項目名を項目辞書のタグに置き換え、項目を持つ物標のみ値を格納した列指向JSONをzlib圧縮したバイナリ(Binary属性)
+ENCODING_VERSION_REPR = 0
+ENCODING_VERSION_COLUMNAR = 1
+ENCODING_VERSION_DICTIONARY = 2
+
+# 項目辞書(スキーマバージョンごとの物標個別情報の項目名、配列の位置をタグとする)
+# 登録済みのデータを復元できるよう既存のバージョンは変更せず、項目を変更する場合はバージョンを追加する
+# 辞書にない項目はタグに置き換えず項目名のまま格納する
+FIELD_DICTIONARY_VERSION = 1
+FIELD_DICTIONARIES = {
+    1: (
+        'commonServiceStandardID',
+        'targetMessageID',
+        'targetIndividualVersionInfo',
+        'targetID',
+        'targetIndividualIncrementCounter',
+        'dataLength',
+        'individualOptionFlag',
+        'leapSecondCorrectionInfo',
+        'time',
+        'latitude',
+        'longitude',
+        'elevation',
+        'positionConf',
+        'elevationConf',
+        'speed',
+        'heading',
+        'acceleration',
+        'speedConf',
+        'headingConf',
+        'forwardRearAccelerationConf',
+        'transmissionState',
+        'steeringWheelAngle',
+        'sizeClassification',
+        'roleClassification',
+        'vehicleWidth',
+        'vehicleLength',
+        'positionDelay',
+        'revisionCounter',
+        'roadFacilities',
+        'roadClassification',
+        'semiMajorAxisOfPositionalErrorEllipse',
+        'semiMinorAxisOfPositionalErrorEllipse',
+        'semiMajorAxisOrientationOfPositionalErrorEllipse',
+        'GPSPositioningMode',
+        'GPSPDOP',
+        'numberOfGPSSatellitesInUse',
+        'GPSMultiPathDetection',
+        'deadReckoningAvailability',
+        'mapMatchingAvailability',
+        'yawRate',
+        'brakeAppliedStatus',
+        'auxiliaryBrakeAppliedStatus',
+        'throttlePosition',
+        'exteriorLights',
+        'adaptiveCruiseControlStatus',
+        'cooperativeAdaptiveCruiseControlStatus',
+        'preCrashSafetyStatus',
+        'antilockBrakeStatus',
+        'tractionControlStatus',
+        'electronicStabilityControlStatus',
+        'laneKeepingAssistStatus',
+        'laneDepartureWarningStatus',
+        'intersectionDistanceInformationAvailability',
+        'intersectionDistance',
+        'intersectionPositionInformationAvailability',
+        'intersectionLatitude',
+        'intersectionLongitude',
+        'extendedInformation',
+        'targetIndividualExtendedData',
+        'restingState',
+        'existingTime',
+    ),
+}
+FIELD_TAGS = {version: {name: tag for tag, name in enumerate(names)} for version, names in FIELD_DICTIONARIES.items()}
+
+# zlib圧縮レベル
+COMPRESS_LEVEL = 6
+
+# 物標情報の格納モード
+# full  : 全フレームの全項目を格納
+# delta : 基準フレームのみ全項目を格納し、以降は基準フレームとの差分を格納
+STORAGE_MODE_FULL = 'full'
+STORAGE_MODE_DELTA = 'delta'
+
+# フレーム種別(targetInfoFrameType属性)
+FRAME_TYPE_KEYFRAME = 'K'
+FRAME_TYPE_DELTA = 'D'
+
+# 差分で削除された項目名を格納するキー
+REMOVED_KEYS = '_removedKeys'
+
+# 差分で必ず格納する項目(ソートキーの生成に使用)
+DELTA_REQUIRED_KEYS = ('targetID', 'time')
+
+# batch_get_itemの1リクエストあたりの最大キー数
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_RETRY = 8
+
+
+def encode(target_individual_info, version=ENCODING_VERSION_COLUMNAR):
+    """
+    物標情報配列を格納形式に変換
+    Parameters
+    ----------
+    target_individual_info : list
+        物標情報配列
+    version : int
+        格納形式バージョン
+
+    Returns
+    -------
+    value : str or bytes
+        DynamoDBに格納する値
+    """
+
+    if version == ENCODING_VERSION_REPR:
+        return str(target_individual_info)
+
+    if version == ENCODING_VERSION_COLUMNAR:
+        # 項目名ごとに値をまとめ、項目を持たない物標はNoneで埋める
+        columns = {}
+        for row_index, target in enumerate(target_individual_info):
+            for key, value in target.items():
+                if key not in columns:
+                    columns[key] = [None] * row_index
+                columns[key].append(value)
+            for column in columns.values():
+                if len(column) <= row_index:
+                    column.append(None)
+
+        payload = json.dumps(columns, separators=(',', ':')).encode('utf-8')
+
+        return bytes([ENCODING_VERSION_COLUMNAR]) + zlib.compress(payload, COMPRESS_LEVEL)
+
+    if version == ENCODING_VERSION_DICTIONARY:
+        payload = json.dumps(get_tagged_columns(target_individual_info), separators=(',', ':')).encode('utf-8')
+
+        return bytes([ENCODING_VERSION_DICTIONARY, FIELD_DICTIONARY_VERSION]) + zlib.compress(payload, COMPRESS_LEVEL)
+
+    raise ValueError(f'unsupported encoding version: {version}')
+
+
+def get_tagged_columns(target_individual_info):
+    """
+    物標情報配列を項目辞書のタグごとの列に変換
+    Parameters
+    ----------
+    target_individual_info : list
+        物標情報配列
+
+    Returns
+    -------
+    tagged_columns : list
+        [物標数, [[タグ, 存在ビットマップ, 値配列], ...], 辞書にない項目の列]
+        存在ビットマップは項目を持つ物標の位置のビットを立てた整数(全物標が項目を持つ場合は0)
+        値配列は項目を持つ物標の値のみ格納する
+    """
+
+    field_tags = FIELD_TAGS[FIELD_DICTIONARY_VERSION]
+
+    columns = {}
+    extra_columns = {}
+    for row_index, target in enumerate(target_individual_info):
+        for key, value in target.items():
+            if value is None:
+                continue
+            tag = field_tags.get(key)
+            if tag is None:
+                extra_columns.setdefault(key, [None] * len(target_individual_info))[row_index] = value
+                continue
+            column = columns.setdefault(tag, [0, []])
+            column[0] |= 1 << row_index
+            column[1].append(value)
+
+    all_rows = (1 << len(target_individual_info)) - 1
+    tagged_columns = [[tag, 0 if bitmap == all_rows else bitmap, values] for tag, (bitmap, values) in sorted(columns.items())]
+
+    return [len(target_individual_info), tagged_columns, extra_columns]
+
+
+def get_row_indexes(bitmap, row_count):
+    """
+    存在ビットマップから項目を持つ物標の位置を取得
+    Parameters
+    ----------
+    bitmap : int
+        存在ビットマップ(0の場合は全物標)
+    row_count : int
+        物標数
+
+    Returns
+    -------
+    row_indexes : range or list
+        項目を持つ物標の位置
+    """
+
+    if bitmap == 0:
+        return range(row_count)
+
+    return [row_index for row_index in range(min(row_count, bitmap.bit_length())) if bitmap >> row_index & 1]
+
+
+def load_tagged_columns(value):
+    """
+    格納形式バージョン2の格納値を読み込む
+    Parameters
+    ----------
+    value : bytes
+        DynamoDBに格納された値
+
+    Returns
+    -------
+    field_names : tuple
+        格納時の項目辞書
+    tagged_columns : list
+        [物標数, [[タグ, 存在ビットマップ, 値配列], ...], 辞書にない項目の列]
+    """
+
+    field_names = FIELD_DICTIONARIES.get(value[1])
+    if field_names is None:
+        raise ValueError(f'unsupported field dictionary version: {value[1]}')
+
+    return field_names, json.loads(zlib.decompress(value[2:]))
+
+
+def decode_columns(value):
+    """
+    格納値を列指向(項目名ごとの値配列)に変換
+    Parameters
+    ----------
+    value : str or bytes or Binary or list
+        DynamoDBに格納された値、または復元済みの物標情報配列
+
+    Returns
+    -------
+    columns : dict
+        項目名ごとの値配列(項目を持たない物標はNone)
+    """
+
+    # 復元済みの物標情報配列、または従来形式(repr文字列)
+    if isinstance(value, (list, str)):
+        target_individual_info = value
+        if isinstance(target_individual_info, str):
+            target_individual_info = ast.literal_eval(target_individual_info)
+        if isinstance(target_individual_info, dict):
+            target_individual_info = [target_individual_info]
+
+        columns = {}
+        for row_index, target in enumerate(target_individual_info):
+            for key in target:
+                if key not in columns:
+                    columns[key] = [None] * len(target_individual_info)
+                columns[key][row_index] = target[key]
+
+        return columns
+
+    if isinstance(value, Binary):
+        value = value.value
+    value = bytes(value)
+
+    if value[0] == ENCODING_VERSION_COLUMNAR:
+        return json.loads(zlib.decompress(value[1:]))
+
+    if value[0] == ENCODING_VERSION_DICTIONARY:
+        field_names, (row_count, tagged_columns, extra_columns) = load_tagged_columns(value)
+        columns = {}
+        for tag, bitmap, values in tagged_columns:
+            if bitmap == 0:
+                columns[field_names[tag]] = values
+                continue
+            column = [None] * row_count
+            for row_index, column_value in zip(get_row_indexes(bitmap, row_count), values):
+                column[row_index] = column_value
+            columns[field_names[tag]] = column
+        columns.update(extra_columns)
+        return columns
+
+    raise ValueError(f'unsupported encoding version: {value[0]}')
+
+
+def decode(value):
+    """
+    格納値を物標情報配列に変換
+    Parameters
+    ----------
+    value : str or bytes or Binary or list
+        DynamoDBに格納された値、または復元済みの物標情報配列
+
+    Returns
+    -------
+    target_individual_info : list
+        物標情報配列
+    """
+
+    # 復元済みの物標情報配列はそのまま返却
+    if isinstance(value, list):
+        return value
+
+    # 従来形式(repr文字列)はそのまま復元
+    if isinstance(value, str):
+        target_individual_info = ast.literal_eval(value)
+        if isinstance(target_individual_info, dict):
+            target_individual_info = [target_individual_info]
+        return target_individual_info
+
+    if isinstance(value, Binary):
+        value = value.value
+    value = bytes(value)
+
+    # 項目を持つ物標にのみ値を設定し、全項目の存在判定を省略
+    if value[0] == ENCODING_VERSION_DICTIONARY:
+        field_names, (row_count, tagged_columns, extra_columns) = load_tagged_columns(value)
+        target_individual_info = [{} for _ in range(row_count)]
+        for tag, bitmap, values in tagged_columns:
+            key = field_names[tag]
+            for row_index, column_value in zip(get_row_indexes(bitmap, row_count), values):
+                target_individual_info[row_index][key] = column_value
+        for key, column in extra_columns.items():
+            for target, column_value in zip(target_individual_info, column):
+                if column_value is not None:
+                    target[key] = column_value
+        return target_individual_info
+
+    columns = decode_columns(value)
+    row_count = len(next(iter(columns.values()), []))
+
+    target_individual_info = []
+    for row_index in range(row_count):
+        target_individual_info.append({key: column[row_index] for key, column in columns.items() if column[row_index] is not None})
+
+    return target_individual_info
+
+
+def get_delta(keyframe_targets, target_individual_info):
+    """
+    基準フレームとの差分を生成
+    基準フレームに同一物標IDが存在しない物標は全項目を格納する
+    Parameters
+    ----------
+    keyframe_targets : dict
+        物標IDごとの基準フレームの物標情報
+    target_individual_info : list
+        物標情報配列
+
+    Returns
+    -------
+    delta_target_individual_info : list
+        差分の物標情報配列
+    """
+
+    delta_target_individual_info = []
+    for target in target_individual_info:
+        base = keyframe_targets.get(target.get('targetID'))
+        if base is None:
+            delta_target_individual_info.append(target)
+            continue
+
+        delta = {key: value for key, value in target.items() if key in DELTA_REQUIRED_KEYS or base.get(key) != value}
+        removed_keys = [key for key in base if key not in target]
+        if removed_keys:
+            delta[REMOVED_KEYS] = removed_keys
+        delta_target_individual_info.append(delta)
+
+    return delta_target_individual_info
+
+
+def apply_delta(keyframe_targets, delta_target_individual_info):
+    """
+    差分を基準フレームに適用し、物標情報配列を復元
+    Parameters
+    ----------
+    keyframe_targets : dict
+        物標IDごとの基準フレームの物標情報
+    delta_target_individual_info : list
+        差分の物標情報配列
+
+    Returns
+    -------
+    target_individual_info : list
+        物標情報配列
+    """
+
+    target_individual_info = []
+    for delta in delta_target_individual_info:
+        removed_keys = delta.get(REMOVED_KEYS, [])
+        target = {**keyframe_targets.get(delta.get('targetID'), {}), **delta}
+        for key in [REMOVED_KEYS, *removed_keys]:
+            target.pop(key, None)
+        target_individual_info.append(target)
+
+    return target_individual_info
+
+
+def resolve_items(table, items):
+    """
+    差分フレームのアイテムを基準フレームと合成し、物標情報を復元
+    基準フレームが存在しない差分フレームは除外する
+    Parameters
+    ----------
+    table
+        物標情報テーブル
+    items : list
+        取得したアイテム
+
+    Returns
+    -------
+    resolved_items : list
+        targetIndividualInfoを物標情報配列に復元したアイテム
+    """
+
+    delta_items = [item for item in items if item.get('targetInfoFrameType') == FRAME_TYPE_DELTA]
+    if not delta_items:
+        return items
+
+    # 参照されている基準フレームを取得
+    keyframe_keys = {}
+    for item in delta_items:
+        for key in item.get('keyframeKeys', []):
+            keyframe_keys[(key['time_minutes'], key['unique_time'])] = key
+    keyframe_items = get_keyframe_items(table, list(keyframe_keys.values()))
+
+    resolved_items = []
+    for item in items:
+        if item.get('targetInfoFrameType') != FRAME_TYPE_DELTA:
+            resolved_items.append(item)
+            continue
+
+        keyframe_targets = {}
+        is_missing = False
+        for key in item.get('keyframeKeys', []):
+            keyframe_item = keyframe_items.get((key['time_minutes'], key['unique_time']))
+            if keyframe_item is None:
+                is_missing = True
+                break
+            for target in decode(keyframe_item['targetIndividualInfo']):
+                keyframe_targets[target.get('targetID')] = target
+
+        if is_missing:
+            logger.warning(f"keyframe not found time_minutes:{item['time_minutes']} unique_time:{item['unique_time']}")
+            continue
+
+        resolved_items.append({**item, 'targetIndividualInfo': apply_delta(keyframe_targets, decode(item['targetIndividualInfo']))})
+
+    return resolved_items
+
+
+def get_keyframe_items(table, keys):
+    """
+    基準フレームのアイテムを一括取得
+    Parameters
+    ----------
+    table
+        物標情報テーブル
+    keys : list
+        基準フレームのキー
+
+    Returns
+    -------
+    keyframe_items : dict
+        (time_minutes, unique_time)ごとのアイテム
+    """
+
+    keyframe_items = {}
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        request_items = {
+            table.name: {
+                'Keys': keys[start:start + BATCH_GET_MAX_KEYS],
+                'ProjectionExpression': 'time_minutes, unique_time, targetIndividualInfo',
+            }
+        }
+        retry_count = 0
+        while request_items:
+            response = table.meta.client.batch_get_item(RequestItems=request_items)
+            for item in response['Responses'].get(table.name, []):
+                keyframe_items[(item['time_minutes'], item['unique_time'])] = item
+
+            request_items = response.get('UnprocessedKeys')
+            if request_items:
+                if retry_count >= BATCH_GET_MAX_RETRY:
+                    unprocessed_count = sum(len(table_keys['Keys']) for table_keys in request_items.values())
+                    logger.error(f'UnprocessedKeys remain table:{table.name} keys:{unprocessed_count}')
+                    raise Exception('batch_get_item retry limit exceeded')
+
+                # フルジッター付き指数バックオフ
+                time.sleep(random.uniform(0, min(BATCH_GET_MAX_DELAY, BATCH_GET_BASE_DELAY * (2 ** retry_count))))
+                retry_count += 1
+
+    return keyframe_items
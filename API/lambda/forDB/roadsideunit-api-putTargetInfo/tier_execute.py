@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+
+import elasticache_execute
+import time_util
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+# 間引き階層の間隔(秒、カンマ区切り)、未指定の場合は間引き階層を作成しない
+TARGET_TIER_SECONDS = sorted({int(seconds) for seconds in os.environ.get('TARGET_TIER_SECONDS', '').split(',') if seconds.strip() and int(seconds) > 0})
+TARGET_TIER_KEY_TTL_SECONDS = int(os.environ.get('TARGET_TIER_KEY_TTL_SECONDS', '600'))
+
+# 間引きキーのプレフィックス(tier:{間隔}:r{路側機ID}s{サービス地点情報ID}d{機器種別ID}:{区間の開始時刻(UTC)})
+TIER_KEY_PREFIX = 'tier:'
+
+# DynamoDBへの反映待ちの間引きキー
+TIER_PENDING_KEY = 'tier:pending'
+
+# 区間の属性(路側機ID・更新時刻等)と更新回数のフィールド名(物標IDのフィールドと区別する)
+ATTRIBUTE_FIELD = '_attribute'
+COUNT_FIELD = '_count'
+
+# 物標IDごとに区間内の最新の物標情報のみ保持(時刻が現在値以降の場合のみ更新)
+TIER_SCRIPT = """
+for i = 2, #ARGV, 3 do
+    local time_field = ARGV[i] .. ':t'
+    local current = redis.call('HGET', KEYS[1], time_field)
+    if not current or tonumber(current) <= tonumber(ARGV[i + 1]) then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 2], time_field, ARGV[i + 1])
+    end
+end
+redis.call('HSET', KEYS[1], '_attribute', ARGV[1])
+return redis.call('HINCRBY', KEYS[1], '_count', 1)
+"""
+
+
+def put_data_list(parameters_list, redis_host):
+    """
+    物標情報を機器・間隔ごとの区間に間引き、ElastiCacheの間引き値を更新
+    間引き値はtier_functionが区間の確定後にDynamoDBの物標情報テーブルに反映する
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+    redis_host
+        redis接続用のホスト
+    """
+
+    if not TARGET_TIER_SECONDS:
+        return
+
+    try:
+        tiers = get_tiers(parameters_list)
+        if not tiers:
+            return
+
+        # ElastiCacheに接続
+        redis_client = elasticache_execute.get_redis_client(redis_host)
+
+        # 全機器・全区間の更新を1回の通信で実行
+        pipeline = redis_client.pipeline(transaction=False)
+        for tier_key, tier in tiers.items():
+            args = [json.dumps(tier['attribute'])]
+            for target_id, (epoch_ms, target) in tier['targets'].items():
+                args.extend([target_id, epoch_ms, json.dumps(target)])
+            pipeline.eval(TIER_SCRIPT, 1, tier_key, *args)
+            pipeline.expire(tier_key, TARGET_TIER_KEY_TTL_SECONDS)
+        pipeline.sadd(TIER_PENDING_KEY, *tiers.keys())
+        pipeline.execute()
+
+    except Exception:
+        logger.error('other error')
+        raise
+
+
+def get_tiers(parameters_list):
+    """
+    物標情報を機器・間隔ごとの区間に分け、物標IDごとに区間内の最新の物標情報を抽出
+    parameters
+    ----------
+    parameters_list : list
+        フレームごとの物標情報パラメータ
+
+    Returns
+    -------
+    tiers : dict
+        間引きキーごとの属性と物標IDごとの(時刻, 物標情報)
+    """
+
+    tiers = {}
+    for parameters in parameters_list:
+        attribute = {
+            'roadsideUnitID': parameters['attribute']['roadsideUnitID'],
+            'serviceLocationID': parameters['attribute']['serviceLocationID'],
+            'updateTimeInfo': parameters['attribute']['updateTimeInfo'],
+            'formatVersion': parameters['attribute']['formatVersion'],
+        }
+        if 'dataModelType' in parameters:
+            attribute['dataModelType'] = parameters['dataModelType']
+
+        for device_individual_value in parameters['attribute']['deviceIndividualInfo']:
+            for target in device_individual_value.get('targetIndividualInfo', []):
+                epoch_ms = time_util.parse_epoch_ms(target['time'])
+                for tier_seconds in TARGET_TIER_SECONDS:
+                    bucket_ms = epoch_ms // (tier_seconds * 1000) * tier_seconds * 1000
+                    tier_key = get_tier_key(
+                        tier_seconds,
+                        attribute['roadsideUnitID'],
+                        attribute['serviceLocationID'],
+                        device_individual_value['deviceID'],
+                        time_util.format_utc(bucket_ms)
+                    )
+
+                    tier = tiers.setdefault(tier_key, {'attribute': attribute, 'targets': {}})
+                    tier['attribute'] = attribute
+                    current = tier['targets'].get(target['targetID'])
+                    if current is None or current[0] <= epoch_ms:
+                        tier['targets'][target['targetID']] = (epoch_ms, target)
+
+    return tiers
+
+
+def get_tier_key(tier_seconds, roadside_unit_id, service_location_id, device_id, bucket_utc):
+    """
+    間引きキーを作成
+    Parameters
+    ----------
+    tier_seconds : int
+        間引きの間隔(秒)
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    device_id : int
+        機器種別ID
+    bucket_utc : str
+        区間の開始時刻(UTC、YYYY-MM-DDTHH:MM:SS.fffZ)
+
+    Returns
+    -------
+    tier_key : str
+        間引きキー
+    """
+
+    return f'{TIER_KEY_PREFIX}{tier_seconds}:r{roadside_unit_id}s{service_location_id}d{device_id}:{bucket_utc}'
+
+
+def parse_tier_key(tier_key):
+    """
+    間引きキーを分解
+    Parameters
+    ----------
+    tier_key : str
+        間引きキー
+
+    Returns
+    -------
+    tier_seconds : int
+        間引きの間隔(秒)
+    roadside_unit_id : int
+        路側機ID
+    service_location_id : int
+        サービス地点情報ID
+    device_id : int
+        機器種別ID
+    bucket_utc : str
+        区間の開始時刻(UTC、YYYY-MM-DDTHH:MM:SS.fffZ)
+    """
+
+    tier_seconds, device_key, bucket_utc = tier_key[len(TIER_KEY_PREFIX):].split(':', 2)
+    roadside_unit_id, rest = device_key[1:].split('s', 1)
+    service_location_id, device_id = rest.split('d', 1)
+
+    return int(tier_seconds), int(roadside_unit_id), int(service_location_id), int(device_id), bucket_utc
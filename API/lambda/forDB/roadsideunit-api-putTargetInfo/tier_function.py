@@ -0,0 +1,188 @@
+import json
+import logging
+import os
+import time
+import traceback
+
+import dynamodb_execute
+import elasticache_execute
+import target_codec
+import tier_execute
+import time_util
+from botocore.exceptions import ClientError
+from log import logger
+
+# ログレベル設定
+logger.setLevel(logging.INFO)
+
+# 環境変数取得
+REDIS_HOST = os.environ['REDIS_HOST']
+TARGET_TIER_FLUSH_DELAY_SECONDS = int(os.environ.get('TARGET_TIER_FLUSH_DELAY_SECONDS', '30'))
+TARGET_TIER_TTL_SECONDS = int(os.environ.get('TARGET_TIER_TTL_SECONDS', '2592000'))
+
+# 1回の通信で読み込む間引きキー数
+FLUSH_CHUNK_SIZE = 100
+
+# 反映後に更新されていない場合のみ反映待ちから除外
+# 間引きキーは有効期限まで残し、遅れて届いた物標情報は区間全体を再反映する
+REMOVE_PENDING_SCRIPT = """
+if redis.call('HGET', KEYS[2], '_count') == ARGV[1] then
+    redis.call('SREM', KEYS[1], KEYS[2])
+end
+return 1
+"""
+
+
+def lambda_handler(event, context):
+    """
+    ElastiCacheの間引き値のうち確定した区間をDynamoDBの物標情報テーブルに反映
+    Parameters
+    ----------
+    event : dict
+        スケジュール実行イベント
+    context :LambdaContext
+        コンテキストオブジェクト
+
+    Returns
+    -------
+    response : dict
+        反映件数
+    """
+
+    response = {
+        'statusCode': 200,
+        'body': ''
+    }
+
+    try:
+        redis_client = elasticache_execute.get_redis_client(REDIS_HOST)
+
+        # 確定済みとみなす時刻(区間の終了時刻がこの値より前の区間は以降更新されない)
+        closed_before_ms = int(time.time() * 1000) - TARGET_TIER_FLUSH_DELAY_SECONDS * 1000
+
+        tier_keys = sorted(redis_client.smembers(tier_execute.TIER_PENDING_KEY))
+        flushed_count = 0
+        expired_count = 0
+        for start in range(0, len(tier_keys), FLUSH_CHUNK_SIZE):
+            # 確定した区間のみ反映(集計中の区間は物標情報テーブルの物標情報を使用する)
+            chunk_keys = [tier_key for tier_key in tier_keys[start:start + FLUSH_CHUNK_SIZE] if is_closed(tier_key, closed_before_ms)]
+            if not chunk_keys:
+                continue
+
+            pipeline = redis_client.pipeline(transaction=False)
+            for tier_key in chunk_keys:
+                pipeline.hgetall(tier_key)
+            values = pipeline.execute()
+
+            # 登録先テーブルごとに登録アイテムをまとめる
+            items_by_table = {}
+            counts = {}
+            for tier_key, tier in zip(chunk_keys, values):
+                counts[tier_key] = tier.get(tier_execute.COUNT_FIELD)
+                if tier:
+                    table_name, item = get_tier_item(tier_key, tier)
+                    items_by_table.setdefault(table_name, []).append(item)
+
+            for table_name, items in items_by_table.items():
+                try:
+                    dynamodb_execute.batch_write_items(table_name, items)
+                    flushed_count += len(items)
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                        logger.error('Not Found ' + table_name)
+                    else:
+                        raise
+
+            # 反映した区間、または有効期限切れの間引きキーを反映待ちから除外
+            pipeline = redis_client.pipeline(transaction=False)
+            for tier_key in chunk_keys:
+                if counts[tier_key] is None:
+                    pipeline.srem(tier_execute.TIER_PENDING_KEY, tier_key)
+                    expired_count += 1
+                else:
+                    pipeline.eval(REMOVE_PENDING_SCRIPT, 2, tier_execute.TIER_PENDING_KEY, tier_key, counts[tier_key])
+            pipeline.execute()
+
+        response['body'] = {
+            'flushedCount': flushed_count,
+            'expiredCount': expired_count,
+        }
+        logger.info(response['body'])
+
+    except Exception:
+        response['statusCode'] = 500
+        response['body'] = 'Internal server error'
+        logger.error('error roadsideunit-api-putTargetInfo tier')
+        logger.error(traceback.format_exc())
+
+    return response
+
+
+def is_closed(tier_key, closed_before_ms):
+    """
+    間引きキーの区間が確定しているか判定
+    Parameters
+    ----------
+    tier_key : str
+        間引きキー
+    closed_before_ms : int
+        確定済みとみなす時刻(UNIXエポックからのミリ秒)
+
+    Returns
+    -------
+    is_closed : bool
+        区間の終了時刻が確定済みとみなす時刻より前の場合True
+    """
+
+    tier_seconds, _, _, _, bucket_utc = tier_execute.parse_tier_key(tier_key)
+
+    return time_util.parse_epoch_ms(bucket_utc) + tier_seconds * 1000 <= closed_before_ms
+
+
+def get_tier_item(tier_key, tier):
+    """
+    間引き階層の登録アイテムを生成
+    物標情報テーブルのGSI(deviceID-time_utc-index)に含まれないよう、time_utcは持たせない
+    Parameters
+    ----------
+    tier_key : str
+        間引きキー
+    tier : dict
+        ElastiCacheの間引き値
+
+    Returns
+    -------
+    table_name : str
+        登録先テーブル名
+    item : dict
+        登録アイテム
+    """
+
+    tier_seconds, roadside_unit_id, service_location_id, device_id, bucket_utc = tier_execute.parse_tier_key(tier_key)
+    attribute = json.loads(tier[tier_execute.ATTRIBUTE_FIELD])
+
+    # 物標IDごとの最新の物標情報を時刻・物標ID順に並べる
+    targets = sorted(
+        (json.loads(value) for field, value in tier.items() if not field.startswith('_') and not field.endswith(':t')),
+        key=lambda x: (time_util.parse_epoch_ms(x['time']), x['targetID'])
+    )
+
+    item = {
+        'time_minutes': dynamodb_execute.get_tier_partition_key(tier_seconds, bucket_utc, device_id),
+        'unique_time': bucket_utc,
+        'roadsideUnitID': roadside_unit_id,
+        'serviceLocationID': service_location_id,
+        'updateTimeInfo': attribute['updateTimeInfo'],
+        'formatVersion': attribute['formatVersion'],
+        'deviceID': device_id,
+        'tier_seconds': tier_seconds,
+        'targetIndividualInfo': target_codec.encode(targets, dynamodb_execute.TARGET_INFO_ENCODING_VERSION),
+    }
+    if 'dataModelType' in attribute:
+        item['dataModelType'] = attribute['dataModelType']
+    if TARGET_TIER_TTL_SECONDS > 0:
+        item[dynamodb_execute.TTL_ATTRIBUTE_NAME] = time_util.parse_epoch_ms(bucket_utc) // 1000 + TARGET_TIER_TTL_SECONDS
+
+    table_name = f'{dynamodb_execute.TARGET_INFO_TABLE_NAME}_{roadside_unit_id}_{service_location_id}'
+
+    return table_name, item
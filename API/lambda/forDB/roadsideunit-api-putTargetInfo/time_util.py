@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# 環境変数取得
+TIME_CACHE_SIZE = int(os.environ.get('TIME_CACHE_SIZE', '4096'))
+
+# UNIXエポック
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# 1ミリ秒
+MILLISECOND = timedelta(milliseconds=1)
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parse(time):
+    """
+    ISO8601形式の時刻をdatetimeに変換(タイムゾーンなしはUTCとみなす)
+    Parameters
+    ----------
+    time : str
+        時刻情報
+
+    Returns
+    -------
+    iso_time : datetime
+        タイムゾーン付きの時刻
+    """
+
+    iso_time = datetime.fromisoformat(time)
+    if iso_time.tzinfo is None:
+        iso_time = iso_time.replace(tzinfo=timezone.utc)
+
+    return iso_time
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def parse_epoch_ms(time):
+    """
+    ISO8601形式の時刻をUNIXエポックからのミリ秒に変換
+    時刻の比較・ソートはこの値で行う
+    Parameters
+    ----------
+    time : str
+        時刻情報
+
+    Returns
+    -------
+    epoch_ms : int
+        UNIXエポックからのミリ秒(ミリ秒未満は切り捨て)
+    """
+
+    return (parse(time) - EPOCH) // MILLISECOND
+
+
+def format_utc(epoch_ms):
+    """
+    UNIXエポックからのミリ秒をUTCの時刻文字列(YYYY-MM-DDTHH:MM:SS.fffZ)に変換
+    Parameters
+    ----------
+    epoch_ms : int
+        UNIXエポックからのミリ秒
+
+    Returns
+    -------
+    utc_time : str
+        UTCの時刻文字列
+    """
+
+    return (EPOCH + epoch_ms * MILLISECOND).isoformat(timespec='milliseconds')[:23] + 'Z'
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def to_utc(time):
+    """
+    時刻をUTCの時刻文字列(YYYY-MM-DDTHH:MM:SS.fffZ)に変換
+    Parameters
+    ----------
+    time : str
+        時刻情報
+
+    Returns
+    -------
+    utc_time : str
+        UTCの時刻文字列
+    """
+
+    return parse(time).astimezone(timezone.utc).isoformat(timespec='milliseconds')[:23] + 'Z'
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def to_minutes(time):
+    """
+    時刻の「分」までを現地時刻のまま取得(YYYY-MM-DD HH:MM)
+    Parameters
+    ----------
+    time : str
+        時刻情報
+
+    Returns
+    -------
+    format_time : str
+        時刻「分」まで時刻情報
+    """
+
+    return datetime.fromisoformat(time).isoformat(' ', 'minutes')[:16]
@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import awswrangler as wr
 import boto3
 import pandas as pd
+import target_codec
 from botocore.exceptions import ClientError
 from log import logger
 
@@ -128,7 +129,8 @@ def get_target_value(roadside_unit_id, service_location_id, t_target_info, senso
                 if e.response['Error']['Code'] == 'ResourceNotFoundException':
                     response_status = 204
                     return result, response_status
-            result.extend(response.get('Items', []))
+            # 差分フレームを基準フレームと合成
+            result.extend(target_codec.resolve_items(t_target_info, response.get('Items', [])))
     if not result:
         response_status = 204
         return result, response_status
@@ -255,11 +257,16 @@ def data_format(data, query_params, target_info_bucket_name, target_info_table_n
     # columnを仕様書に合わせて並び替え
     df = df.reindex(columns=['dataModelType', 'serviceLocationID', 'roadsideUnitID', 'updateTimeInfo', 'formatVersion', 'deviceID', 'targetIndividualInfo'])
 
-    # 'targetIndividualInfo'列を辞書として展開
-    target_info = df['targetIndividualInfo'].apply(ast.literal_eval).apply(pd.Series)
+    # 格納形式に応じて物標情報を列指向で復元し、アイテムの行番号を付けて1物標1行に展開
+    target_info_dfs = []
+    for index, target_individual_info in df['targetIndividualInfo'].items():
+        target_info_df = pd.DataFrame(target_codec.decode_columns(target_individual_info))
+        target_info_df.index = [index] * len(target_info_df)
+        target_info_dfs.append(target_info_df)
+    target_info = pd.concat(target_info_dfs)
 
     # 元のDataFrameに展開したカラムを結合
-    df = pd.concat([df.drop(columns='targetIndividualInfo'), target_info], axis=1)
+    df = df.drop(columns='targetIndividualInfo').join(target_info, how='inner').reset_index(drop=True)
 
     # deviceIDの出現回数をカウントし、元のDataFrameにマージ
     device_counts = df['deviceID'].value_counts().reset_index()
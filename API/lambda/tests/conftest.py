@@ -0,0 +1,37 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import importlib
+import os
+import sys
+
+import pytest
+
+# Lambdaのソースコードのディレクトリ(各Lambdaは同名のモジュールを持つため、テストごとに読み込み直す)
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'forDB')
+
+
+@pytest.fixture
+def load_lambda(monkeypatch):
+    """
+    Lambdaのモジュールを環境変数を設定した状態で読み込む関数を返す
+    """
+
+    loaded = []
+
+    def load(lambda_name, module_names, **environ):
+        for key, value in environ.items():
+            monkeypatch.setenv(key, str(value))
+
+        lambda_path = os.path.join(LAMBDA_DIR, lambda_name)
+        for file_name in os.listdir(lambda_path):
+            if file_name.endswith('.py'):
+                sys.modules.pop(file_name[:-3], None)
+                loaded.append(file_name[:-3])
+        monkeypatch.syspath_prepend(lambda_path)
+
+        return [importlib.import_module(module_name) for module_name in module_names]
+
+    yield load
+
+    for module_name in loaded:
+        sys.modules.pop(module_name, None)
@@ -0,0 +1,216 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import time
+
+import pytest
+
+boto3 = pytest.importorskip('boto3')
+pytest.importorskip('awswrangler')
+pd = pytest.importorskip('pandas')
+moto = pytest.importorskip('moto')
+
+TABLE_NAME = 't_target_info'
+ROADSIDE_UNIT_ID = 1
+SERVICE_LOCATION_ID = 2
+TARGET_TABLE_NAME = f'{TABLE_NAME}_{ROADSIDE_UNIT_ID}_{SERVICE_LOCATION_ID}'
+HOUR_SECONDS = 3600
+# 書き出しを確定するまでの時間(3時間)
+FINAL_DELAY_SECONDS = 3 * HOUR_SECONDS
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'ap-northeast-1')
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        yield
+
+
+@pytest.fixture
+def modules(aws, load_lambda, tmp_path):
+    dynamodb_execute, compact_function = load_lambda(
+        'roadsideunit-api-putTargetInfo',
+        ['dynamodb_execute', 'compact_function'],
+        TARGET_INFO_TABLE_NAME=TABLE_NAME,
+        TARGET_ARCHIVE_PATH=tmp_path / 'archive',
+        TARGET_SHARD_NUM=4,
+        TARGET_INFO_TTL_SECONDS=604800,
+        TARGET_ARCHIVE_FINAL_DELAY_SECONDS=FINAL_DELAY_SECONDS,
+    )
+    create_target_table(TARGET_TABLE_NAME)
+
+    return dynamodb_execute, compact_function
+
+
+def create_target_table(table_name):
+    boto3.resource('dynamodb').create_table(
+        TableName=table_name,
+        KeySchema=[
+            {'AttributeName': 'time_minutes', 'KeyType': 'HASH'},
+            {'AttributeName': 'unique_time', 'KeyType': 'RANGE'},
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'time_minutes', 'AttributeType': 'S'},
+            {'AttributeName': 'unique_time', 'AttributeType': 'S'},
+        ],
+        BillingMode='PAY_PER_REQUEST',
+    )
+
+
+def get_target(target_id, time):
+    return {
+        'commonServiceStandardID': 1, 'targetMessageID': 2, 'targetIndividualVersionInfo': 1, 'targetID': target_id,
+        'targetIndividualIncrementCounter': target_id % 256, 'dataLength': 80, 'individualOptionFlag': 0,
+        'leapSecondCorrectionInfo': 0, 'time': time, 'latitude': 356800000 + target_id, 'longitude': 1397600000 + target_id,
+        'elevation': 100, 'positionConf': 3, 'elevationConf': 3, 'speed': 1000 + target_id, 'heading': 0, 'acceleration': 0,
+        'speedConf': 2, 'headingConf': 2, 'forwardRearAccelerationConf': 1, 'sizeClassification': 1, 'roleClassification': 0,
+        'vehicleWidth': 180, 'vehicleLength': 450, 'semiMajorAxisOfPositionalErrorEllipse': 10,
+        'semiMinorAxisOfPositionalErrorEllipse': 5, 'semiMajorAxisOrientationOfPositionalErrorEllipse': 0, 'existingTime': 10,
+    }
+
+
+def get_frame(time, target_count=5, device_count=2):
+    return {
+        'dataModelType': 'test',
+        'attribute': {
+            'roadsideUnitID': ROADSIDE_UNIT_ID,
+            'serviceLocationID': SERVICE_LOCATION_ID,
+            'updateTimeInfo': time,
+            'formatVersion': 1,
+            'deviceNum': device_count,
+            'deviceIndividualInfo': [
+                {
+                    'deviceID': device_id,
+                    'targetNum': target_count,
+                    'targetIndividualInfo': [get_target(device_id * 100 + index, time) for index in range(target_count)],
+                }
+                for device_id in range(1, device_count + 1)
+            ],
+        },
+    }
+
+
+class Clock:
+    """
+    現在時刻を現在の時間の30分に固定した時計
+    """
+
+    def __init__(self):
+        self.now = int(time.time()) // HOUR_SECONDS * HOUR_SECONDS + 1800
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    def hour(self, offset):
+        return time.strftime('%Y-%m-%dT%H', time.gmtime(self.now + offset * HOUR_SECONDS))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'time', lambda: clock.now)
+
+    return clock
+
+
+def get_items():
+    return boto3.resource('dynamodb').Table(TARGET_TABLE_NAME).scan()['Items']
+
+
+def get_time_to_live_status():
+    description = boto3.client('dynamodb').describe_time_to_live(TableName=TARGET_TABLE_NAME)['TimeToLiveDescription']
+    return description['TimeToLiveStatus']
+
+
+def test_compact_table_writes_sorted_parquet(modules, tmp_path):
+    dynamodb_execute, compact_function = modules
+    dynamodb_execute.put_data_list([
+        get_frame('2024-06-01T09:00:02.000+09:00'),
+        get_frame('2024-06-01T09:00:01.000+09:00'),
+        get_frame('2024-06-01T10:00:00.000+09:00'),
+    ])
+
+    row_count = compact_function.compact_table(TARGET_TABLE_NAME, compact_function.get_hour_ms('2024-06-01T00'))
+
+    df = pd.read_parquet(tmp_path / 'archive' / TARGET_TABLE_NAME / 'date=2024-06-01' / 'hour=00' / 'part.parquet')
+    assert row_count == len(df) == 20
+    assert df['time_utc'].is_monotonic_increasing
+    assert set(df['deviceID']) == {1, 2}
+    assert df.iloc[0]['time_utc'].startswith('2024-06-01T00:00:01')
+
+
+def test_time_to_live_waits_for_unarchived_hours(modules, clock):
+    dynamodb_execute, compact_function = modules
+    # 保持期間内の3時間前・1時間前のフレーム
+    hours = [clock.hour(offset) for offset in (-3, -2, -1)]
+    dynamodb_execute.put_data_list([
+        get_frame(f'{hours[0]}:30:00.000+00:00'),
+        get_frame(f'{hours[2]}:30:00.000+00:00'),
+    ])
+
+    # 最古の時間が書き出されていないためTTLを有効化しない
+    compact_function.lambda_handler({'hour': hours[2]}, None)
+    assert get_time_to_live_status() == 'DISABLED'
+
+    # 未書き出しの時間を古い順に書き出してからTTLを有効化(確定前の時間も書き出し直す)
+    compacted = compact_function.archive_table(TARGET_TABLE_NAME, compact_function.get_hour_ms(hours[2]), False, None)
+    assert compacted == {hours[0]: 10, hours[1]: 0, hours[2]: 10}
+    assert get_time_to_live_status() == 'ENABLED'
+
+    manifest = compact_function.read_manifest(TARGET_TABLE_NAME)
+    assert manifest['startHour'] == hours[0]
+    assert manifest['provisionalHours'] == {hours[0]: 10, hours[1]: 0, hours[2]: 10}
+
+
+def test_late_items_are_archived_until_final(modules, clock):
+    dynamodb_execute, compact_function = modules
+    hour = clock.hour(-1)
+    hour_ms = compact_function.get_hour_ms(hour)
+    dynamodb_execute.put_data_list([get_frame(f'{hour}:10:00.000+00:00')])
+    assert compact_function.archive_table(TARGET_TABLE_NAME, hour_ms, False, None) == {hour: 10}
+
+    # 確定前に遅れて届いたフレームは次の実行で書き出し直す
+    dynamodb_execute.put_data_list([get_frame(f'{hour}:20:00.000+00:00')])
+    clock.advance(HOUR_SECONDS)
+    assert compact_function.archive_table(TARGET_TABLE_NAME, hour_ms + compact_function.HOUR_MS, False, None) == {hour: 20, clock.hour(-1): 0}
+    assert compact_function.read_manifest(TARGET_TABLE_NAME)['provisionalHours'][hour] == 20
+
+    # 確定後は書き出し直さない
+    clock.advance(FINAL_DELAY_SECONDS)
+    compact_function.archive_table(TARGET_TABLE_NAME, compact_function.get_hour_ms(clock.hour(-1)), False, None)
+    manifest = compact_function.read_manifest(TARGET_TABLE_NAME)
+    assert manifest['archivedHours'][hour] == 20
+    assert hour not in manifest['provisionalHours']
+
+    # 確定後に届いたフレームは書き出されないため有効期限を設定しない
+    dynamodb_execute.put_data_list([get_frame(f'{hour}:30:00.000+00:00')])
+    expire_times = {item['time_utc'][:16]: item.get(dynamodb_execute.TTL_ATTRIBUTE_NAME) for item in get_items()}
+    assert expire_times[f'{hour}:30'] is None
+    assert expire_times[f'{hour}:10'] is not None
+
+
+def test_compact_table_requires_shards(modules, monkeypatch, clock):
+    dynamodb_execute, compact_function = modules
+    hour = clock.hour(-1)
+    dynamodb_execute.put_data_list([get_frame(f'{hour}:30:00.000+00:00')])
+    monkeypatch.setattr(dynamodb_execute, 'TARGET_SHARD_NUM', 0)
+
+    # 従来形式のパーティションは検索できないため、書き出し済みとして記録せずTTLも有効化しない
+    response = compact_function.lambda_handler({}, None)
+
+    assert response['body']['failed'] == [TARGET_TABLE_NAME]
+    assert 'archivedHours' not in compact_function.read_manifest(TARGET_TABLE_NAME)
+    assert get_time_to_live_status() == 'DISABLED'
+
+
+def test_failed_table_does_not_stop_others(modules, monkeypatch):
+    dynamodb_execute, compact_function = modules
+    dynamodb_execute.put_data_list([get_frame('2024-06-01T09:30:00.000+09:00')])
+    monkeypatch.setattr(compact_function, 'get_target_table_names', lambda: [f'{TABLE_NAME}_9_9', TARGET_TABLE_NAME])
+
+    response = compact_function.lambda_handler({'hour': '2024-06-01T00'}, None)
+
+    assert response['statusCode'] == 500
+    assert response['body']['failed'] == [f'{TABLE_NAME}_9_9']
+    assert response['body']['compacted'] == {TARGET_TABLE_NAME: {'2024-06-01T00': 10}}
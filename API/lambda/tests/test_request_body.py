@@ -0,0 +1,59 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import base64
+import gzip
+import os
+
+import pytest
+
+from conftest import LAMBDA_DIR
+
+# request_body.pyを持つ登録API
+PUT_LAMBDA_NAMES = sorted(
+    lambda_name for lambda_name in os.listdir(LAMBDA_DIR)
+    if os.path.exists(os.path.join(LAMBDA_DIR, lambda_name, 'request_body.py'))
+)
+
+RAW_BODY = b'{"a":1}\n{"a":2}'
+
+
+def get_event(data, is_base64_encoded):
+    return {
+        'body': base64.b64encode(data).decode('ascii') if is_base64_encoded else data,
+        'isBase64Encoded': is_base64_encoded,
+    }
+
+
+@pytest.mark.parametrize('lambda_name', PUT_LAMBDA_NAMES)
+@pytest.mark.parametrize('headers, data, is_base64_encoded', [
+    # JSONはバイナリとして扱われず文字列のまま渡される
+    ({'content-type': 'application/json'}, RAW_BODY.decode(), False),
+    ({'content-type': 'application/gzip'}, gzip.compress(RAW_BODY), True),
+    ({'content-type': 'application/gzip', 'content-encoding': 'gzip'}, gzip.compress(RAW_BODY), True),
+    ({'content-type': 'application/octet-stream', 'content-encoding': 'gzip'}, gzip.compress(RAW_BODY), True),
+    ({'content-type': 'application/octet-stream'}, RAW_BODY, True),
+])
+def test_load_all(load_lambda, lambda_name, headers, data, is_base64_encoded):
+    request_body, = load_lambda(lambda_name, ['request_body'])
+
+    body_format = request_body.get_format(headers)
+    content_encoding = request_body.get_encoding(headers)
+
+    assert request_body.load_all(get_event(data, is_base64_encoded), body_format, content_encoding) == [{'a': 1}, {'a': 2}]
+
+
+@pytest.mark.parametrize('lambda_name', PUT_LAMBDA_NAMES)
+def test_postman_escaped_body(load_lambda, lambda_name):
+    request_body, = load_lambda(lambda_name, ['request_body'])
+
+    assert request_body.load(get_event('{"a":\\n1}', False), request_body.BODY_FORMAT_JSON) == {'a': 1}
+
+
+@pytest.mark.parametrize('lambda_name', PUT_LAMBDA_NAMES)
+def test_compressed_body_requires_binary_content_type(load_lambda, lambda_name):
+    request_body, = load_lambda(lambda_name, ['request_body'])
+    # application/jsonはバイナリとして扱われず、圧縮されたbodyが文字列に変換されて渡される
+    headers = {'content-type': 'application/json', 'content-encoding': 'gzip'}
+
+    with pytest.raises(request_body.BinaryContentTypeError):
+        request_body.load_all(get_event(gzip.compress(RAW_BODY).decode('latin-1'), False), request_body.get_format(headers), request_body.get_encoding(headers))
@@ -0,0 +1,20 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+from .async_client import AsyncRsuClient
+from .buffer import ALIVE_MONITORING_INFO, SENSOR_INFO, TARGET_INFO
+from .client import RsuClient
+from .errors import QueueFullError, UploadError
+from .metrics import ClientMetrics
+from .retry import RetryPolicy
+
+__all__ = [
+    'ALIVE_MONITORING_INFO',
+    'AsyncRsuClient',
+    'ClientMetrics',
+    'QueueFullError',
+    'RetryPolicy',
+    'RsuClient',
+    'SENSOR_INFO',
+    'TARGET_INFO',
+    'UploadError',
+]
@@ -0,0 +1,267 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import asyncio
+import time
+
+from . import encoding, retry
+from .base import BaseClient
+from .buffer import ALIVE_MONITORING_INFO, SENSOR_INFO, TARGET_INFO
+from .errors import QueueFullError
+
+# aiohttpはインストールされている場合のみ使用する(pip install roadsideunit-client[async])
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncRsuClient(BaseClient):
+    """
+    路側機から登録APIへ送信するクライアント(asyncioで送信)
+    フレームは送信待ちに追加して直ちに戻り、バックグラウンドのタスクがバッチにまとめて送信する
+    start(またはasync with)で送信を開始し、close(またはasync withの終了)で送信待ちを送信して終了する
+    """
+
+    def __init__(self, base_url, session=None, **kwargs):
+        """
+        Parameters
+        ----------
+        base_url : str
+            APIのURL
+        session : aiohttp.ClientSession
+            送信に使用するセッション(未指定の場合はstartで接続を再利用するセッションを作成)
+        **kwargs
+            BaseClientのパラメータ
+        """
+
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for AsyncRsuClient')
+
+        super().__init__(base_url, **kwargs)
+
+        self._session = session
+        self._is_own_session = session is None
+        self._condition = None
+        self._workers = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def start(self):
+        """
+        セッションを作成し、送信タスクを開始
+        """
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        self._condition = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.max_concurrency)]
+
+    async def put_target_info(self, frame, block=True):
+        """
+        物標情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            1フレーム分の物標情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        """
+
+        await self._put(TARGET_INFO, frame, block)
+
+    async def put_sensor_info(self, frame, block=True):
+        """
+        センサ情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            センサ情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        """
+
+        await self._put(SENSOR_INFO, frame, block)
+
+    async def put_alive_monitoring_info(self, frame, block=True):
+        """
+        死活監視情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            死活監視情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        """
+
+        await self._put(ALIVE_MONITORING_INFO, frame, block)
+
+    async def flush(self, timeout=None):
+        """
+        送信待ちのフレームを直ちに送信し、送信完了まで待つ
+        Parameters
+        ----------
+        timeout : float
+            待つ最大時間(秒)
+
+        Returns
+        -------
+        is_flushed : bool
+            送信が完了した場合True
+        """
+
+        async with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                await asyncio.wait_for(self._condition.wait_for(lambda: not self._buffer and self._in_flight == 0), timeout)
+                return True
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self._flushing -= 1
+
+    async def close(self, timeout=None):
+        """
+        送信待ちのフレームを送信して終了
+        Parameters
+        ----------
+        timeout : float
+            送信を待つ最大時間(秒、経過後は送信を中止する)
+        """
+
+        if self._condition is not None:
+            async with self._condition:
+                self._closed = True
+                self._condition.notify_all()
+
+        if self._workers:
+            _, pending = await asyncio.wait(self._workers, timeout=timeout)
+            for worker in pending:
+                worker.cancel()
+            self._workers = []
+
+        if self._is_own_session and self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def metrics(self):
+        """
+        送信待ちのフレーム数・送信件数・レイテンシ等の集計値を取得
+
+        Returns
+        -------
+        metrics : dict
+            集計値
+        """
+
+        return self.get_metrics()
+
+    async def _put(self, path, frame, block):
+        """
+        フレームを送信待ちに追加
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        frame : dict
+            1フレーム分のデータ
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        """
+
+        if self._condition is None:
+            raise RuntimeError('client is not started')
+
+        payload = encoding.dumps(frame)
+
+        async with self._condition:
+            if self._closed:
+                raise RuntimeError('client is closed')
+            if block:
+                await self._condition.wait_for(lambda: not self._buffer.is_full() or self._closed)
+                if self._closed:
+                    raise RuntimeError('client is closed')
+            if self._buffer.is_full():
+                self._metrics.record_drop(1)
+                raise QueueFullError(f'queue is full: {len(self._buffer)} frames')
+
+            self._buffer.append(path, payload)
+            self._condition.notify_all()
+
+    async def _run(self):
+        """
+        送信待ちのフレームをバッチにまとめて送信(close後は送信待ちがなくなるまで送信して終了)
+        """
+
+        while True:
+            async with self._condition:
+                while True:
+                    wait_time = self._buffer.get_wait_time(force=self._closed or self._flushing > 0)
+                    if wait_time == 0:
+                        break
+                    if wait_time is None and self._closed:
+                        return
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), wait_time)
+                    except asyncio.TimeoutError:
+                        pass
+
+                path, payloads = self._buffer.pop_batch()
+                self._in_flight += len(payloads)
+                self._condition.notify_all()
+
+            try:
+                await self._upload(path, payloads)
+            finally:
+                async with self._condition:
+                    self._in_flight -= len(payloads)
+                    self._condition.notify_all()
+
+    async def _upload(self, path, payloads):
+        """
+        1バッチを送信(失敗した場合は再送、サイズ超過の場合は分割して送信)
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        payloads : list
+            フレームごとのJSON
+        """
+
+        body, headers, raw_bytes = self.get_request(payloads)
+
+        status, text, cause = None, None, None
+        for attempt in range(self.retry_policy.max_attempts):
+            start_time = time.perf_counter()
+            try:
+                async with self._session.put(self.get_url(path), data=body, headers=headers) as response:
+                    status, text, cause = response.status, await response.text(), None
+                    retry_after = retry.parse_retry_after(response.headers.get('Retry-After'))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, text, cause, retry_after = None, None, e, None
+            latency = time.perf_counter() - start_time
+
+            action = retry.get_action(status, len(payloads), attempt, self.retry_policy.max_attempts)
+            if action == retry.ACTION_DONE:
+                self._metrics.record_upload(len(payloads), raw_bytes, len(body), latency)
+                return
+            if action == retry.ACTION_SPLIT:
+                half = len(payloads) // 2
+                await self._upload(path, payloads[:half])
+                await self._upload(path, payloads[half:])
+                return
+            if action == retry.ACTION_FAIL:
+                break
+
+            self._metrics.record_retry()
+            await asyncio.sleep(self.retry_policy.get_delay(attempt, retry_after))
+
+        self.handle_failure(path, len(payloads), status, text, cause)
@@ -0,0 +1,182 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import logging
+import uuid
+
+from . import encoding
+from .buffer import FrameBuffer
+from .errors import UploadError
+from .metrics import ClientMetrics
+from .retry import RetryPolicy
+
+# ロガー(出力先・ログレベルは利用側で設定する)
+logger = logging.getLogger(__name__)
+
+
+class BaseClient:
+    """
+    同期版・非同期版のクライアントに共通する設定・リクエストの組み立て・失敗時の処理
+    """
+
+    def __init__(
+        self,
+        base_url,
+        api_key=None,
+        access_token=None,
+        compression=encoding.COMPRESSION_GZIP,
+        compress_min_bytes=1024,
+        max_queue_frames=1000,
+        max_batch_frames=10,
+        max_batch_bytes=4194304,
+        linger=0.1,
+        max_concurrency=1,
+        pool_size=4,
+        timeout=10.0,
+        retry_policy=None,
+        on_error=None,
+    ):
+        """
+        Parameters
+        ----------
+        base_url : str
+            APIのURL(例: https://roadsideunit-info.jp)
+        api_key : str
+            APIキー(apiKeyヘッダー)
+        access_token : str
+            アクセストークン(Authorizationヘッダー)
+        compression : str
+            bodyの圧縮形式(gzip・none)
+        compress_min_bytes : int
+            圧縮する最小バイト数(未満の場合は圧縮しない)
+        max_queue_frames : int
+            送信待ちの最大フレーム数
+        max_batch_frames : int
+            物標情報の1リクエストの最大フレーム数
+        max_batch_bytes : int
+            物標情報の1リクエストの最大バイト数(圧縮前)
+        linger : float
+            バッチが上限に達するまで送信を待つ最大時間(秒)
+        max_concurrency : int
+            同時に送信するリクエスト数
+        pool_size : int
+            再利用する接続数の上限
+        timeout : float
+            1回の送信のタイムアウト(秒)
+        retry_policy : RetryPolicy
+            再送回数と待ち時間
+        on_error : function
+            再送しても送信できなかった場合に呼び出す関数(UploadErrorを引数とする)
+        """
+
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.access_token = access_token
+        self.compression = compression
+        self.compress_min_bytes = compress_min_bytes
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.on_error = on_error
+
+        self._buffer = FrameBuffer(max_queue_frames, max_batch_frames, max_batch_bytes, linger)
+        self._metrics = ClientMetrics()
+        self._in_flight = 0
+        self._flushing = 0
+        self._closed = False
+
+    def set_access_token(self, access_token):
+        """
+        アクセストークンを更新(以降の送信から使用する)
+        Parameters
+        ----------
+        access_token : str
+            アクセストークン
+        """
+
+        self.access_token = access_token
+
+    def get_url(self, path):
+        """
+        登録APIのURLを取得
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+
+        Returns
+        -------
+        url : str
+            URL
+        """
+
+        return f'{self.base_url}{path}'
+
+    def get_request(self, payloads):
+        """
+        1バッチ分のbodyとヘッダーを生成
+        再送時も同じbody・X-Trackingを使用する(登録APIはフレームの内容で重複を判定し、X-Trackingはログに出力する)
+        Parameters
+        ----------
+        payloads : list
+            フレームごとのJSON
+
+        Returns
+        -------
+        body : bytes
+            body
+        headers : dict
+            ヘッダー
+        raw_bytes : int
+            圧縮前のバイト数
+        """
+
+        body, headers, raw_bytes = encoding.encode_body(payloads, self.compression, self.compress_min_bytes)
+
+        # 再送を含めて同じバッチを追跡するためのID
+        headers['X-Tracking'] = str(uuid.uuid4())
+        if self.api_key:
+            headers['apiKey'] = self.api_key
+        if self.access_token:
+            headers['Authorization'] = f'Bearer {self.access_token}'
+
+        return body, headers, raw_bytes
+
+    def handle_failure(self, path, frame_count, status=None, body=None, cause=None):
+        """
+        再送しても送信できなかったバッチを記録し、on_errorを呼び出す
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        frame_count : int
+            フレーム数
+        status : int
+            最後の送信のステータスコード
+        body : str
+            最後の送信のレスポンスボディ
+        cause : Exception
+            最後の送信の通信エラー
+        """
+
+        self._metrics.record_failure(frame_count)
+        error = UploadError(path, frame_count, status, body, cause)
+        logger.error(str(error))
+
+        if self.on_error is not None:
+            try:
+                self.on_error(error)
+            except Exception:
+                logger.exception('on_error failed')
+
+    def get_metrics(self):
+        """
+        送信待ちのフレーム数・送信件数・レイテンシ等の集計値を取得
+
+        Returns
+        -------
+        metrics : dict
+            集計値
+        """
+
+        return self._metrics.snapshot(len(self._buffer), self._in_flight)
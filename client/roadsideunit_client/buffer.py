@@ -0,0 +1,128 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import time
+from collections import deque
+
+# 登録APIのパス
+TARGET_INFO = '/targetInfo'
+SENSOR_INFO = '/sensorInfo'
+ALIVE_MONITORING_INFO = '/aliveMonitoringInfo'
+
+# 複数フレームをまとめて送信できるパス(NDJSONを受け付ける登録API)
+BATCH_PATHS = {TARGET_INFO}
+
+
+class FrameBuffer:
+    """
+    送信待ちのフレームを到着順に保持し、同じパスの連続したフレームをバッチにまとめる
+    排他制御は呼び出し側(同期版はスレッド、非同期版はイベントループ)で行う
+    """
+
+    def __init__(self, max_frames=1000, max_batch_frames=10, max_batch_bytes=4194304, linger=0.1):
+        """
+        Parameters
+        ----------
+        max_frames : int
+            送信待ちの最大フレーム数
+        max_batch_frames : int
+            1リクエストの最大フレーム数
+        max_batch_bytes : int
+            1リクエストの最大バイト数(圧縮前)
+        linger : float
+            バッチが上限に達するまで送信を待つ最大時間(秒)
+        """
+
+        self.max_frames = max_frames
+        self.max_batch_frames = max_batch_frames
+        self.max_batch_bytes = max_batch_bytes
+        self.linger = linger
+        self._frames = deque()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def is_full(self):
+        """
+        送信待ちのフレーム数が上限に達しているか判定
+
+        Returns
+        -------
+        is_full : bool
+            上限に達している場合True
+        """
+
+        return len(self._frames) >= self.max_frames
+
+    def append(self, path, payload):
+        """
+        フレームを送信待ちに追加
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        payload : bytes
+            1フレーム分のJSON
+        """
+
+        self._frames.append((path, payload, time.monotonic()))
+
+    def get_wait_time(self, force=False):
+        """
+        次のバッチを送信できるまでの待ち時間を取得
+        Parameters
+        ----------
+        force : bool
+            上限に達していないバッチも直ちに送信する場合True(flush・close時)
+
+        Returns
+        -------
+        wait_time : float
+            待ち時間(秒)、送信待ちのフレームがない場合はNone
+        """
+
+        if not self._frames:
+            return None
+
+        path, _, enqueued_at = self._frames[0]
+        if force or path not in BATCH_PATHS:
+            return 0.0
+
+        # 同じパスの連続したフレームが上限に達している場合は直ちに送信
+        frame_count, batch_bytes = 0, 0
+        for frame_path, payload, _ in self._frames:
+            if frame_path != path:
+                return 0.0
+            frame_count += 1
+            batch_bytes += len(payload)
+            if frame_count >= self.max_batch_frames or batch_bytes >= self.max_batch_bytes:
+                return 0.0
+
+        return max(0.0, self.linger - (time.monotonic() - enqueued_at))
+
+    def pop_batch(self):
+        """
+        先頭から同じパスの連続したフレームを上限までバッチとして取り出す
+        1フレームでバイト数の上限を超える場合も1フレームのバッチとする
+
+        Returns
+        -------
+        path : str
+            登録APIのパス
+        payloads : list
+            フレームごとのJSON
+        """
+
+        path = self._frames[0][0]
+        max_batch_frames = self.max_batch_frames if path in BATCH_PATHS else 1
+
+        payloads = []
+        batch_bytes = 0
+        while self._frames and len(payloads) < max_batch_frames:
+            frame_path, payload, _ = self._frames[0]
+            if frame_path != path or (payloads and batch_bytes + len(payload) > self.max_batch_bytes):
+                break
+            self._frames.popleft()
+            payloads.append(payload)
+            batch_bytes += len(payload)
+
+        return path, payloads
@@ -0,0 +1,270 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import encoding, retry
+from .base import BaseClient
+from .buffer import ALIVE_MONITORING_INFO, SENSOR_INFO, TARGET_INFO
+from .errors import QueueFullError
+
+
+class RsuClient(BaseClient):
+    """
+    路側機から登録APIへ送信するクライアント(スレッドで送信)
+    フレームは送信待ちに追加して直ちに戻り、バックグラウンドのスレッドがバッチにまとめて送信する
+    """
+
+    def __init__(self, base_url, session=None, **kwargs):
+        """
+        Parameters
+        ----------
+        base_url : str
+            APIのURL
+        session : requests.Session
+            送信に使用するセッション(未指定の場合は接続を再利用するセッションを作成)
+        **kwargs
+            BaseClientのパラメータ
+        """
+
+        super().__init__(base_url, **kwargs)
+
+        self._session = session or create_session(self.pool_size)
+        self._is_own_session = session is None
+        self._condition = threading.Condition()
+        self._workers = [
+            threading.Thread(target=self._run, name=f'roadsideunit-client-{index}', daemon=True)
+            for index in range(self.max_concurrency)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def put_target_info(self, frame, block=True, timeout=None):
+        """
+        物標情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            1フレーム分の物標情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        timeout : float
+            空くまで待つ最大時間(秒)
+        """
+
+        self._put(TARGET_INFO, frame, block, timeout)
+
+    def put_sensor_info(self, frame, block=True, timeout=None):
+        """
+        センサ情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            センサ情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        timeout : float
+            空くまで待つ最大時間(秒)
+        """
+
+        self._put(SENSOR_INFO, frame, block, timeout)
+
+    def put_alive_monitoring_info(self, frame, block=True, timeout=None):
+        """
+        死活監視情報を送信待ちに追加
+        Parameters
+        ----------
+        frame : dict
+            死活監視情報
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        timeout : float
+            空くまで待つ最大時間(秒)
+        """
+
+        self._put(ALIVE_MONITORING_INFO, frame, block, timeout)
+
+    def flush(self, timeout=None):
+        """
+        送信待ちのフレームを直ちに送信し、送信完了まで待つ
+        Parameters
+        ----------
+        timeout : float
+            待つ最大時間(秒)
+
+        Returns
+        -------
+        is_flushed : bool
+            送信が完了した場合True
+        """
+
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            try:
+                return self._condition.wait_for(lambda: not self._buffer and self._in_flight == 0, timeout)
+            finally:
+                self._flushing -= 1
+
+    def close(self, timeout=None):
+        """
+        送信待ちのフレームを送信して終了
+        Parameters
+        ----------
+        timeout : float
+            送信を待つ最大時間(秒)
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self._workers:
+            worker.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+        if self._is_own_session:
+            self._session.close()
+
+    def metrics(self):
+        """
+        送信待ちのフレーム数・送信件数・レイテンシ等の集計値を取得
+
+        Returns
+        -------
+        metrics : dict
+            集計値
+        """
+
+        with self._condition:
+            return self.get_metrics()
+
+    def _put(self, path, frame, block, timeout):
+        """
+        フレームを送信待ちに追加
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        frame : dict
+            1フレーム分のデータ
+        block : bool
+            送信待ちが上限に達している場合に空くまで待つ場合True
+        timeout : float
+            空くまで待つ最大時間(秒)
+        """
+
+        payload = encoding.dumps(frame)
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('client is closed')
+            if block:
+                self._condition.wait_for(lambda: not self._buffer.is_full() or self._closed, timeout)
+                if self._closed:
+                    raise RuntimeError('client is closed')
+            if self._buffer.is_full():
+                self._metrics.record_drop(1)
+                raise QueueFullError(f'queue is full: {len(self._buffer)} frames')
+
+            self._buffer.append(path, payload)
+            self._condition.notify_all()
+
+    def _run(self):
+        """
+        送信待ちのフレームをバッチにまとめて送信(close後は送信待ちがなくなるまで送信して終了)
+        """
+
+        while True:
+            with self._condition:
+                while True:
+                    wait_time = self._buffer.get_wait_time(force=self._closed or self._flushing > 0)
+                    if wait_time == 0:
+                        break
+                    if wait_time is None and self._closed:
+                        return
+                    self._condition.wait(wait_time)
+
+                path, payloads = self._buffer.pop_batch()
+                self._in_flight += len(payloads)
+                self._condition.notify_all()
+
+            try:
+                self._upload(path, payloads)
+            finally:
+                with self._condition:
+                    self._in_flight -= len(payloads)
+                    self._condition.notify_all()
+
+    def _upload(self, path, payloads):
+        """
+        1バッチを送信(失敗した場合は再送、サイズ超過の場合は分割して送信)
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        payloads : list
+            フレームごとのJSON
+        """
+
+        body, headers, raw_bytes = self.get_request(payloads)
+
+        status, text, cause = None, None, None
+        for attempt in range(self.retry_policy.max_attempts):
+            start_time = time.perf_counter()
+            try:
+                response = self._session.put(self.get_url(path), data=body, headers=headers, timeout=self.timeout)
+                status, text, cause = response.status_code, response.text, None
+                retry_after = retry.parse_retry_after(response.headers.get('Retry-After'))
+            except requests.RequestException as e:
+                status, text, cause, retry_after = None, None, e, None
+            latency = time.perf_counter() - start_time
+
+            action = retry.get_action(status, len(payloads), attempt, self.retry_policy.max_attempts)
+            if action == retry.ACTION_DONE:
+                self._metrics.record_upload(len(payloads), raw_bytes, len(body), latency)
+                return
+            if action == retry.ACTION_SPLIT:
+                half = len(payloads) // 2
+                self._upload(path, payloads[:half])
+                self._upload(path, payloads[half:])
+                return
+            if action == retry.ACTION_FAIL:
+                break
+
+            self._metrics.record_retry()
+            time.sleep(self.retry_policy.get_delay(attempt, retry_after))
+
+        self.handle_failure(path, len(payloads), status, text, cause)
+
+
+def create_session(pool_size):
+    """
+    接続を再利用(keep-alive)するセッションを作成
+    再送はクライアントで行うため、urllib3の再送は行わない
+    Parameters
+    ----------
+    pool_size : int
+        再利用する接続数の上限
+
+    Returns
+    -------
+    session : requests.Session
+        セッション
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
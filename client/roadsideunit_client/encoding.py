@@ -0,0 +1,73 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import gzip
+import json
+
+# bodyの形式(複数フレームは改行区切りのNDJSONとして送信する)
+CONTENT_TYPE_JSON = 'application/json'
+CONTENT_TYPE_NDJSON = 'application/x-ndjson'
+
+# gzipで圧縮したbodyの形式(API Gatewayでバイナリとして受け付けるContent-Type、登録APIはJSON・NDJSONとして展開する)
+CONTENT_TYPE_GZIP = 'application/gzip'
+
+# bodyの圧縮形式
+COMPRESSION_NONE = 'none'
+COMPRESSION_GZIP = 'gzip'
+
+# gzipの圧縮レベル
+GZIP_LEVEL = 6
+
+
+def dumps(frame):
+    """
+    1フレーム分のデータをJSONに変換
+    Parameters
+    ----------
+    frame : dict
+        1フレーム分のデータ
+
+    Returns
+    -------
+    payload : bytes
+        JSON(UTF-8)
+    """
+
+    return json.dumps(frame, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def encode_body(payloads, compression=COMPRESSION_GZIP, compress_min_bytes=1024):
+    """
+    複数フレームのJSONを1リクエスト分のbodyに変換
+    再送時に同じbodyとなるよう、gzipのヘッダーには時刻を含めない
+    Parameters
+    ----------
+    payloads : list
+        フレームごとのJSON
+    compression : str
+        圧縮形式
+    compress_min_bytes : int
+        圧縮する最小バイト数(未満の場合は圧縮しない)
+
+    Returns
+    -------
+    body : bytes
+        body
+    headers : dict
+        Content-Typeヘッダー
+    raw_bytes : int
+        圧縮前のバイト数
+    """
+
+    if len(payloads) == 1:
+        body = payloads[0]
+        headers = {'Content-Type': CONTENT_TYPE_JSON}
+    else:
+        body = b'\n'.join(payloads)
+        headers = {'Content-Type': CONTENT_TYPE_NDJSON}
+    raw_bytes = len(body)
+
+    if compression == COMPRESSION_GZIP and raw_bytes >= compress_min_bytes:
+        body = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        headers = {'Content-Type': CONTENT_TYPE_GZIP}
+
+    return body, headers, raw_bytes
@@ -0,0 +1,36 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+
+class QueueFullError(Exception):
+    """
+    送信待ちのフレーム数が上限に達し、フレームを追加できない場合のエラー
+    """
+
+
+class UploadError(Exception):
+    """
+    再送しても送信できなかった場合のエラー(on_errorに渡す)
+    """
+
+    def __init__(self, path, frame_count, status=None, body=None, cause=None):
+        """
+        Parameters
+        ----------
+        path : str
+            登録APIのパス
+        frame_count : int
+            送信できなかったフレーム数
+        status : int
+            最後の送信のステータスコード(通信エラーの場合はNone)
+        body : str
+            最後の送信のレスポンスボディ
+        cause : Exception
+            最後の送信の通信エラー
+        """
+
+        super().__init__(f'upload failed path:{path} frames:{frame_count} status:{status} body:{body or cause}')
+        self.path = path
+        self.frame_count = frame_count
+        self.status = status
+        self.body = body
+        self.cause = cause
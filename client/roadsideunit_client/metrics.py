@@ -0,0 +1,148 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import threading
+from collections import deque
+
+
+class ClientMetrics:
+    """
+    送信件数・バイト数・再送回数と送信レイテンシの集計
+    """
+
+    def __init__(self, latency_window=1024):
+        """
+        Parameters
+        ----------
+        latency_window : int
+            パーセンタイルの算出に使用する直近の送信数
+        """
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)
+        self._counts = {
+            'sentFrames': 0,
+            'sentBatches': 0,
+            'failedFrames': 0,
+            'droppedFrames': 0,
+            'retries': 0,
+            'rawBytes': 0,
+            'sentBytes': 0,
+        }
+        self._latency_max = 0.0
+
+    def record_upload(self, frame_count, raw_bytes, sent_bytes, latency):
+        """
+        送信に成功したバッチを記録
+        Parameters
+        ----------
+        frame_count : int
+            フレーム数
+        raw_bytes : int
+            圧縮前のバイト数
+        sent_bytes : int
+            送信したバイト数
+        latency : float
+            成功した送信のレイテンシ(秒)
+        """
+
+        with self._lock:
+            self._counts['sentFrames'] += frame_count
+            self._counts['sentBatches'] += 1
+            self._counts['rawBytes'] += raw_bytes
+            self._counts['sentBytes'] += sent_bytes
+            self._latencies.append(latency)
+            self._latency_max = max(self._latency_max, latency)
+
+    def record_retry(self):
+        """
+        再送を記録
+        """
+
+        with self._lock:
+            self._counts['retries'] += 1
+
+    def record_failure(self, frame_count):
+        """
+        再送しても送信できなかったフレームを記録
+        Parameters
+        ----------
+        frame_count : int
+            フレーム数
+        """
+
+        with self._lock:
+            self._counts['failedFrames'] += frame_count
+
+    def record_drop(self, frame_count):
+        """
+        送信待ちの上限を超えて破棄したフレームを記録
+        Parameters
+        ----------
+        frame_count : int
+            フレーム数
+        """
+
+        with self._lock:
+            self._counts['droppedFrames'] += frame_count
+
+    def snapshot(self, queue_depth=0, in_flight=0):
+        """
+        現時点の集計値を取得
+        Parameters
+        ----------
+        queue_depth : int
+            送信待ちのフレーム数
+        in_flight : int
+            送信中のフレーム数
+
+        Returns
+        -------
+        metrics : dict
+            集計値(レイテンシはミリ秒)
+        """
+
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+            latency_max = self._latency_max
+
+        metrics = {
+            'queueDepth': queue_depth,
+            'inFlight': in_flight,
+            **counts,
+            'compressionRatio': round(counts['rawBytes'] / counts['sentBytes'], 2) if counts['sentBytes'] else None,
+            'latencyMs': {
+                'count': len(latencies),
+                'avg': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else None,
+                'p50': get_percentile(latencies, 50),
+                'p95': get_percentile(latencies, 95),
+                'p99': get_percentile(latencies, 99),
+                'max': round(latency_max * 1000, 1) if latencies else None,
+            },
+        }
+
+        return metrics
+
+
+def get_percentile(sorted_values, percentile):
+    """
+    昇順に並べた値のパーセンタイル(最近傍法)をミリ秒で取得
+    Parameters
+    ----------
+    sorted_values : list
+        昇順の値(秒)
+    percentile : int
+        パーセンタイル
+
+    Returns
+    -------
+    value : float
+        パーセンタイル値(ミリ秒、値がない場合はNone)
+    """
+
+    if not sorted_values:
+        return None
+
+    index = min(len(sorted_values) - 1, max(0, -(-len(sorted_values) * percentile // 100) - 1))
+
+    return round(sorted_values[index] * 1000, 1)
@@ -0,0 +1,115 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import random
+
+# 再送するステータスコード
+# 409 : 同じフレームを他のリクエストで登録中
+# 429 : 流量制限(Retry-Afterの秒数以上待って再送)
+RETRY_STATUS_CODES = {409, 429, 500, 502, 503, 504}
+
+# 送信結果に対する処理
+ACTION_DONE = 'done'
+ACTION_SPLIT = 'split'
+ACTION_RETRY = 'retry'
+ACTION_FAIL = 'fail'
+
+
+class RetryPolicy:
+    """
+    再送回数とジッター付き指数バックオフの待ち時間
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.2, max_delay=10.0):
+        """
+        Parameters
+        ----------
+        max_attempts : int
+            最大送信回数(初回を含む)
+        base_delay : float
+            初回の再送待ち時間の上限(秒)
+        max_delay : float
+            再送待ち時間の上限(秒)
+        """
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def get_delay(self, attempt, retry_after=None):
+        """
+        再送までの待ち時間を取得(フルジッター付き指数バックオフ)
+        Parameters
+        ----------
+        attempt : int
+            送信済みの回数から1引いた値(0始まり)
+        retry_after : float
+            Retry-Afterヘッダーの秒数
+
+        Returns
+        -------
+        delay : float
+            待ち時間(秒)
+        """
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        return delay
+
+
+def parse_retry_after(value):
+    """
+    Retry-Afterヘッダーの秒数を取得
+    Parameters
+    ----------
+    value : str
+        Retry-Afterヘッダーの値
+
+    Returns
+    -------
+    retry_after : float
+        秒数(指定がない・日時形式の場合はNone)
+    """
+
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        return None
+
+
+def get_action(status, frame_count, attempt, max_attempts):
+    """
+    送信結果から次の処理を判定
+    Parameters
+    ----------
+    status : int
+        ステータスコード(通信エラーの場合はNone)
+    frame_count : int
+        送信したフレーム数
+    attempt : int
+        送信済みの回数から1引いた値(0始まり)
+    max_attempts : int
+        最大送信回数
+
+    Returns
+    -------
+    action : str
+        完了・分割して再送・再送・失敗のいずれか
+    """
+
+    if status is not None and 200 <= status < 300:
+        return ACTION_DONE
+
+    # 展開後のサイズが上限を超える場合は分割して送信
+    if status == 413 and frame_count > 1:
+        return ACTION_SPLIT
+
+    if status is not None and status not in RETRY_STATUS_CODES:
+        return ACTION_FAIL
+    if attempt + 1 >= max_attempts:
+        return ACTION_FAIL
+
+    return ACTION_RETRY
@@ -0,0 +1,103 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import gzip
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roadsideunit_client import RetryPolicy  # noqa: E402
+
+# 待ち時間を短くした再送設定
+FAST_RETRY_POLICY = RetryPolicy(max_attempts=4, base_delay=0.01, max_delay=0.05)
+
+
+class StubApi:
+    """
+    登録APIの代わりにリクエストを記録し、指定したステータスコードを返すHTTPサーバー
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        self.max_frames = None
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_PUT(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                status, headers = stub.handle(self.path, dict(self.headers), body, self.client_address)
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def handle(self, path, headers, body, client_address):
+        raw = gzip.decompress(body) if headers.get('Content-Type') == 'application/gzip' else body
+        frames = [json.loads(line) for line in raw.split(b'\n')]
+
+        with self.lock:
+            if self.responses:
+                status, response_headers = self.responses.pop(0)
+            elif self.max_frames is not None and len(frames) > self.max_frames:
+                status, response_headers = 413, {}
+            else:
+                status, response_headers = 201, {}
+            self.requests.append({
+                'path': path,
+                'headers': headers,
+                'body': body,
+                'frames': frames,
+                'status': status,
+                'port': client_address[1],
+            })
+
+        return status, response_headers
+
+    def accepted_frames(self, path='/targetInfo'):
+        return [frame for request in self.requests if request['path'] == path and request['status'] == 201 for frame in request['frames']]
+
+
+@pytest.fixture
+def stub_api():
+    stub = StubApi()
+    stub.thread.start()
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+def get_frame(index, target_count=20):
+    return {
+        'dataModelType': 'test',
+        'attribute': {
+            'roadsideUnitID': 1,
+            'serviceLocationID': 2,
+            'updateTimeInfo': f'2024-06-01T09:00:00.{index:03d}+09:00',
+            'formatVersion': 1,
+            'deviceNum': 1,
+            'deviceIndividualInfo': [{
+                'deviceID': 1,
+                'targetNum': target_count,
+                'targetIndividualInfo': [{'targetID': target_id, 'speed': index, 'heading': 0} for target_id in range(target_count)],
+            }],
+        },
+    }
@@ -0,0 +1,72 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import asyncio
+import time
+
+import pytest
+from conftest import FAST_RETRY_POLICY, get_frame
+
+from roadsideunit_client import AsyncRsuClient
+
+pytest.importorskip('aiohttp')
+
+
+def test_batches_with_concurrent_uploads(stub_api):
+    frames = [get_frame(index) for index in range(40)]
+
+    async def run():
+        async with AsyncRsuClient(stub_api.url, max_batch_frames=5, linger=0.05, max_concurrency=3, retry_policy=FAST_RETRY_POLICY) as client:
+            for frame in frames:
+                await client.put_target_info(frame)
+            await client.put_alive_monitoring_info({'alive': 1})
+            assert await client.flush(5)
+            return client.metrics()
+
+    metrics = asyncio.run(run())
+
+    target_requests = [request for request in stub_api.requests if request['path'] == '/targetInfo']
+    assert all(len(request['frames']) <= 5 for request in target_requests)
+    assert all(request['headers']['Content-Type'] == 'application/gzip' for request in target_requests)
+    assert sorted(stub_api.accepted_frames(), key=lambda frame: frame['attribute']['updateTimeInfo']) == frames
+    assert stub_api.accepted_frames('/aliveMonitoringInfo') == [{'alive': 1}]
+    assert metrics['sentFrames'] == 41
+    assert metrics['queueDepth'] == 0
+    assert metrics['latencyMs']['count'] == len(stub_api.requests)
+
+
+def test_retry_after_and_split(stub_api):
+    stub_api.responses = [(429, {'Retry-After': '1'})]
+    stub_api.max_frames = 2
+    frames = [get_frame(index) for index in range(8)]
+
+    async def run():
+        async with AsyncRsuClient(stub_api.url, max_batch_frames=8, linger=1, retry_policy=FAST_RETRY_POLICY) as client:
+            for frame in frames:
+                await client.put_target_info(frame)
+            await client.flush(10)
+            return client.metrics()
+
+    start_time = time.monotonic()
+    metrics = asyncio.run(run())
+
+    assert time.monotonic() - start_time >= 1
+    assert [(request['status'], len(request['frames'])) for request in stub_api.requests] == [
+        (429, 8), (413, 8), (413, 4), (201, 2), (201, 2), (413, 4), (201, 2), (201, 2),
+    ]
+    assert len({request['headers']['X-Tracking'] for request in stub_api.requests[:2]}) == 1
+    assert stub_api.accepted_frames() == frames
+    assert metrics['retries'] == 1
+    assert metrics['sentBatches'] == 4
+
+
+def test_reports_connection_error():
+    errors = []
+
+    async def run():
+        async with AsyncRsuClient('http://127.0.0.1:1', retry_policy=FAST_RETRY_POLICY, on_error=errors.append) as client:
+            await client.put_sensor_info({'sensor': 1})
+
+    asyncio.run(run())
+
+    assert errors[0].status is None
+    assert errors[0].cause is not None
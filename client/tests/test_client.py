@@ -0,0 +1,150 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import time
+
+import pytest
+from conftest import FAST_RETRY_POLICY, get_frame
+
+from roadsideunit_client import QueueFullError, RetryPolicy, RsuClient
+
+
+def test_batches_target_frames_as_gzip_ndjson(stub_api):
+    frames = [get_frame(index) for index in range(25)]
+
+    with RsuClient(stub_api.url, max_batch_frames=10, linger=0.05, retry_policy=FAST_RETRY_POLICY) as client:
+        for frame in frames:
+            client.put_target_info(frame)
+        assert client.flush(5)
+        metrics = client.metrics()
+
+    target_requests = [request for request in stub_api.requests if request['path'] == '/targetInfo']
+    assert [len(request['frames']) for request in target_requests] == [10, 10, 5]
+    assert all(request['headers']['Content-Type'] == 'application/gzip' for request in target_requests)
+    assert all(request['body'][:2] == b'\x1f\x8b' for request in target_requests)
+    assert stub_api.accepted_frames() == frames
+
+    # 接続を再利用する
+    assert len({request['port'] for request in stub_api.requests}) == 1
+
+    assert metrics['queueDepth'] == 0
+    assert metrics['inFlight'] == 0
+    assert metrics['sentFrames'] == 25
+    assert metrics['sentBatches'] == 3
+    assert metrics['sentBytes'] == sum(len(request['body']) for request in target_requests)
+    assert metrics['compressionRatio'] > 1
+    assert metrics['latencyMs']['count'] == 3
+
+
+def test_sends_other_info_one_frame_per_request(stub_api):
+    with RsuClient(stub_api.url, compress_min_bytes=1 << 20, retry_policy=FAST_RETRY_POLICY) as client:
+        client.put_sensor_info({'sensor': 1})
+        client.put_sensor_info({'sensor': 2})
+        client.put_alive_monitoring_info({'alive': 1})
+
+    assert sorted((request['path'], len(request['frames'])) for request in stub_api.requests) == [
+        ('/aliveMonitoringInfo', 1), ('/sensorInfo', 1), ('/sensorInfo', 1),
+    ]
+    assert all(request['headers']['Content-Type'] == 'application/json' for request in stub_api.requests)
+
+
+def test_sends_credentials(stub_api):
+    with RsuClient(stub_api.url, api_key='key', access_token='token', retry_policy=FAST_RETRY_POLICY) as client:
+        client.put_target_info(get_frame(0))
+
+    headers = stub_api.requests[0]['headers']
+    assert headers['apiKey'] == 'key'
+    assert headers['Authorization'] == 'Bearer token'
+    assert headers['X-Tracking']
+
+
+@pytest.mark.parametrize('status', [409, 429, 500, 503])
+def test_retries_with_same_body(stub_api, status):
+    stub_api.responses = [(status, {}), (status, {})]
+
+    with RsuClient(stub_api.url, retry_policy=FAST_RETRY_POLICY) as client:
+        client.put_target_info(get_frame(0))
+        client.flush(5)
+        metrics = client.metrics()
+
+    assert [request['status'] for request in stub_api.requests] == [status, status, 201]
+    assert len({request['body'] for request in stub_api.requests}) == 1
+    assert len({request['headers']['X-Tracking'] for request in stub_api.requests}) == 1
+    assert metrics['retries'] == 2
+    assert metrics['sentFrames'] == 1
+
+
+def test_waits_for_retry_after(stub_api):
+    stub_api.responses = [(429, {'Retry-After': '1'})]
+
+    start_time = time.monotonic()
+    with RsuClient(stub_api.url, retry_policy=FAST_RETRY_POLICY) as client:
+        client.put_target_info(get_frame(0))
+
+    assert time.monotonic() - start_time >= 1
+    assert [request['status'] for request in stub_api.requests] == [429, 201]
+
+
+def test_splits_batch_on_413(stub_api):
+    stub_api.max_frames = 3
+    frames = [get_frame(index) for index in range(10)]
+
+    with RsuClient(stub_api.url, max_batch_frames=10, linger=1, retry_policy=FAST_RETRY_POLICY) as client:
+        for frame in frames:
+            client.put_target_info(frame)
+        client.flush(5)
+        metrics = client.metrics()
+
+    assert [len(request['frames']) for request in stub_api.requests] == [10, 5, 2, 3, 5, 2, 3]
+    assert stub_api.accepted_frames() == frames
+    assert metrics['sentFrames'] == 10
+    assert metrics['failedFrames'] == 0
+
+
+def test_reports_failure(stub_api):
+    stub_api.responses = [(500, {})] * 4 + [(400, {})]
+    errors = []
+
+    with RsuClient(stub_api.url, retry_policy=FAST_RETRY_POLICY, on_error=errors.append) as client:
+        client.put_target_info(get_frame(0))
+        client.flush(5)
+        client.put_target_info(get_frame(1))
+        client.flush(5)
+        metrics = client.metrics()
+
+    # 再送回数の上限に達した500と、再送しない400
+    assert [request['status'] for request in stub_api.requests] == [500] * 4 + [400]
+    assert [(error.status, error.frame_count) for error in errors] == [(500, 1), (400, 1)]
+    assert metrics['failedFrames'] == 2
+
+
+def test_reports_connection_error():
+    errors = []
+
+    with RsuClient('http://127.0.0.1:1', retry_policy=FAST_RETRY_POLICY, on_error=errors.append) as client:
+        client.put_alive_monitoring_info({'alive': 1})
+
+    assert errors[0].status is None
+    assert errors[0].cause is not None
+
+
+def test_queue_full_and_close(stub_api):
+    stub_api.responses = [(503, {})] * 2
+    retry_policy = RetryPolicy(max_attempts=4, base_delay=0.2, max_delay=0.2)
+
+    client = RsuClient(stub_api.url, max_queue_frames=5, linger=10, retry_policy=retry_policy)
+    dropped = 0
+    for index in range(20):
+        try:
+            client.put_target_info(get_frame(index), block=False)
+        except QueueFullError:
+            dropped += 1
+    assert dropped >= 10
+    assert client.metrics()['droppedFrames'] == dropped
+
+    # closeで送信待ちを送信してから終了する
+    client.close(10)
+    assert len(stub_api.accepted_frames()) == 20 - dropped
+    assert client.metrics()['queueDepth'] == 0
+
+    with pytest.raises(RuntimeError):
+        client.put_target_info(get_frame(0))
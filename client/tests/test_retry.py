@@ -0,0 +1,37 @@
+# Copyright 2024 Smart Mobility Infrastructure Collaborative Innovation Partnership. All rights reserved.
+
+import pytest
+
+from roadsideunit_client import RetryPolicy, retry
+
+
+@pytest.mark.parametrize('status, frame_count, attempt, action', [
+    (201, 1, 0, retry.ACTION_DONE),
+    (413, 4, 0, retry.ACTION_SPLIT),
+    (413, 1, 0, retry.ACTION_FAIL),
+    (400, 4, 0, retry.ACTION_FAIL),
+    (409, 1, 0, retry.ACTION_RETRY),
+    (429, 1, 3, retry.ACTION_RETRY),
+    (503, 1, 4, retry.ACTION_FAIL),
+    (None, 1, 0, retry.ACTION_RETRY),
+])
+def test_get_action(status, frame_count, attempt, action):
+    assert retry.get_action(status, frame_count, attempt, 5) == action
+
+
+@pytest.mark.parametrize('value, retry_after', [
+    (None, None),
+    ('', None),
+    ('3', 3.0),
+    ('-1', 0.0),
+    ('Wed, 21 Oct 2015 07:28:00 GMT', None),
+])
+def test_parse_retry_after(value, retry_after):
+    assert retry.parse_retry_after(value) == retry_after
+
+
+def test_get_delay():
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+
+    assert all(0 <= policy.get_delay(attempt) <= 2.0 for attempt in range(10))
+    assert policy.get_delay(0, retry_after=5) == 5